@@ -0,0 +1,297 @@
+"""散布引擎吞吐量基准。
+
+在后台 Blender 中运行（不需要安装/启用扩展，脚本直接从仓库载入）::
+
+    blender -b --factory-startup --python benchmarks/scatter_benchmark.py -- \
+        --sizes 64 256 1024 --stamps 40 --seed 1 --json bench.json
+
+按地形分辨率递增构建合成地形（带 UV），用固定种子驱动 do_stamp、accept_point、
+sample_mask 与 erase_at，输出每秒实例数、每个实例的射线数、峰值内存与分阶段耗时（JSON）。
+"""
+import argparse
+import importlib.util
+import json
+import math
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import bmesh
+import bpy
+import numpy as np
+from mathutils import Vector
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "placehelper_bench"
+
+
+def load_addon():
+    """把仓库作为独立包载入，只注册散布工具需要的属性。"""
+    spec = importlib.util.spec_from_file_location(PACKAGE, ROOT / "__init__.py",
+                                                  submodule_search_locations=[str(ROOT)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE] = module
+    spec.loader.exec_module(module)
+    tool = sys.modules[PACKAGE + ".scatter_tool.tool"]
+    bpy.utils.register_class(tool.ScatterToolProps)
+    bpy.types.Scene.scatter_tool = bpy.props.PointerProperty(type=tool.ScatterToolProps)
+    bpy.types.Object.ph_scatter_weight = bpy.props.FloatProperty(default=1.0)
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="scatter_benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024],
+                        help="terrain grid resolutions (quads per side)")
+    parser.add_argument("--stamps", type=int, default=40)
+    parser.add_argument("--accepts", type=int, default=20000)
+    parser.add_argument("--mask-samples", type=int, default=200000)
+    parser.add_argument("--mask-size", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", choices=("POINTS", "OBJECTS"), default="POINTS")
+    parser.add_argument("--density", type=float, default=20.0)
+    parser.add_argument("--min-dist", type=float, default=0.15)
+    parser.add_argument("--radius", type=float, default=2.0)
+    parser.add_argument("--json", type=str, default="", help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+# 场景构建
+# ----------------------------------------------------------------------
+
+TERRAIN_SIZE = 100.0
+
+
+def build_terrain(res: int):
+    """res x res 个四边形的起伏地形，带一层 UV。"""
+    n = res + 1
+    lin = np.linspace(-0.5, 0.5, n) * TERRAIN_SIZE
+    x, y = np.meshgrid(lin, lin)
+    z = 3.0 * np.sin(x * 0.11) * np.cos(y * 0.07) + 0.8 * np.sin(x * 0.53 + y * 0.31)
+    co = np.stack((x, y, z), axis=-1).reshape(-1, 3).astype(np.float32)
+
+    i, j = np.meshgrid(np.arange(res), np.arange(res))
+    a = (j * n + i).ravel()
+    quads = np.stack((a, a + 1, a + n + 1, a + n), axis=1).astype(np.int32)
+
+    me = bpy.data.meshes.new(f"Bench_Terrain_{res}")
+    me.vertices.add(len(co))
+    me.vertices.foreach_set("co", co.ravel())
+    me.loops.add(quads.size)
+    me.loops.foreach_set("vertex_index", quads.ravel())
+    me.polygons.add(len(quads))
+    me.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+    me.polygons.foreach_set("loop_total", np.full(len(quads), 4, dtype=np.int32))
+    uv = me.uv_layers.new(name="UVMap")
+    uv.data.foreach_set("uv", ((co[quads.ravel(), :2] / TERRAIN_SIZE) + 0.5).ravel())
+    me.update()
+    me.validate()
+    obj = bpy.data.objects.new(me.name, me)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def build_source():
+    me = bpy.data.meshes.new("Bench_Source")
+    bm = bmesh.new()
+    bmesh.ops.create_icosphere(bm, subdivisions=1, radius=0.1)
+    bm.to_mesh(me)
+    bm.free()
+    obj = bpy.data.objects.new(me.name, me)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def build_mask(size: int, seed: int):
+    rng = np.random.default_rng(seed)
+    img = bpy.data.images.new("Bench_Mask", size, size, float_buffer=True)
+    coarse = rng.random((16, 16))
+    lum = np.kron(coarse, np.ones((size // 16, size // 16)))[:size, :size].astype(np.float32)
+    px = np.repeat(lum[..., None], 4, axis=2)
+    px[..., 3] = 1.0
+    img.pixels.foreach_set(px.ravel())
+    return img
+
+
+def clear_scatter(engine_mod, surface_mod):
+    coll = engine_mod.find_scatter_collection()
+    if coll is not None:
+        bpy.data.batch_remove(list(coll.objects))
+    surface_mod.clear_cache()
+
+
+class CountingSurface:
+    """包装目标表面，统计投射的射线数。"""
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.rays = 0
+
+    def cast(self, origin, direction):
+        self.rays += 1
+        return self.surface.cast(origin, direction)
+
+    def cast_many(self, origins, direction):
+        self.rays += len(origins)
+        return self.surface.cast_many(origins, direction)
+
+    def __getattr__(self, key):
+        return getattr(self.surface, key)
+
+
+# 基准
+# ----------------------------------------------------------------------
+
+class Phases:
+    def __init__(self):
+        self.times = {}
+
+    def run(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        self.times[name] = time.perf_counter() - start
+        return result
+
+
+def peak_rss_bytes():
+    """进程峰值常驻内存（字节）；ru_maxrss 在 Linux 上以 KB 计，在 macOS 上以字节计。"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def bench_size(args, res: int, source, mask, trace: bool = False) -> dict:
+    """跑一轮完整的工作负载。trace 为 True 时用 tracemalloc 记录 Python 峰值内存，
+    它会拖慢每次分配，因此计时与内存分两轮测量，这一轮的耗时不作数。
+    """
+    engine_mod = sys.modules[PACKAGE + ".scatter_tool.engine"]
+    surface_mod = sys.modules[PACKAGE + ".scatter_tool.surface"]
+    api = sys.modules[PACKAGE + ".scatter_tool.api"]
+    strokelog = sys.modules[PACKAGE + ".scatter_tool.strokelog"]
+
+    context = bpy.context
+    phases = Phases()
+    terrain = phases.run("build_terrain", lambda: build_terrain(res))
+    scene_props = context.scene.scatter_tool
+    settings = {
+        "radius": args.radius, "density": args.density, "min_dist": args.min_dist,
+        "use_mask": True, "mask_image": mask.name, "output": args.output,
+        "use_stacking": False, "target_collection": None,
+    }
+    props = strokelog.ReplayProps(scene_props, strokelog.snapshot_props(scene_props), settings)
+    runner = api.BatchScatter(props)
+    rng = np.random.default_rng(args.seed)
+
+    if trace:
+        # 遮罩金字塔按图像缓存，清空后内存轮同样包含它的构建
+        sys.modules[PACKAGE + ".scatter_tool.mask"].clear_cache()
+        tracemalloc.start()
+    runner.begin_stroke_state()
+    ok = phases.run("target_setup", lambda: runner.begin_paint(context, [source], [1.0], terrain,
+                                                                seed=args.seed))
+    if not ok:
+        raise RuntimeError("target setup failed")
+    counting = runner.surface = CountingSurface(runner.surface)
+
+    half = TERRAIN_SIZE * 0.5 - args.radius
+    xy = rng.uniform(-half, half, (args.stamps, 2))
+    down = Vector((0.0, 0.0, -1.0))
+    hits = runner.surface.surface.cast_many(np.column_stack((xy, np.full(len(xy), 100.0))), down)
+    centers = [(h[0], h[1]) for h in hits if h is not None]
+
+    def stamps():
+        for center, normal in centers:
+            runner.do_stamp(context, center, normal)
+        runner._flush_point_layers()
+
+    phases.run("do_stamp", stamps)
+    created = runner.created_stroke
+
+    pts = np.column_stack((rng.uniform(-half, half, (args.accepts, 2)), np.zeros(args.accepts)))
+
+    def accepts():
+        return sum(runner.accept_point(Vector(p), 0.1) for p in pts)
+
+    accepted = phases.run("accept_point", accepts)
+
+    tri_count = len(counting.surface.tris)
+    tri_ids = rng.integers(0, tri_count, args.mask_samples)
+    tri_co = counting.surface.co[counting.surface.tris[tri_ids]]
+    bary = rng.dirichlet((1.0, 1.0, 1.0), args.mask_samples)
+    mask_pts = np.einsum("ij,ijk->ik", bary, tri_co)
+    surfaces = [counting.surface] * args.mask_samples
+    phases.run("sample_mask", lambda: runner.sample_mask(surfaces, tri_ids, mask_pts, footprint=0.2))
+
+    def erases():
+        for center, _normal in centers:
+            runner.erase_at(center, args.radius)
+
+    phases.run("erase_at", erases)
+    erased = runner.erased_stroke
+    peak = None
+    if trace:
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    runner.end_paint()
+
+    stamp_time = phases.times["do_stamp"]
+    report = {
+        "terrain_quads": res * res,
+        "stamps": len(centers),
+        "instances": created,
+        "instances_per_second": created / stamp_time if stamp_time > 0 else math.inf,
+        "casts_per_instance": counting.rays / created if created else None,
+        "accept_point_per_second": args.accepts / phases.times["accept_point"],
+        "accepted_points": int(accepted),
+        "mask_samples_per_second": args.mask_samples / phases.times["sample_mask"],
+        "erased": erased,
+        "erased_per_second": erased / phases.times["erase_at"] if phases.times["erase_at"] > 0 else None,
+        "peak_python_bytes": peak,
+        "phase_seconds": phases.times,
+    }
+
+    clear_scatter(engine_mod, surface_mod)
+    me = terrain.data
+    bpy.data.objects.remove(terrain)
+    bpy.data.meshes.remove(me)
+    return report
+
+
+def main():
+    args = parse_args()
+    load_addon()
+    geometry = sys.modules[PACKAGE + ".utils.geometry"]
+    geometry.reset_timing()
+
+    source = build_source()
+    mask = build_mask(args.mask_size, args.seed)
+    results = [bench_size(args, res, source, mask) for res in args.sizes]
+    sites = geometry.timing_report()
+    for res, result in zip(args.sizes, results):
+        result["peak_python_bytes"] = bench_size(args, res, source, mask, trace=True)["peak_python_bytes"]
+
+    report = {
+        "blender": bpy.app.version_string,
+        "seed": args.seed,
+        "output": args.output,
+        "settings": {"radius": args.radius, "density": args.density, "min_dist": args.min_dist},
+        "peak_rss_bytes": peak_rss_bytes(),
+        "sizes": results,
+        "sites": [{"site": site, "calls": n, "total_seconds": total, "max_seconds": peak}
+                  for site, n, total, peak in sites],
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        Path(args.json).write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -77,6 +77,41 @@ data = {
     "Randomize the scatter probability (weight) of the selected source objects":
         "随机化所选源物体的散布概率（权重）",
     "Randomized %d source weights": "已随机 %d 个源物体的权重",
+    # 散布：笔触记录与回放
+    "Record Strokes": "记录笔触",
+    "Store each stroke's path, pressure, settings and random seed on the Scatter collection "
+    "so it can be replayed or regenerated later. "
+    "Each stroke rewrites the stored log, so it gets slower as the log grows":
+        "把每次笔触的路径、笔压、设置与随机种子保存在散布集合上，以便之后回放或重新生成。"
+        "每次笔触都会重写整个记录，记录越长越慢",
+    "Replay Strokes": "回放笔触",
+    "Re-run the strokes recorded on the Scatter collection without the viewport. "
+    "Recorded seeds reproduce the strokes exactly; overrides regenerate them at another density":
+        "不依赖视图重新执行散布集合上记录的笔触。按记录的种子可精确复现，覆盖设置可按其他密度重新生成",
+    "Stroke": "笔触",
+    "Index of the recorded stroke to replay (-1 replays all)": "要回放的笔触序号（-1 回放全部）",
+    "Density Factor": "密度倍数",
+    "Multiplier on the recorded density": "记录密度的倍数",
+    "Seed Offset": "种子偏移",
+    "Added to each recorded seed; 0 reproduces the strokes exactly": "加到每个记录的种子上；为 0 时精确复现",
+    "Recorded": "按记录",
+    "Use the output recorded with each stroke": "使用每次笔触记录的输出方式",
+    "Store instance transforms in point clouds": "把实例变换存入点云",
+    "Replayed %d strokes: %d created, %d removed": "已回放 %d 次笔触：创建 %d 个，删除 %d 个",
+    "Clear Stroke Log": "清除笔触记录",
+    "Remove the stroke log stored on the Scatter collection": "移除散布集合上保存的笔触记录",
+    "Scatter Along Path": "沿路径散布",
+    "Scatter the selected source objects along a curve onto the target surface using the current Scatter settings":
+        "按当前散布设置，把选中的源物体沿曲线散布到目标表面上",
+    "Target object (empty uses the active object, or the Surface Collection when set)":
+        "目标物体（留空时使用表面集合，未设置则用活动物体）",
+    "Target": "目标",
+    "Path": "路径",
+    "Curve object to scatter along (empty uses the selected curve)": "沿其散布的曲线物体（留空时使用选中的曲线）",
+    "Seed": "种子",
+    "Random seed; the same seed gives the same result": "随机种子；相同种子得到相同结果",
+    "Need a target surface and a curve path": "需要一个目标表面和一条曲线路径",
+    "Scattered %d instances": "已散布 %d 个实例",
     "Scatter Sources": "散布源",
     "Tool Help Hints": "工具帮助提示",
     "Help Offset X": "帮助偏移 X",
@@ -120,6 +155,9 @@ data = {
     "Transform Pro": "变换加强版",
     "Dynamic Place": "动态放置",
     "Stop When Intersecting": "碰撞时候停止",
+    "Mesh Accurate Collision": "网格精确碰撞",
+    "When bounding boxes overlap, also test the actual mesh surfaces. Slower on dense meshes":
+        "包围盒重叠后再检测实际网格表面，高面数网格较慢",
     "Keep Color When Intersecting": "碰撞时不变颜色",
     "Collision Alert": "碰撞警告",
     "Invert Axis": "反转轴",
@@ -231,9 +269,39 @@ data = {
     "Remove all objects scattered into the Scatter collection": "移除散布集合中的所有物体",
     "Please select at least one object to scatter": "请至少选择一个要散布的物体",
     "No surface under cursor": "光标下没有表面",
+    "Surface Collection": "表面集合",
+    "Scatter across every visible mesh in this collection instead of only the object under the cursor, "
+    "e.g. a terrain split into tiles":
+        "在该集合内所有可见网格上散布，而不只是光标下的单个物体（例如切块的地形）",
+    "Surface collection has no visible mesh": "表面集合中没有可见的网格",
     "Removed %d scattered objects": "已移除 %d 个散布物体",
     "Brush Display": "笔刷显示",
     "Brush Color": "笔刷颜色",
     "Erase Color": "擦除颜色",
-    "Brush Width": "笔刷宽度"
+    "Brush Width": "笔刷宽度",
+    "Stamp Time Budget": "落刷时间预算",
+    "Milliseconds of placement per brush event; unfinished stamps continue between events "
+    "so the brush stays responsive (0 = no limit)":
+        "每个笔刷事件用于放置的毫秒数；未完成的落刷在事件之间继续，保持笔刷流畅（0 = 不限制）",
+    "Density Overlay": "密度叠加层",
+    "While the brush is active, show a density heatmap of the Scatter collection "
+    "with live instance counts and estimated memory":
+        "笔刷激活时显示散布集合的密度热力图，以及实时实例计数与内存估算",
+    "Session": "会话",
+    "Total": "总计",
+    "Peak Density": "峰值密度",
+    "Memory": "内存",
+    "Distribution": "分布方式",
+    "How candidate points are drawn inside the brush": "笔刷内候选点的采样方式",
+    "Uniform random samples; spacing is enforced by rejecting candidates": "均匀随机采样；通过剔除候选点来保证间距",
+    "Blue Noise": "蓝噪声",
+    "Poisson-disk samples that already respect the spacing, "
+    "so far fewer candidates are cast and rejected":
+        "泊松圆盘采样，候选点本身已满足间距，投射与剔除的次数大幅减少",
+    "Output": "输出方式",
+    "Create one object per scattered instance": "每个散布实例创建一个物体",
+    "Point Instances": "点实例",
+    "Store instance transforms in one point cloud per source and instance the "
+    "source on its points with Geometry Nodes. Scales to far more instances":
+        "每个散布源的实例变换存入一个点云，用几何节点把源物体实例化到点上，可承载多得多的实例",
 }
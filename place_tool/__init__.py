@@ -1,4 +1,6 @@
 from . import op, gzg, tool
+from .mesh_collision import clear_cache as clear_mesh_cache
+from .scene_cache import remove_cache_handlers
 
 
 def register():
@@ -11,3 +13,5 @@ def unregister():
     tool.unregister()
     gzg.unregister()
     op.unregister()
+    remove_cache_handlers()
+    clear_mesh_cache()
@@ -1,3 +1,5 @@
+from ..utils.broadphase import SweepAndPrune
+
 #
 # 使用 object_name(str) 为key，返回以该物体构建的AlignObject
 # str : AlignObject
@@ -8,6 +10,8 @@
 
 # 存放预计算的场景物体
 SCENE_OBJS = {}
+# SCENE_OBJS 的世界包围盒索引（碰撞检测粗筛），与 SCENE_OBJS 同步增删
+SCENE_INDEX = SweepAndPrune()
 
 # 存放实时更新的激活项物体名称
 ALIGN_OBJ = {'active_name': None,
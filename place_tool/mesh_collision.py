@@ -0,0 +1,233 @@
+"""放置工具的网格精确碰撞（包围盒重叠之后的细检测）。
+
+每个物体求值后的网格只在几何变化时构建一次局部空间的三角形 BVH（foreach_get 批量读取），
+放入按字节预算淘汰的 LRU 缓存，在拖动之间共享。检测时不重建 BVH：
+把一方的边变换到另一方的局部空间，先用对方的粗粒度占用网格（三角形包围盒覆盖的体素，
+前缀和查询）剔除不可能碰到表面的边，只对剩下的边做射线投射；剩下的边仍超过上限时放弃细检测，
+沿用包围盒结果。没有边穿过表面时再各取一个顶点做内外判断，处理一方完全在另一方内部的情况。
+撤销/重做/载入文件后按名字缓存的条目可能对应另一个物体，整体清空。
+"""
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+from mathutils import Vector
+
+from ..utils.geometry import bvh_from_triangles, edge_vertices, mesh_triangles, timed, transform_points
+from ..utils.lru import ByteLRU
+
+# 所有缓存 BVH 合计的内存上限（字节，按坐标与索引缓冲区估算）
+MESH_CACHE_BYTES = 128 * 1024 * 1024
+# 内外判断的射线方向，避开坐标轴以减少擦边
+_INSIDE_DIR = Vector((0.2113, 0.4226, 0.8819)).normalized()
+# 边与包围盒比较时的容差
+_BOX_EPS = 1e-6
+# 占用网格每轴的格数
+_OCC_RES = 24
+# 单次检测（单方向）最多投射的边数，超过时沿用包围盒结果
+MAX_EDGE_CASTS = 2048
+
+# 物体名 -> (修订号, 数据名, MeshShape 或 None)
+_CACHE = ByteLRU(MESH_CACHE_BYTES, lambda entry: entry[2].nbytes if entry[2] is not None else 0)
+_REVISION = {}  # 物体名 -> 修订号
+
+
+class MeshShape:
+    """物体局部空间的三角形 BVH 与边缓冲区。"""
+
+    def __init__(self, co: np.ndarray, tris: np.ndarray, edges: np.ndarray):
+        self.bvh = bvh_from_triangles(co, tris)
+        self.co = co
+        self.edges = edges
+        self.lo = co.min(axis=0)
+        self.hi = co.max(axis=0)
+        self._occ = self._occupancy(co, tris)
+        # BVH 节点按与三角形缓冲区同量级估算
+        self.nbytes = co.nbytes + edges.nbytes + 2 * tris.nbytes + self._occ.nbytes
+
+    def _cell_of(self, pts: np.ndarray) -> np.ndarray:
+        size = np.maximum(self.hi - self.lo, 1e-9)
+        return np.clip(np.floor((pts - self.lo) / size * _OCC_RES), 0, _OCC_RES - 1).astype(np.int64)
+
+    def _occupancy(self, co: np.ndarray, tris: np.ndarray) -> np.ndarray:
+        """三角形包围盒覆盖的体素，返回带一圈零边的三维前缀和 (R+1, R+1, R+1)。"""
+        r = _OCC_RES
+        tri_co = co[tris]
+        i0 = self._cell_of(tri_co.min(axis=1) - _BOX_EPS)
+        i1 = self._cell_of(tri_co.max(axis=1) + _BOX_EPS) + 1
+        # 三维差分标记每个三角形的包围盒
+        diff = np.zeros((r + 1, r + 1, r + 1), dtype=np.int32)
+        for sx in (0, 1):
+            for sy in (0, 1):
+                for sz in (0, 1):
+                    x = i1[:, 0] if sx else i0[:, 0]
+                    y = i1[:, 1] if sy else i0[:, 1]
+                    z = i1[:, 2] if sz else i0[:, 2]
+                    np.add.at(diff, (x, y, z), -1 if (sx + sy + sz) % 2 else 1)
+        occupied = (diff.cumsum(0).cumsum(1).cumsum(2)[:r, :r, :r] > 0).astype(np.int32)
+        table = np.zeros((r + 1, r + 1, r + 1), dtype=np.int32)
+        table[1:, 1:, 1:] = occupied.cumsum(0).cumsum(1).cumsum(2)
+        return table
+
+    def _touches_surface(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """(N, 3) 包围盒是否与至少一个被三角形覆盖的体素相交（保守判断）。"""
+        a = self._cell_of(lo - _BOX_EPS)
+        b = self._cell_of(hi + _BOX_EPS) + 1
+        t = self._occ
+        total = (t[b[:, 0], b[:, 1], b[:, 2]] - t[a[:, 0], b[:, 1], b[:, 2]]
+                 - t[b[:, 0], a[:, 1], b[:, 2]] - t[b[:, 0], b[:, 1], a[:, 2]]
+                 + t[a[:, 0], a[:, 1], b[:, 2]] + t[a[:, 0], b[:, 1], a[:, 2]]
+                 + t[b[:, 0], a[:, 1], a[:, 2]] - t[a[:, 0], a[:, 1], a[:, 2]])
+        return total > 0
+
+    def edges_hit(self, other: "MeshShape", rel: np.ndarray):
+        """本网格的边（经 rel 变换到 other 的局部空间）是否穿过 other 的表面。
+        需要投射的边超过 MAX_EDGE_CASTS 时返回 None（不做判断）。
+        """
+        pts = transform_points(self.co, rel)
+        p0 = pts[self.edges[:, 0]]
+        p1 = pts[self.edges[:, 1]]
+        lo = np.minimum(p0, p1)
+        hi = np.maximum(p0, p1)
+        near = np.flatnonzero(((lo <= other.hi + _BOX_EPS) & (hi >= other.lo - _BOX_EPS)).all(axis=1))
+        if not len(near):
+            return False
+        near = near[other._touches_surface(lo[near], hi[near])]
+        if not len(near):
+            return False
+        if len(near) > MAX_EDGE_CASTS:
+            return None
+        p0 = p0[near]
+        vec = p1[near] - p0
+        length = np.linalg.norm(vec, axis=1)
+        keep = length > 1e-12
+        p0, vec, length = p0[keep], vec[keep] / length[keep, None], length[keep]
+        ray_cast = other.bvh.ray_cast
+        for origin, direction, dist in zip(p0.tolist(), vec.tolist(), length.tolist()):
+            if ray_cast(Vector(origin), Vector(direction), dist)[0] is not None:
+                return True
+        return False
+
+    def contains(self, point) -> bool:
+        """局部空间的点是否在网格内部（射线第一次击中背面）。"""
+        if not ((point >= self.lo).all() and (point <= self.hi).all()):
+            return False
+        loc, normal, _index, _dist = self.bvh.ray_cast(Vector(point.tolist()), _INSIDE_DIR)
+        return loc is not None and normal.dot(_INSIDE_DIR) > 0.0
+
+
+def _build_shape(obj):
+    """求值后的网格（局部空间）；不能转为网格或没有面时返回 None。"""
+    eval_obj = obj.evaluated_get(bpy.context.view_layer.depsgraph)
+    try:
+        me = eval_obj.to_mesh()
+    except Exception:
+        return None
+    try:
+        if me is None or len(me.polygons) == 0:
+            return None
+        co, tris = mesh_triangles(me)
+        shape = MeshShape(co, tris, edge_vertices(me))
+    finally:
+        eval_obj.to_mesh_clear()
+    return shape if shape.bvh is not None else None
+
+
+def get_shape(obj):
+    """取缓存的 MeshShape（几何变化后重建），并按字节预算淘汰最久未用的条目。"""
+    _add_handlers()
+    key = _REVISION.get(obj.name, 0)
+    cached = _CACHE.get(obj.name)
+    if cached is not None and cached[0] == key:
+        return cached[2]
+    with timed("place.mesh_bvh"):
+        shape = _build_shape(obj)
+    data = getattr(obj, "data", None)
+    _CACHE.put(obj.name, (key, data.name if data is not None else None, shape))
+    return shape
+
+
+def mesh_overlap(obj_a, obj_b):
+    """两个物体的网格是否相交（含一方在另一方内部）；
+    任一方没有可用网格、或需要投射的边过多时返回 None（由调用方沿用包围盒结果）。
+    """
+    shape_a = get_shape(obj_a)
+    shape_b = get_shape(obj_b)
+    if shape_a is None or shape_b is None:
+        return None
+    with timed("place.mesh_overlap"):
+        mx_a = np.array(obj_a.matrix_world, dtype=np.float64)
+        mx_b = np.array(obj_b.matrix_world, dtype=np.float64)
+        try:
+            a_to_b = np.linalg.inv(mx_b) @ mx_a
+            b_to_a = np.linalg.inv(mx_a) @ mx_b
+        except np.linalg.LinAlgError:  # 缩放为 0 的物体
+            return None
+        hit_ab = shape_a.edges_hit(shape_b, a_to_b)
+        if hit_ab:
+            return True
+        hit_ba = shape_b.edges_hit(shape_a, b_to_a)
+        if hit_ba:
+            return True
+        if hit_ab is None or hit_ba is None:
+            return None
+        return (shape_b.contains(transform_points(shape_a.co[:1], a_to_b)[0])
+                or shape_a.contains(transform_points(shape_b.co[:1], b_to_a)[0]))
+
+
+# ----------------------------------------------------------------------
+
+def clear_cache():
+    """清空缓存并移除处理器。"""
+    _CACHE.clear()
+    _REVISION.clear()
+    _remove_handlers()
+
+
+@persistent
+def _invalidate_on_update(_scene, depsgraph):
+    """物体几何变化（含其网格数据被编辑）时递增修订号；只移动不影响局部空间的 BVH。"""
+    stale_data = set()
+    for update in depsgraph.updates:
+        idb = update.id
+        if not update.is_updated_geometry:
+            continue
+        if isinstance(idb, bpy.types.Object):
+            _REVISION[idb.name] = _REVISION.get(idb.name, 0) + 1
+        else:
+            stale_data.add(idb.name)
+    if stale_data:
+        for name, (_key, data, _shape) in _CACHE.items():
+            if data in stale_data:
+                _REVISION[name] = _REVISION.get(name, 0) + 1
+
+
+@persistent
+def _reset_cache(*_args):
+    """撤销/重做/打开文件后同名物体可能已是另一个物体（或几何已回退），缓存整体作废。"""
+    _CACHE.clear()
+    _REVISION.clear()
+
+
+_HANDLERS = (
+    ("depsgraph_update_post", _invalidate_on_update),
+    ("undo_post", _reset_cache),
+    ("redo_post", _reset_cache),
+    ("load_post", _reset_cache),
+)
+
+
+def _add_handlers():
+    for attr, func in _HANDLERS:
+        handlers = getattr(bpy.app.handlers, attr)
+        if func not in handlers:
+            handlers.append(func)
+
+
+def _remove_handlers():
+    for attr, func in _HANDLERS:
+        handlers = getattr(bpy.app.handlers, attr)
+        if func in handlers:
+            try:
+                handlers.remove(func)
+            except Exception:
+                pass
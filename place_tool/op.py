@@ -2,14 +2,18 @@ import math
 from contextlib import contextmanager
 
 import bpy
+import numpy as np
 from bpy.props import StringProperty, BoolProperty, EnumProperty
 from mathutils import Vector, Matrix
 
-from ._runtime import SCENE_OBJS, ALIGN_OBJ, OVERLAP_OBJ, ALIGN_OBJS
+from ._runtime import SCENE_OBJS, SCENE_INDEX, ALIGN_OBJ, OVERLAP_OBJ, ALIGN_OBJS
 from .draw_bbox import draw_bbox_callback
 from .axis import resolve_place_axis
+from .mesh_collision import mesh_overlap
+from .scene_cache import sync_scene_objs, get_scene_obj
 from ..utils import get_pref
 from ..utils.obj_bbox import AlignObject, AlignObjects, C_OBJECT_TYPE_HAS_BBOX
+from ..utils.obb import obb_overlap_many
 from ..utils.raycast import ray_cast
 
 # 工具属性设置
@@ -78,24 +82,22 @@ class BVH_Helper:
         # self.build_act_inst = context.scene.place_tool.build_active_inst
         self.build_act_inst = True
         self.build_scn_inst = context.scene.place_tool.build_other_inst
+        self.mesh_accurate = context.scene.place_tool.coll_mesh_accurate
 
     def build_viewlayer_objs(self):
         context = bpy.context
+        children = set(context.object.children_recursive)
 
-        for obj in context.view_layer.objects:
-            if obj.hide_get():  # ignore hide obj
-                continue
-            elif obj.type not in C_OBJECT_TYPE_HAS_BBOX:  # ignore obj without bbox
-                continue
-            elif obj in context.object.children_recursive:  # ignore context obj children
-                continue
+        objs = [obj for obj in context.view_layer.objects
+                if not obj.hide_get()  # ignore hide obj
+                and obj.type in C_OBJECT_TYPE_HAS_BBOX  # ignore obj without bbox
+                and obj not in children]  # ignore context obj children
 
-            if obj is context.object:
-                obj_A = AlignObject(obj, self.build_act_obj_mode, build_instance=self.build_act_inst)
-                SCENE_OBJS[obj.name] = obj_A
-                ALIGN_OBJ['active_name'] = obj.name
-            else:
-                SCENE_OBJS[obj.name] = AlignObject(obj, self.build_scn_obj_mode, build_instance=self.build_scn_inst)
+        # 其它物体的缓存在拖动之间保留，只有变化过的物体按需重建
+        sync_scene_objs(objs, context.object,
+                        (self.build_act_obj_mode, self.build_act_inst),
+                        (self.build_scn_obj_mode, self.build_scn_inst))
+        ALIGN_OBJ['active_name'] = context.object.name
 
     def is_overlap(self, context, exclude_obj_list=None):
         obj = context.object
@@ -112,10 +114,11 @@ class BVH_Helper:
         if not active_align_obj:
             return
 
-        active_align_obj.bvh_tree_update()
         exclude_names = [o.name for o in exclude_obj_list if o is not None] if exclude_obj_list else []
 
-        for obj_name, obj_A in SCENE_OBJS.items():
+        # 粗筛：只对世界包围盒相交的少数物体做有向包围盒检测
+        names = []
+        for obj_name in SCENE_INDEX.query(*active_align_obj.world_bounds()):
             if obj_name == active_name:
                 continue
             scene_obj = bpy.context.scene.objects.get(obj_name)
@@ -125,29 +128,47 @@ class BVH_Helper:
                 continue
             if obj_name in exclude_names:
                 continue
-            if active_align_obj.bvh_tree.overlap(obj_A.bvh_tree):
-                OVERLAP_OBJ['obj_name'] = obj_name
-                return True
+            names.append(obj_name)
 
+        if self.first_overlap(active_align_obj.obb(), names, [obj]):
+            return True
         OVERLAP_OBJ.clear()
 
-    def check_objects_overlap(self, context, exclude_obj_list=None):
-        if not hasattr(self, 'objs_A'): return
+    def check_objects_overlap(self, context, exclude_obj_list=None, objs_A=None):
+        """多个选中物体（objs_A 为其整体的 AlignObjects）与场景物体的重叠检测"""
+        if objs_A is None: return
 
         exclude_names = [o.name for o in exclude_obj_list if o is not None] if exclude_obj_list else []
+        names = [obj_name for obj_name in SCENE_INDEX.query(*objs_A.world_bounds())
+                 if obj_name not in exclude_names]
 
-        for obj_name, obj_A in SCENE_OBJS.items():
-            if obj_name in exclude_names:
-                continue
-            if self.objs_A.bvh_tree.overlap(obj_A.bvh_tree):
-                OVERLAP_OBJ['obj_name'] = obj_name
-                return True
-
+        moving = [o for o in exclude_obj_list if o is not None and o.type in C_OBJECT_TYPE_HAS_BBOX] \
+            if exclude_obj_list else []
+        if self.first_overlap(objs_A.obb(), names, moving):
+            return True
         OVERLAP_OBJ.clear()
 
+    def first_overlap(self, obb, names, moving) -> bool:
+        """一次向量化检测所有候选，按候选顺序记录第一个重叠的物体；
+        开启网格精确碰撞时，包围盒重叠的候选再与移动中的物体（moving）逐一比较网格"""
+        objs = [(obj_name, get_scene_obj(obj_name)) for obj_name in names]
+        objs = [(obj_name, obj_A) for obj_name, obj_A in objs if obj_A is not None]
+        if not objs:
+            return False
+        boxes = [obj_A.obb() for _, obj_A in objs]
+        hit = obb_overlap_many(*obb, [b[0] for b in boxes], [b[1] for b in boxes])
+        for i in np.flatnonzero(hit).tolist():
+            obj_name, obj_A = objs[i]
+            # 没有可用网格（mesh_overlap 返回 None）或没有可比较的移动物体时沿用包围盒结果
+            if self.mesh_accurate and moving and not any(mesh_overlap(o, obj_A.obj) is not False for o in moving):
+                continue
+            OVERLAP_OBJ['obj_name'] = obj_name
+            return True
+        return False
+
     def clear(self):
+        # SCENE_OBJS / SCENE_INDEX 由 scene_cache 维护，退出时保留给下次拖动
         OVERLAP_OBJ.clear()
-        SCENE_OBJS.clear()
 
 
 class ModalBase:
@@ -179,11 +200,11 @@ class ModalBase:
     def stop_moving(self, exclude_obj_list=None):
         """物体是否需要停止移动"""
         if exclude_obj_list and len(exclude_obj_list) > 1:
-            check = self.bvh_helper.check_objects_overlap
+            overlap = self.bvh_helper.check_objects_overlap(bpy.context, exclude_obj_list, getattr(self, 'objs_A', None))
         else:
-            check = self.bvh_helper.is_overlap
+            overlap = self.bvh_helper.is_overlap(bpy.context, exclude_obj_list)
 
-        return check(bpy.context, exclude_obj_list) and place_tool_props().coll_stop  # 先后顺序
+        return overlap and place_tool_props().coll_stop  # 先后顺序
 
     def invoke(self, context, event):
         self.axis, self.invert_axis = resolve_place_axis(context)
@@ -204,7 +225,7 @@ class ModalBase:
         self.bvh_helper.build_viewlayer_objs()
         self.append_handles()
         # 初始化颜色
-        self.bvh_helper.check_objects_overlap(context, self.selected_objs)
+        self.bvh_helper.check_objects_overlap(context, self.selected_objs, getattr(self, 'objs_A', None))
 
         return {'RUNNING_MODAL'}
 
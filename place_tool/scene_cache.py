@@ -0,0 +1,187 @@
+"""放置工具的场景物体缓存（SCENE_OBJS / SCENE_INDEX）。
+
+缓存在多次拖动之间保留，不再每次拖动为视图层里的全部物体重建 AlignObject：
+每个条目记录构建时该物体的更新计数，depsgraph_update_post 报告几何或变换变化时计数加一，条目随之过期；
+新出现或已过期的物体先以 bound_box 的世界包围盒进入粗筛索引（同样记下更新计数，未变化时不再重新登记），
+只有粗筛命中、第一次真正需要时才构建。网格数据被编辑时经 数据名 -> 物体名 的反查表找到使用它的物体。
+撤销/重做/载入文件后物体引用可能失效，整体清空。
+"""
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+
+from ._runtime import SCENE_OBJS, SCENE_INDEX
+from ..utils.geometry import transform_points
+from ..utils.obj_bbox import AlignObject, instance_scan
+
+_STAMPS = {}  # 物体名 -> 更新计数
+_BUILT = {}  # 物体名 -> (构建时的更新计数, 构建参数)
+_PENDING = {}  # 尚未构建的物体名 -> (登记时的更新计数, 构建参数 (mode, build_instance))
+_DATA_USERS = {}  # 数据名 -> 使用它的已登记物体名
+_OBJ_DATA = {}  # 已登记物体名 -> 数据名
+
+
+def _cheap_bounds(obj):
+    """bound_box（求值后的局部包围盒）变换到世界空间的轴对齐包围盒。"""
+    pts = transform_points(np.array(obj.bound_box, dtype=np.float64), obj.matrix_world)
+    return pts.min(axis=0), pts.max(axis=0)
+
+
+def _needs_instances(obj, build_instance: bool) -> bool:
+    """只有实例而自身没有顶点的网格：bound_box 不含实例，不能作为粗筛包围盒，需立即构建。"""
+    if not build_instance or obj.type != "MESH":
+        return False
+    return len(obj.evaluated_get(bpy.context.view_layer.depsgraph).data.vertices) == 0
+
+
+def _track_data(obj):
+    """登记物体使用的数据名，供 _mark_updates 由数据反查物体。"""
+    data = getattr(obj, "data", None)
+    data_name = data.name if data is not None else None
+    old = _OBJ_DATA.get(obj.name)
+    if old == data_name:
+        return
+    _untrack_data(obj.name)
+    if data_name is not None:
+        _OBJ_DATA[obj.name] = data_name
+        _DATA_USERS.setdefault(data_name, set()).add(obj.name)
+
+
+def _untrack_data(name: str):
+    data_name = _OBJ_DATA.pop(name, None)
+    users = _DATA_USERS.get(data_name)
+    if users is not None:
+        users.discard(name)
+        if not users:
+            del _DATA_USERS[data_name]
+
+
+def _build(obj, params) -> AlignObject:
+    obj_A = AlignObject(obj, params[0], build_instance=params[1])
+    _BUILT[obj.name] = (_STAMPS.get(obj.name, 0), params)
+    _PENDING.pop(obj.name, None)
+    _track_data(obj)
+    SCENE_OBJS[obj.name] = obj_A
+    return obj_A
+
+
+def _is_valid(name: str, params) -> bool:
+    """已构建或已登记待构建、且之后没有变化。"""
+    stamp = _STAMPS.get(name, 0)
+    pending = _PENDING.get(name)
+    if pending is not None:
+        return pending == (stamp, params) and name in SCENE_INDEX
+    built = _BUILT.get(name)
+    return built is not None and name in SCENE_OBJS and built == (stamp, params)
+
+
+def _drop(name: str):
+    SCENE_OBJS.pop(name, None)
+    SCENE_INDEX.remove(name)
+    _BUILT.pop(name, None)
+    _PENDING.pop(name, None)
+    _untrack_data(name)
+
+
+def sync_scene_objs(objs, active, active_params, other_params):
+    """按当前可见物体同步缓存：active 每次重新构建（不进入粗筛索引），
+    其它物体有效则保留，否则只登记 bound_box 包围盒，等待 get_scene_obj() 按需构建。
+    """
+    add_cache_handlers()
+    seen = set()
+    # 需要立即构建的实例物体共用一次实例分组遍历
+    with instance_scan():
+        for obj in objs:
+            name = obj.name
+            seen.add(name)
+            if obj is active:
+                SCENE_INDEX.remove(name)
+                _PENDING.pop(name, None)
+                _build(obj, active_params)
+                # 激活物体会被拖动，下次作为其它物体时重新构建
+                _BUILT.pop(name, None)
+                continue
+            if _is_valid(name, other_params):
+                continue
+            SCENE_OBJS.pop(name, None)
+            _BUILT.pop(name, None)
+            if _needs_instances(obj, other_params[1]):
+                obj_A = _build(obj, other_params)
+                SCENE_INDEX.set(name, *obj_A.world_bounds())
+            else:
+                _PENDING[name] = (_STAMPS.get(name, 0), other_params)
+                _track_data(obj)
+                SCENE_INDEX.set(name, *_cheap_bounds(obj))
+    for name in [n for n in set(SCENE_INDEX.names()).union(_OBJ_DATA) if n not in seen]:
+        _drop(name)
+
+
+def get_scene_obj(name: str):
+    """取缓存的 AlignObject；尚未构建的在这里构建并把索引中的包围盒换成精确值。物体已不存在时返回 None。"""
+    obj_A = SCENE_OBJS.get(name)
+    if obj_A is not None and name not in _PENDING:
+        return obj_A
+    pending = _PENDING.get(name)
+    obj = bpy.data.objects.get(name)
+    if pending is None or obj is None:
+        return obj_A
+    obj_A = _build(obj, pending[1])
+    SCENE_INDEX.set(name, *obj_A.world_bounds())
+    return obj_A
+
+
+def clear_cache():
+    SCENE_OBJS.clear()
+    SCENE_INDEX.clear()
+    _STAMPS.clear()
+    _BUILT.clear()
+    _PENDING.clear()
+    _DATA_USERS.clear()
+    _OBJ_DATA.clear()
+
+
+@persistent
+def _mark_updates(_scene, depsgraph):
+    """几何或变换变化时把对应物体（含待构建的）的更新计数加一，使缓存条目过期。"""
+    if not _PENDING and not _BUILT:
+        return
+    for update in depsgraph.updates:
+        idb = update.id
+        if isinstance(idb, bpy.types.Object):
+            if update.is_updated_geometry or update.is_updated_transform:
+                _STAMPS[idb.name] = _STAMPS.get(idb.name, 0) + 1
+        elif update.is_updated_geometry:
+            for name in _DATA_USERS.get(idb.name, ()):
+                _STAMPS[name] = _STAMPS.get(name, 0) + 1
+
+
+@persistent
+def _reset_cache(*_args):
+    clear_cache()
+
+
+_HANDLERS = (
+    ("depsgraph_update_post", _mark_updates),
+    ("undo_post", _reset_cache),
+    ("redo_post", _reset_cache),
+    ("load_post", _reset_cache),
+)
+
+
+def add_cache_handlers():
+    for attr, func in _HANDLERS:
+        handlers = getattr(bpy.app.handlers, attr)
+        if func not in handlers:
+            handlers.append(func)
+
+
+def remove_cache_handlers():
+    """移除处理器并清空缓存：处理器不在时无法得知场景变化，缓存不能继续使用。"""
+    for attr, func in _HANDLERS:
+        handlers = getattr(bpy.app.handlers, attr)
+        if func in handlers:
+            try:
+                handlers.remove(func)
+            except Exception:
+                pass
+    clear_cache()
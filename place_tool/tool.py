@@ -30,6 +30,10 @@ class PlaceToolProps(PropertyGroup):
         update=update_gzg_pref)
     # coll_hide: BoolProperty(name="Keep Color When Intersecting", default=False)
     coll_stop: BoolProperty(name="Stop When Intersecting", default=False)
+    coll_mesh_accurate: BoolProperty(name="Mesh Accurate Collision",
+                                     description="When bounding boxes overlap, also test the actual mesh surfaces. "
+                                                 "Slower on dense meshes",
+                                     default=False)
     limit_to_ground: BoolProperty(name="Limit to Ground",
                                   description="Prevent placed objects from going below the Z=0 ground plane "
                                               "while moving",
@@ -211,6 +215,7 @@ class PH_PT_PlaceToolPanel(bpy.types.Panel):
 
         layout.label(text="Collisions")
         layout.prop(prop, "coll_stop")
+        layout.prop(prop, "coll_mesh_accurate")
         # layout.prop(prop, "coll_hide")
         layout.separator()
 
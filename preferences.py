@@ -75,6 +75,14 @@ class ScatterToolPrefProps(PropertyGroup):
     ring_color_erase: FloatVectorProperty(name="Erase Color", subtype="COLOR", size=4,
                                           default=(1.0, 0.25, 0.2, 0.9), min=0, max=1)
     ring_width: FloatProperty(name="Brush Width", default=2.0, min=1.0, max=10.0)
+    stamp_budget: IntProperty(name="Stamp Time Budget",
+                              description="Milliseconds of placement per brush event; unfinished stamps continue "
+                                          "between events so the brush stays responsive (0 = no limit)",
+                              default=8, min=0, soft_max=50)
+    show_density: BoolProperty(name="Density Overlay",
+                               description="While the brush is active, show a density heatmap of the Scatter "
+                                           "collection with live instance counts and estimated memory",
+                               default=False)
 
 
 class Preferences(AddonPreferences, HUB):
@@ -254,6 +262,9 @@ class Preferences(AddonPreferences, HUB):
         column.prop(scatter, "ring_width")
         column.prop(scatter, "ring_color")
         column.prop(scatter, "ring_color_erase")
+        column.prop(scatter, "show_density")
+        column.separator()
+        column.prop(scatter, "stamp_budget")
 
     def draw_transform_tool(self, context, layout):
         column = layout.box().column(align=True)
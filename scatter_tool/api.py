@@ -0,0 +1,82 @@
+"""散布的 Python 接口。
+
+与交互笔刷共用 ScatterEngine，不需要 3D 视图与鼠标事件，可在 `blender -b` 的流水线脚本中调用::
+
+    from <扩展包>.scatter_tool.api import scatter_path
+    count = scatter_path(bpy.context, terrain, path_curve, [tree, rock],
+                         settings={"density": 5.0, "min_dist": 0.5}, seed=7)
+"""
+import bpy
+import numpy as np
+from mathutils import Vector
+
+from .engine import ScatterEngine
+from .strokelog import ReplayProps, snapshot_props
+from ..utils.geometry import edge_vertices, polylines, transform_points, vertex_coords
+
+
+class BatchScatter(ScatterEngine):
+    """非交互的散布执行器。单次落刷的数量上限比交互笔刷宽松，高密度时不被截断。"""
+
+    _MAX_PER_STAMP = 20000
+    _MAX_ATTEMPTS = 120000
+
+    def __init__(self, props):
+        self.init_engine(props)
+
+
+def path_points(depsgraph, obj) -> list:
+    """曲线（或网格折线）物体求值后的世界空间折线列表，每条为 (N, 3)。"""
+    eval_obj = obj.evaluated_get(depsgraph)
+    mesh = eval_obj.to_mesh()
+    try:
+        co = transform_points(vertex_coords(mesh), eval_obj.matrix_world)
+        edges = edge_vertices(mesh)
+    finally:
+        eval_obj.to_mesh_clear()
+    return [line for line in polylines(co, edges) if len(line)]
+
+
+def scatter_path(context, target, path, sources, weights=None, settings=None, seed: int = None,
+                 direction=(0.0, 0.0, -1.0), pressure: float = 1.0, record: bool = False) -> int:
+    """沿路径把 sources 散布到目标表面上，返回创建的实例数。
+
+    :param target: 目标物体或表面集合；为 None 时使用设置中的表面集合
+    :param path: 曲线物体，或 (N, 3) 世界坐标点列（多条折线可传列表）
+    :param weights: 各散布源的相对概率，默认取物体的散布权重
+    :param settings: ScatterToolProps，或覆盖场景散布设置的字典（属性名 -> 值）
+    :param seed: 随机种子，相同输入与种子得到相同结果；None 时随机
+    :param direction: 投射方向（世界空间）
+    :param record: 把本次散布记录进散布集合的笔触记录
+    """
+    scene_props = context.scene.scatter_tool
+    if settings is None:
+        props = scene_props
+    elif isinstance(settings, dict):
+        props = ReplayProps(scene_props, snapshot_props(scene_props), settings)
+    else:
+        props = settings
+    target = target or props.target_collection
+    if target is None or not sources:
+        return 0
+    if weights is None:
+        weights = [max(0.0, getattr(o, "ph_scatter_weight", 1.0)) for o in sources]
+
+    if isinstance(path, bpy.types.Object):
+        lines = path_points(context.evaluated_depsgraph_get(), path)
+    elif len(path) and np.ndim(path[0]) == 2:
+        lines = [np.asarray(line, dtype=np.float64) for line in path]
+    else:
+        lines = [np.asarray(path, dtype=np.float64)]
+
+    runner = BatchScatter(props)
+    runner.begin_stroke_state()
+    if not runner.begin_paint(context, sources, weights, target, seed=seed, record=record):
+        return 0
+    for line in lines:
+        # 每条折线单独起笔，避免在折线之间的空隙上补落刷
+        runner.last_stamp = None
+        runner.paint_path(context, line, Vector(direction), pressure)
+    runner.end_paint()
+    return runner.created_stroke
+
@@ -0,0 +1,1044 @@
+"""散布引擎：交互笔刷与笔触回放共用的放置逻辑。
+
+ScatterEngine 以 mixin 形式提供目标表面、候选点批量投射与过滤、间距索引、实例创建与擦除；
+使用者只需提供 self.props（场景的 ScatterToolProps，或回放时的 ReplayProps 快照）。
+每次笔触用独立种子的随机数发生器，笔触经过的射线、笔压与属性快照可记录为 StrokeLog，
+按记录回放即可逐个实例地复现，或覆盖密度等属性重新生成。
+"""
+import math
+import time
+from collections import deque
+
+import bpy
+import numpy as np
+from mathutils import Euler, Vector, Matrix
+
+from .instancing import (PointLayer, POINTS_SOURCE, create_point_object, find_point_object, is_point_object,
+                         iter_point_objects)
+from .mask import get_pyramid, sample_mask
+from .sampling import AliasTable, draw_stamp_batch, poisson_disk, resample_polyline, slope_degrees
+from .spatial import SpatialHash
+from .stacking import StackCaster, StackInstance
+from .strokelog import ReplayProps, StrokeLog, append_stroke, snapshot_props
+from .surface import SurfaceSet, get_local_mesh, get_surface
+
+SCATTER_COLL_NAME = "PH_Scatter"
+# 用自定义属性标记散布集合，避免依赖集合名字（用户可能重命名）。
+SCATTER_COLL_ID = "ph_is_scatter"
+
+def find_scatter_collection():
+    """按自定义属性标记查找散布集合；找不到时回退到旧版命名（不写入数据）。"""
+    for coll in bpy.data.collections:
+        if coll.get(SCATTER_COLL_ID):
+            return coll
+    return bpy.data.collections.get(SCATTER_COLL_NAME)
+
+scatter_tool_props = lambda: bpy.context.scene.scatter_tool
+
+# 可作为散布源的物体类型。
+# 除网格类外，新增 EMPTY（集合实例/空物体）、LIGHT（灯光）等，
+# 这些类型 .copy() 同样有效，INSTANCE 模式会共享其数据（集合实例仍指向同一集合）。
+_SOURCE_TYPES = {
+    "MESH", "CURVE", "SURFACE", "FONT", "META",
+    "EMPTY", "LIGHT", "LIGHT_PROBE", "VOLUME",
+    "GPENCIL", "GREASEPENCIL", "CURVES",
+}
+
+
+# 几何辅助
+# ----------------------------------------------------------------------
+
+def tangent_basis(normal: Vector):
+    n = normal.normalized()
+    up = Vector((0.0, 0.0, 1.0))
+    if abs(n.dot(up)) > 0.999:
+        up = Vector((1.0, 0.0, 0.0))
+    t1 = n.cross(up).normalized()
+    t2 = n.cross(t1).normalized()
+    return t1, t2
+
+
+def _unit_rows(v: np.ndarray) -> np.ndarray:
+    length = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.where(length > 0.0, length, 1.0)
+
+
+def _skew(v: np.ndarray) -> np.ndarray:
+    """(N, 3) 向量的叉乘矩阵 (N, 3, 3)。"""
+    k = np.zeros((len(v), 3, 3))
+    k[:, 0, 1], k[:, 0, 2] = -v[:, 2], v[:, 1]
+    k[:, 1, 0], k[:, 1, 2] = v[:, 2], -v[:, 0]
+    k[:, 2, 0], k[:, 2, 1] = -v[:, 1], v[:, 0]
+    return k
+
+
+def instance_rotations(normals: np.ndarray, angles: np.ndarray, tilts: np.ndarray, tilt_dirs: np.ndarray,
+                       align: bool) -> np.ndarray:
+    """批量计算实例旋转矩阵 (N, 3, 3)：倾斜 @ 对齐法线 @ 绕 Z 旋转，
+    与逐个用 Quaternion 组合（rotation_difference / tangent_basis）的结果一致。
+    """
+    n = _unit_rows(np.asarray(normals, dtype=np.float64))
+    count = len(n)
+    eye = np.broadcast_to(np.eye(3), (count, 3, 3))
+
+    c, s = np.cos(angles), np.sin(angles)
+    rot = np.zeros((count, 3, 3))
+    rot[:, 0, 0], rot[:, 0, 1] = c, -s
+    rot[:, 1, 0], rot[:, 1, 1] = s, c
+    rot[:, 2, 2] = 1.0
+
+    if align:
+        # Z 轴到法线的最短弧旋转：I + K + K²/(1+cos)
+        k = _skew(np.stack((-n[:, 1], n[:, 0], np.zeros(count)), axis=1))
+        cos = n[:, 2]
+        anti = cos < -1.0 + 1e-9
+        scale = 1.0 / np.where(anti, 1.0, 1.0 + cos)
+        align_m = eye + k + (k @ k) * scale[:, None, None]
+        # 反向时 mathutils 绕 (1, 1, 0) 转半圈
+        align_m[anti] = ((0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, -1.0))
+        rot = align_m @ rot
+
+    tilted = tilts > 0.0
+    if tilted.any():
+        nt = n[tilted]
+        up = np.zeros_like(nt)
+        pole = np.abs(nt[:, 2]) > 0.999
+        up[~pole, 2] = 1.0
+        up[pole, 0] = 1.0
+        t1 = _unit_rows(np.cross(nt, up))
+        t2 = _unit_rows(np.cross(nt, t1))
+        d = tilt_dirs[tilted][:, None]
+        k = _skew(np.cos(d) * t1 + np.sin(d) * t2)
+        a = tilts[tilted][:, None, None]
+        tilt_m = eye[:len(nt)] + np.sin(a) * k + (1.0 - np.cos(a)) * (k @ k)
+        rot[tilted] = tilt_m @ rot[tilted]
+    return rot
+
+
+def rotations_to_euler(rot: np.ndarray) -> np.ndarray:
+    """旋转矩阵 (N, 3, 3) 转 XYZ 欧拉角 (N, 3)，与 Matrix.to_euler() 一样取绝对值和较小的一组解。"""
+    cy = np.hypot(rot[:, 0, 0], rot[:, 1, 0])
+    e1 = np.stack((np.arctan2(rot[:, 2, 1], rot[:, 2, 2]),
+                   np.arctan2(-rot[:, 2, 0], cy),
+                   np.arctan2(rot[:, 1, 0], rot[:, 0, 0])), axis=1)
+    e2 = np.stack((np.arctan2(-rot[:, 2, 1], -rot[:, 2, 2]),
+                   np.arctan2(-rot[:, 2, 0], -cy),
+                   np.arctan2(-rot[:, 1, 0], -rot[:, 0, 0])), axis=1)
+    out = np.where((np.abs(e1).sum(axis=1) > np.abs(e2).sum(axis=1))[:, None], e2, e1)
+    # 万向锁：Z 角取 0
+    lock = cy <= 16.0 * np.finfo(np.float32).eps
+    if lock.any():
+        out[lock, 0] = np.arctan2(-rot[lock, 1, 2], rot[lock, 1, 1])
+        out[lock, 1] = np.arctan2(-rot[lock, 2, 0], cy[lock])
+        out[lock, 2] = 0.0
+    return out
+
+
+class _StampJob:
+    """一次落刷的放置进度，超出时间预算时留在队列里下次继续。"""
+
+    __slots__ = ("center", "normal", "pressure", "rng", "batch", "radius", "target", "spacing_active",
+                 "footprint", "placed", "start")
+
+    def __init__(self, center, normal, pressure, rng):
+        self.center = center
+        self.normal = normal
+        self.pressure = pressure
+        self.rng = rng
+        self.batch = None
+        self.placed = 0
+        self.start = 0
+
+
+class ScatterEngine:
+    """散布放置逻辑的 mixin。调用顺序：init_engine() 一次，之后每次笔触
+    begin_stroke_state() → begin_paint() → paint_ray()*（或 erase_at()*）→ end_paint()。
+    """
+
+    props = None
+    sources = None
+    weights = None
+    source_table = None  # 按权重抽取散布源的别名表
+    source_radii = None  # (S,) 各散布源未缩放时的包围半径
+    source_scales = None  # (S, 3) 各散布源自身的世界缩放
+    target = None  # 目标物体，或指定的表面集合
+    surface = None  # 目标表面（TargetSurface，或表面集合的 SurfaceSet）
+
+    created_session = None  # 整个会话创建的物体
+    created_stroke = 0  # 当前笔触创建数
+    created_count = 0  # 整个会话创建的实例数（物体与点实例）
+    erased_stroke = 0
+    collection = None
+
+    grid = None  # 间距索引（SpatialHash），整个会话内跨笔触保留
+    grid_cell = 0.1
+    index_keys = None  # 索引句柄 -> 实例键（物体名，或 (点云物体名, 点编号)）
+    index_handles = None  # 实例键 -> 索引句柄
+    index_stamp = None  # 上次同步时散布集合的状态，用于发现撤销/外部改动
+    stacker = None  # 叠加模式投射器，按索引句柄缓存实例的局部 BVH
+    last_stamp = None
+    stroke_skip = None  # 叠加模式场景投射时跳过的物体名（散布源本身）
+
+    rng = None  # 当前笔触的随机数发生器，由笔触种子创建
+    stamp_budget = None  # 每次落刷可用的放置时间（秒），None 表示一次做完
+    stamp_queue = None  # 尚未完成的落刷（_StampJob）
+    stroke_log = None  # 当前笔触的 StrokeLog，不记录时为 None
+    point_layers = None  # 散布源名 -> PointLayer
+
+    # 遮罩
+    mask = None  # MaskPyramid，未启用遮罩时为 None
+
+    def init_engine(self, props):
+        self.props = props
+        self.created_session = []
+        self.created_stroke = 0
+        self.created_count = 0
+        self.erased_stroke = 0
+        self.point_layers = {}
+        self.grid = SpatialHash(self.grid_cell)
+        self.index_keys = {}
+        self.index_handles = {}
+        self.index_stamp = None
+        self.stacker = StackCaster()
+        self.rng = np.random.default_rng()
+        self.stamp_queue = deque()
+        self.stroke_log = None
+        self.last_stamp = None
+        self._reset_target()
+
+    # STROKE
+    # ------------------------------------------------------------------
+
+    def begin_stroke_state(self):
+        self.created_stroke = 0
+        self.erased_stroke = 0
+        self.last_stamp = None
+        self.stroke_log = None
+        # 撤销后点云网格可能已被还原，每次落笔重新从网格载入
+        self.point_layers = {}
+        self._sync_index()
+
+    def seed_stroke(self, seed: int = None) -> int:
+        """用给定种子（None 时新取一个）重建随机数发生器，返回所用种子。"""
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self.rng = np.random.default_rng(seed)
+        return seed
+
+    def begin_paint(self, context, sources, weights, target, seed: int = None, record: bool = False) -> bool:
+        """准备绘制笔触：散布源、目标表面、间距网格与随机种子。目标没有可用表面时返回 False。
+        :param record: 记录本次笔触（end_paint 时写入散布集合）
+        """
+        self.sources = list(sources)
+        self.weights = list(weights)
+        if sum(self.weights) <= 0:
+            self.weights = [1.0] * len(self.sources)
+        self._cache_sources()
+        # 叠加模式场景投射时需要跳过散布源本身
+        self.stroke_skip = {o.name for o in self.sources}
+
+        self.setup_target(context, target)
+        if self.surface is None:
+            return False
+        self.compute_grid_cell()
+        # 撤销/重做后缓存的集合引用可能失效，每次落笔前重新获取，避免 ReferenceError
+        self.collection = self.get_scatter_collection(context)
+        seed = self.seed_stroke(seed)
+        if record:
+            kind = "COLLECTION" if isinstance(self.target, bpy.types.Collection) else "OBJECT"
+            self.stroke_log = StrokeLog("PAINT", seed, snapshot_props(self.props),
+                                        [o.name for o in self.sources], self.weights, (kind, self.target.name))
+        return True
+
+    def _cache_sources(self):
+        """每次笔触预先算好散布源的抽样表、包围半径（包围盒对角线的一半）与自身缩放，落刷时整批查表。"""
+        self.source_table = AliasTable(self.weights)
+        dims = np.array([tuple(s.dimensions) for s in self.sources], dtype=np.float64).reshape(-1, 3)
+        self.source_radii = np.linalg.norm(dims, axis=1) * 0.5
+        self.source_scales = np.array([tuple(s.matrix_world.to_scale()) for s in self.sources],
+                                      dtype=np.float64).reshape(-1, 3)
+
+    def begin_erase(self, record: bool = False):
+        if record:
+            self.stroke_log = StrokeLog("ERASE")
+
+    def end_paint(self):
+        """结束笔触：做完排队的落刷，释放目标，并把有效笔触的记录追加到散布集合。"""
+        if self.stamp_queue:
+            self.drain_stamps(bpy.context)
+        log = self.stroke_log
+        self.stroke_log = None
+        self._clear_target_data()
+        coll = find_scatter_collection()
+        if log is not None and coll is not None and len(log) and (self.created_stroke or self.erased_stroke):
+            append_stroke(coll, log)
+        self.index_stamp = self._index_stamp(coll)
+
+    def replay_stroke(self, context, log: StrokeLog, overrides: dict = None, seed_offset: int = 0) -> bool:
+        """按记录重新执行一次笔触，不依赖视图与鼠标事件。源或目标已不存在时返回 False。
+        :param overrides: 覆盖记录中的属性值（属性名 -> 值）
+        """
+        self.begin_stroke_state()
+        if log.mode == "ERASE":
+            self.begin_erase()
+            for center, radius in log.erases():
+                self.erase_at(Vector(center), radius)
+            self.end_paint()
+            return True
+
+        self.props = ReplayProps(context.scene.scatter_tool, log.props, overrides)
+        pairs = [(bpy.data.objects.get(name), w) for name, w in zip(log.sources, log.weights)]
+        pairs = [(o, w) for o, w in pairs if o is not None]
+        target = self.props.target_collection
+        if target is None and log.target is not None:
+            kind, name = log.target
+            target = (bpy.data.collections if kind == "COLLECTION" else bpy.data.objects).get(name)
+        if not pairs or target is None:
+            return False
+        if not self.begin_paint(context, [o for o, _w in pairs], [w for _o, w in pairs], target,
+                                seed=(log.seed + seed_offset) & 0xFFFFFFFF):
+            return False
+        # 记录的逐射线半径还原绘制中的半径调整；覆盖值里指定了半径时以覆盖值为准
+        use_radius = not (overrides and "radius" in overrides)
+        for origin, direction, pressure, radius in log.rays():
+            if use_radius and radius is not None:
+                self.props.set_value("radius", radius)
+            self.paint_ray(context, Vector(origin), Vector(direction), pressure)
+        self.end_paint()
+        return True
+
+    # TARGET
+    # ------------------------------------------------------------------
+
+    def setup_target(self, context, target):
+        depsgraph = context.evaluated_depsgraph_get()
+        self._reset_target()
+
+        use_mask = self.props.use_mask and self.props.mask_image is not None
+        if isinstance(target, bpy.types.Collection):
+            objs = self._surface_members(context, target)
+            if not objs:
+                return
+            # 成员的 BVH 在射线第一次进入其包围盒时才建立，之后与单个目标一样进入缓存
+            self.surface = SurfaceSet(depsgraph, objs, with_uv=use_mask)
+        else:
+            # 同一目标在几何/变换未变时复用缓存的 BVH，不再每次落笔重建
+            self.surface = get_surface(depsgraph, target, with_uv=use_mask)
+        self.target = target
+        if use_mask and (isinstance(self.surface, SurfaceSet) or self.surface.tri_uv is not None):
+            self.mask = get_pyramid(self.props.mask_image)
+
+    def _surface_members(self, context, coll):
+        """表面集合中可作为目标的网格：可见、且不是散布源或散布结果。"""
+        skip = {o.name for o in self.sources or ()}
+        # 只对表面集合的少数成员逐个查询散布集合，不遍历全部散布实例
+        scattered = find_scatter_collection()
+        scattered = scattered.all_objects if scattered is not None else None
+        view_layer = context.view_layer
+        return [o for o in coll.all_objects
+                if o.type == "MESH" and o.name not in skip
+                and (scattered is None or scattered.get(o.name) is None)
+                and o.visible_get(view_layer=view_layer)]
+
+    def _reset_target(self):
+        self.target = None
+        self.surface = None
+        self.mask = None
+
+    def _clear_target_data(self):
+        self._reset_target()
+
+    # RAYCAST
+    # ------------------------------------------------------------------
+
+    def _cast(self, origin_w: Vector, dir_w: Vector):
+        """返回 (世界坐标, 世界法线, 三角形索引, 命中表面, 距离)"""
+        if self.surface is not None:
+            return self.surface.cast(origin_w, dir_w)
+        return None
+
+    def _cast_scene(self, context, origin_w: Vector, dir_w: Vector):
+        """叠加模式用：对整个场景投射（含已散布物体），跳过散布源本身。"""
+        depsgraph = context.evaluated_depsgraph_get()
+        skip = self.stroke_skip or set()
+        direction = dir_w.normalized()
+        start = origin_w.copy()
+        for _ in range(8):
+            result, location, normal, _i, obj, _m = context.scene.ray_cast(depsgraph, start, direction)
+            if not result:
+                return None
+            if obj is None or obj.name not in skip:
+                # 场景投射的面索引不属于目标表面，不参与遮罩采样
+                return location, normal.normalized(), None, None, (location - origin_w).length
+            start = location + direction * 0.0001
+        return None
+
+    def _cast_stacked(self, context, origins: np.ndarray, direction: Vector):
+        """叠加模式：同方向批量投射目标表面与附近已散布实例。"""
+        c = origins.mean(axis=0)
+        spread = float(np.sqrt(((origins - c) ** 2).sum(axis=1).max()))
+        # 索引半径是包围盒半对角线；原点不在包围盒中心时实例可伸出更远，按两倍放宽
+        reach = spread + 2.0 * self.grid.max_radius + self.props.radius
+        depsgraph = context.evaluated_depsgraph_get()
+        handles = self.grid.query_radius(c, reach).tolist()
+        instances = self.stacker.instances(handles, lambda h: self._stack_instance(depsgraph, h))
+        return self.stacker.cast_many(self.surface, origins, direction, instances)
+
+    def _stack_instance(self, depsgraph, handle):
+        """把间距索引句柄解析为可叠加实例（局部 BVH + 世界矩阵）。"""
+        key = self.index_keys.get(handle)
+        if key is None:
+            return None
+        if isinstance(key, tuple):
+            # 点实例：暂存尚未写回的点找不到，返回 None 以便之后重新解析
+            layer = self._point_layer_of(bpy.data.objects.get(key[0]))
+            if layer is None or layer.source is None:
+                return None
+            rows = np.flatnonzero(layer.ids == key[1])
+            if not len(rows):
+                return None
+            r = int(rows[0])
+            src = layer.source
+            matrix = layer.obj.matrix_world @ Matrix.LocRotScale(
+                Vector(layer.co[r].tolist()), Euler(layer.rot[r].tolist()), Vector(layer.scale[r].tolist()))
+        else:
+            src = bpy.data.objects.get(key)
+            if src is None:
+                return None
+            matrix = src.matrix_world.copy()
+        local = get_local_mesh(depsgraph, src)
+        if local is None or local.bvh is None:
+            return None
+        return StackInstance(local.bvh, matrix, local.reach)
+
+    # PAINT
+    # ------------------------------------------------------------------
+
+    def paint_ray(self, context, origin: Vector, direction: Vector, pressure: float = 1.0):
+        """沿一条世界空间射线绘制：定位落点，离上次落刷足够远时落刷。返回 (落点, 法线) 或 None。"""
+        # 叠加模式：用场景投射（含已散布物体）定位落点，可在其表面继续堆叠
+        if self.props.use_stacking:
+            res = self._cast_scene(context, origin, direction)
+        else:
+            res = self._cast(origin, direction)
+        return self._paint_hit(context, origin, direction, pressure, res)
+
+    def _paint_hit(self, context, origin: Vector, direction: Vector, pressure: float, res):
+        if self.stroke_log is not None:
+            self.stroke_log.add_ray(origin, direction, pressure, self.props.radius)
+        if res is None:
+            return None
+        center, normal = res[0], res[1]
+
+        step = max(self._effective_radius(pressure) * 0.4, 1e-4)
+        if self.last_stamp is not None and (center - self.last_stamp).length < step:
+            return center, normal
+        self.last_stamp = center
+
+        self.do_stamp(context, center, normal, pressure)
+        return center, normal
+
+    def paint_path(self, context, points, direction: Vector = Vector((0.0, 0.0, -1.0)),
+                   pressure: float = 1.0):
+        """沿世界空间点列 (N, 3) 绘制，等同于沿该路径拖动笔刷。
+
+        点列按最小笔刷间距的一半重采样，每个点从目标表面包围盒外沿 direction 投射；
+        非叠加模式下全部射线一次批量投射（叠加模式依赖前面落刷的结果，逐条投射）。
+        """
+        direction = Vector(direction).normalized()
+        d = np.asarray(direction, dtype=np.float64)
+        samples = resample_polyline(points, max(self._min_radius() * 0.2, 1e-4))
+        lo, hi = self.surface.bounds()
+        half = 0.5 * float(np.linalg.norm(hi - lo))
+        # 起点退到包围盒之外：沿射线方向到包围盒中心的投影再加半对角线
+        lift = np.maximum((samples - (lo + hi) * 0.5) @ d + half, 0.0) + 1e-3
+        origins = samples - lift[:, None] * d
+        if self.props.use_stacking:
+            for origin in origins:
+                self.paint_ray(context, Vector(origin), direction, pressure)
+            return
+        hits = self.surface.cast_many(origins, direction)
+        for origin, res in zip(origins, hits):
+            self._paint_hit(context, Vector(origin), direction, pressure, res)
+
+    # 单次笔触放置上限与尝试系数，避免大半径/高密度时卡死
+    _MAX_PER_STAMP = 300
+    _ATTEMPT_FACTOR = 6
+    _MAX_ATTEMPTS = 2000
+
+    def _effective_radius(self, pressure: float = 1.0) -> float:
+        """笔刷有效半径（优先级：压感 > 随机 > 固定）。"""
+        p = self.props
+        if p.use_pressure_radius:
+            lo, hi = p.pressure_radius_min, p.pressure_radius_max
+            if hi < lo:
+                lo, hi = hi, lo
+            return max(0.001, lo + (hi - lo) * max(0.0, min(1.0, pressure)))
+        if p.use_random_radius:
+            lo, hi = p.radius, p.radius_max
+            if hi < lo:
+                lo, hi = hi, lo
+            return max(0.001, float(self.rng.uniform(lo, hi)))
+        return p.radius
+
+    def _min_radius(self) -> float:
+        """笔刷可能取到的最小有效半径。"""
+        p = self.props
+        if p.use_pressure_radius:
+            return max(0.001, min(p.pressure_radius_min, p.pressure_radius_max))
+        if p.use_random_radius:
+            return max(0.001, min(p.radius, p.radius_max))
+        return p.radius
+
+    def _stamp_density(self, pressure: float) -> float:
+        """密度来源（优先级）：压感映射 > 随机 > 固定"""
+        p = self.props
+        if p.use_pressure_density:
+            lo, hi = p.pressure_density_min, p.pressure_density_max
+            if hi < lo:
+                lo, hi = hi, lo
+            return lo + (hi - lo) * max(0.0, min(1.0, pressure))
+        if p.use_random_density:
+            lo, hi = p.density, p.density_max
+            if hi < lo:
+                lo, hi = hi, lo
+            return float(self.rng.uniform(lo, hi))
+        return p.density
+
+    def do_stamp(self, context, center: Vector, normal: Vector, pressure: float = 1.0):
+        """落刷。设置了 stamp_budget 时只放置到预算用完，剩余部分排队，由 drain_stamps() 继续。
+
+        每次落刷从笔触随机数发生器取一个子种子，延后执行也得到与一次做完完全相同的结果。
+        """
+        seed = int(self.rng.integers(1 << 63))
+        self.stamp_queue.append(_StampJob(center, normal, pressure, np.random.default_rng(seed)))
+        self.drain_stamps(context, self.stamp_budget)
+
+    def drain_stamps(self, context, budget: float = None) -> bool:
+        """按先后顺序继续排队的落刷，budget 为本次可用的秒数（None 不限制）。返回队列是否已清空。"""
+        deadline = None if budget is None else time.perf_counter() + budget
+        queue = self.stamp_queue
+        try:
+            while queue:
+                if not self._run_stamp(context, queue[0], deadline):
+                    return False
+                queue.popleft()
+            return True
+        finally:
+            self._flush_point_layers()
+
+    def _prepare_stamp(self, job) -> bool:
+        """确定落刷的半径、目标数量并生成全部候选点；目标数量为 0 时返回 False。"""
+        radius = self._effective_radius(job.pressure)
+        t1, t2 = tangent_basis(job.normal)
+        density = self._stamp_density(job.pressure)
+
+        # 目标数量 = 密度 × 笔刷面积；越界则做安全裁剪
+        area = math.pi * radius * radius
+        target = int(round(density * area))
+        if self.props.use_pressure_density:
+            # 启用压感时允许“轻触少放、几乎不放”，因此下限为 0
+            target = max(0, min(target, self._MAX_PER_STAMP))
+            if target == 0:
+                return False
+        else:
+            target = max(1, min(target, self._MAX_PER_STAMP))
+
+        # 有间距/防穿插约束时，超采样尝试以填满可行点位，
+        # 这样大“最小距离”不会因尝试次数不足而导致散布过少。
+        md_active = self.props.min_dist > 0.0 or (
+            self.props.use_random_min_dist and self.props.min_dist_max > 0.0)
+        spacing_active = md_active or self.props.avoid_overlap
+        if spacing_active:
+            attempts = min(target * self._ATTEMPT_FACTOR, self._MAX_ATTEMPTS)
+        else:
+            attempts = target
+
+        # 一次性生成全部候选点与随机参数，之后按块投射、过滤
+        batch = None
+        if spacing_active and self.props.distribution == "POISSON":
+            batch = self._poisson_batch(job.center, job.normal, t1, t2, radius, job.pressure, attempts)
+        if batch is None:
+            batch = draw_stamp_batch(self.rng, self.props, attempts, job.center, t1, t2, radius,
+                                     self.source_table, job.pressure)
+        if not self.props.use_stacking:
+            batch.blocked = self._blocked_candidates(job.center, job.normal, t1, t2, radius, batch.points)
+        job.batch = batch
+        job.radius = radius
+        job.target = target
+        job.spacing_active = spacing_active
+        # 每个目标实例平均占据的世界尺寸，遮罩按它选择 mip 层级
+        job.footprint = math.sqrt(area / target)
+        return True
+
+    def _run_stamp(self, context, job, deadline) -> bool:
+        """继续一次落刷直到完成或超过 deadline（每次至少处理一块），返回是否完成。"""
+        if job.batch is None:
+            # 候选点在落刷真正开始时才生成（蓝噪声依赖此前落刷的结果），使用落刷自己的随机数发生器
+            stroke_rng, self.rng = self.rng, job.rng
+            try:
+                if not self._prepare_stamp(job):
+                    return True
+            finally:
+                self.rng = stroke_rng
+        batch = job.batch
+        attempts = len(batch)
+        while job.placed < job.target and job.start < attempts:
+            # 只投射“还差多少”对应的候选块，避免间距约束下一次把 2000 个都投完
+            need = job.target - job.placed
+            chunk = need * self._ATTEMPT_FACTOR if job.spacing_active else need
+            end = min(attempts, job.start + max(chunk, self._MIN_CHUNK))
+            job.placed += self._place_chunk(context, batch, job.start, end, job.normal, job.radius,
+                                            need, job.footprint)
+            job.start = end
+            if deadline is not None and time.perf_counter() >= deadline:
+                return job.placed >= job.target or job.start >= attempts
+        return True
+
+    # 按块处理候选点的最小块大小
+    _MIN_CHUNK = 16
+
+    def _place_chunk(self, context, batch, start: int, end: int, normal: Vector, radius: float,
+                     limit: int, footprint: float = 0.0) -> int:
+        """投射 [start, end) 的候选点，批量过滤后依次做间距检测并创建实例。"""
+        count = end - start
+        down = -normal
+        lift = normal * (radius + 0.001)
+        stacking = self.props.use_stacking
+
+        locs = []
+        nors = []
+        surfs = []  # 每个候选点命中的表面（表面集合时为具体成员）
+        tri_ids = np.full(count, -1, dtype=np.int64)
+        keep = np.ones(count, dtype=bool)
+        origins = batch.points[start:end] + np.asarray(lift)
+        blocked = batch.blocked[start:end] if batch.blocked is not None else None
+        if stacking:
+            hits = self._cast_stacked(context, origins, down)
+        elif blocked is not None and blocked.any():
+            # 只投射落在可通过过滤的三角形上方的候选点
+            hits = [None] * count
+            live = np.flatnonzero(~blocked)
+            for i, res in zip(live.tolist(), self.surface.cast_many(origins[live], down)):
+                hits[i] = res
+        else:
+            hits = self.surface.cast_many(origins, down)
+        for i in range(count):
+            res = hits[i]
+            if res is None:
+                # 采样点正下方没有表面：笔刷大于散布面时会出现这种情况。
+                # 默认跳过，避免把物体散布到表面之外。
+                if self.props.limit_to_surface:
+                    keep[i] = False
+                res = (Vector(batch.points[start + i]), normal, None, None)
+            locs.append(res[0])
+            nors.append(res[1])
+            surfs.append(res[3])
+            if res[2] is not None:
+                tri_ids[i] = res[2]
+
+        locs_arr = np.array(locs)
+        if blocked is not None:
+            keep &= ~blocked
+        keep &= self.passes_filters(locs_arr, np.array(nors))
+
+        if self.mask is not None:
+            sel = np.flatnonzero(keep & (tri_ids >= 0))
+            if len(sel):
+                values = self.sample_mask([surfs[i] for i in sel.tolist()], tri_ids[sel], locs_arr[sel],
+                                          footprint)
+                keep[sel[batch.mask_rolls[start + sel] > values]] = False
+
+        kept = np.flatnonzero(keep)
+        if not len(kept) or limit <= 0:
+            return 0
+        js = start + kept
+        inst_radii = self.source_radii[batch.src_idx[js]] * batch.scales[js].max(axis=1)
+        ok, handles = self.grid.accept_batch(np.array([tuple(locs[i]) for i in kept]), inst_radii,
+                                             batch.min_dists[js], self.props.avoid_overlap,
+                                             self.props.overlap_factor, limit)
+        rows, js = kept[ok], js[ok]
+        keys = self.create_instances(batch.src_idx[js], batch.scales[js], locs_arr[rows],
+                                     np.array(nors)[rows], batch.angles[js], batch.tilts[js],
+                                     batch.tilt_dirs[js], batch.heights[js])
+        for h, key in zip(handles.tolist(), keys):
+            self.index_keys[h] = key
+            self.index_handles[key] = h
+        return len(handles)
+
+    def _poisson_batch(self, center: Vector, normal: Vector, t1: Vector, t2: Vector, radius: float,
+                       pressure: float, limit: int):
+        """蓝噪声分布：候选点本身已满足间距，投射次数约等于目标数量。
+        间距取可能的最小值，精确判定仍交给 accept_point。返回 None 时退回随机采样。
+        """
+        spacing = self._poisson_spacing()
+        occupied = None
+        near = self._grid_points_near(center, radius + spacing)
+        if len(near):
+            d = near - np.asarray(center)
+            # 只把贴近笔刷切平面的已有点作为占位（起伏地表允许 ±半径 的法向偏差）
+            d = d[np.abs(d @ np.asarray(normal)) <= radius]
+            occupied = np.stack((d @ np.asarray(t1), d @ np.asarray(t2)), axis=1)
+        offsets = poisson_disk(self.rng, radius, spacing, occupied, max_points=limit)
+        if offsets is None:
+            return None
+        offsets = offsets[:limit]
+        return draw_stamp_batch(self.rng, self.props, len(offsets), center, t1, t2, radius,
+                                self.source_table, pressure, offsets=offsets)
+
+    def _poisson_spacing(self) -> float:
+        p = self.props
+        md = min(p.min_dist, p.min_dist_max) if p.use_random_min_dist else p.min_dist
+        if p.avoid_overlap and self.sources:
+            if p.use_pressure_scale or p.use_random_scale:
+                lo = min(p.scale_min, p.scale_max)
+            else:
+                lo = p.scale_min
+            md = max(md, 2.0 * float(self.source_radii.min()) * lo * p.overlap_factor)
+        return md
+
+    def _grid_points_near(self, center: Vector, reach: float) -> np.ndarray:
+        """间距索引中距 center 不超过 reach 的已接受点，返回 (N, 3)。"""
+        return self.grid.points_near(center, reach)
+
+    def passes_filters(self, locs: np.ndarray, normals: np.ndarray) -> np.ndarray:
+        """坡度/高度过滤，locs 与 normals 为 (N, 3)，返回布尔掩码。"""
+        p = self.props
+        ok = np.ones(len(locs), dtype=bool)
+        if not len(locs):
+            return ok
+        if p.use_slope_limit:
+            ok &= slope_degrees(normals) <= p.slope_limit
+        if p.use_height_limit:
+            ok &= (locs[:, 2] >= p.height_min) & (locs[:, 2] <= p.height_max)
+        return ok
+
+    # 预筛网格每边的格数
+    _FILTER_GRID = 64
+    # 射线柱内三角形超过候选点数的该倍数时不做预筛
+    _FILTER_TRI_RATIO = 16
+
+    def _blocked_candidates(self, center: Vector, normal: Vector, t1: Vector, t2: Vector, radius: float,
+                            points: np.ndarray):
+        """投射前的坡度/高度预筛：返回 (N,) 布尔数组，True 表示候选点下方只有无法通过过滤的三角形。
+
+        取射线柱（笔刷圆盘沿法线向下、不限深度）内的三角形，按三角形缓存的坡度与 Z 范围分成通过/未通过两类，
+        把两类的包围盒投影到切平面，在网格上累计覆盖；只被“未通过”覆盖的格子里的候选点无需投射。
+        候选射线可能命中的三角形都在射线柱内，且其包围盒必然覆盖该格，因此不会误删可通过的点。
+        射线柱内三角形远多于候选点时，栅格化比投射更贵，不做预筛。无需预筛时返回 None。
+        """
+        p = self.props
+        if not (p.use_slope_limit or p.use_height_limit) or not len(points):
+            return None
+        slope_limit = p.slope_limit if p.use_slope_limit else None
+        z_range = (p.height_min, p.height_max) if p.use_height_limit else None
+        # 射线起点在切平面上方 radius 处
+        found = self.surface.faces_under(center, normal, radius, radius + 0.001)
+        if sum(len(ids) for _surf, ids in found) > self._FILTER_TRI_RATIO * len(points):
+            return None
+        tri_co, ok = [], []
+        for surf, ids in found:
+            if len(ids):
+                ok.append(surf.face_filter(slope_limit, z_range)[ids])
+                tri_co.append(surf.co[surf.tris[ids]])
+        if not ok:
+            return None
+        ok = np.concatenate(ok)
+        if ok.all():
+            return None
+        rel = np.concatenate(tri_co).astype(np.float64) - np.asarray(center)
+        u = rel @ np.asarray(t1)
+        v = rel @ np.asarray(t2)
+
+        g = self._FILTER_GRID
+        cell = 2.0 * radius / g
+        i0 = np.floor((u.min(axis=1) + radius) / cell).astype(np.int64)
+        i1 = np.floor((u.max(axis=1) + radius) / cell).astype(np.int64)
+        j0 = np.floor((v.min(axis=1) + radius) / cell).astype(np.int64)
+        j1 = np.floor((v.max(axis=1) + radius) / cell).astype(np.int64)
+        inside = (i1 >= 0) & (i0 < g) & (j1 >= 0) & (j0 < g)
+        kind = ok[inside].astype(np.int64)
+        i0, i1 = np.clip(i0[inside], 0, g - 1), np.clip(i1[inside], 0, g - 1) + 1
+        j0, j1 = np.clip(j0[inside], 0, g - 1), np.clip(j1[inside], 0, g - 1) + 1
+        # 二维差分累计每格被两类三角形覆盖的次数
+        cover = np.zeros((2, g + 1, g + 1), dtype=np.int64)
+        np.add.at(cover, (kind, i0, j0), 1)
+        np.add.at(cover, (kind, i0, j1), -1)
+        np.add.at(cover, (kind, i1, j0), -1)
+        np.add.at(cover, (kind, i1, j1), 1)
+        cover = cover.cumsum(axis=1).cumsum(axis=2)
+        rejected = (cover[0] > 0) & (cover[1] == 0)
+
+        rel = points - np.asarray(center)
+        ci = np.clip(np.floor((rel @ np.asarray(t1) + radius) / cell).astype(np.int64), 0, g - 1)
+        cj = np.clip(np.floor((rel @ np.asarray(t2) + radius) / cell).astype(np.int64), 0, g - 1)
+        return rejected[ci, cj]
+
+    def accept_point(self, loc: Vector, radius: float, md: float = None) -> bool:
+        if md is None:
+            if self.props.use_random_min_dist:
+                lo, hi = self.props.min_dist, self.props.min_dist_max
+                if hi < lo:
+                    lo, hi = hi, lo
+                md = float(self.rng.uniform(lo, hi))
+            else:
+                md = self.props.min_dist
+        ok, _handles = self.grid.accept_batch(tuple(loc), radius, md, self.props.avoid_overlap,
+                                              self.props.overlap_factor)
+        return bool(ok[0])
+
+    def compute_grid_cell(self):
+        max_r = float(self.source_radii.max()) * self.props.scale_max if len(self.source_radii) else 0.0
+        factor = max(self.props.overlap_factor, 1.0)
+        # 随机间距时，网格必须按最大可能间距取格，保证邻域搜索覆盖
+        eff_min_dist = self.props.min_dist
+        if self.props.use_random_min_dist:
+            eff_min_dist = max(self.props.min_dist, self.props.min_dist_max)
+        self.grid_cell = max(eff_min_dist, max_r * 2.0 * factor, 1e-4)
+        self.grid.set_cell(self.grid_cell)
+
+    # SPACING INDEX
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _index_stamp(coll):
+        """散布集合的简易状态：物体数 + 点实例总数，变化即说明索引已过期。"""
+        if coll is None:
+            return None
+        try:
+            points = sum(len(o.data.vertices) for o in iter_point_objects(coll))
+            return coll.session_uid, len(coll.objects), points
+        except ReferenceError:
+            return None
+
+    def _sync_index(self):
+        """散布集合在上次笔触后被撤销或手动改动时，从集合重新载入间距索引。"""
+        coll = find_scatter_collection()
+        stamp = self._index_stamp(coll)
+        if stamp != self.index_stamp:
+            self._seed_index(coll)
+            self.index_stamp = stamp
+
+    def _seed_index(self, coll):
+        """用散布集合里已有的物体与点实例填充间距索引，使间距约束跨笔触生效。"""
+        self.grid.clear()
+        self.stacker.clear()
+        self.index_keys = {}
+        self.index_handles = {}
+        if coll is None:
+            return
+        pts, radii, keys = [], [], []
+        for obj in coll.objects:
+            if is_point_object(obj):
+                continue
+            pts.append(tuple(obj.matrix_world.translation))
+            radii.append(Vector(obj.dimensions).length * 0.5)
+            keys.append(obj.name)
+        self._index_add(pts, radii, keys)
+
+        self._load_point_layers(coll)
+        for layer in self.point_layers.values():
+            name = layer.obj.name
+            self._index_add(layer.co, layer.instance_radii(), [(name, i) for i in layer.ids.tolist()])
+
+    def _index_add(self, pts, radii, keys):
+        handles = self.grid.insert(np.asarray(pts, dtype=np.float64).reshape(-1, 3), radii)
+        for h, key in zip(handles.tolist(), keys):
+            self.index_keys[h] = key
+            self.index_handles[key] = h
+
+    def _index_discard(self, keys):
+        """擦除后只删除对应句柄（O(删除数)），不重建索引。"""
+        handles = []
+        for key in keys:
+            h = self.index_handles.pop(key, None)
+            if h is not None:
+                del self.index_keys[h]
+                handles.append(h)
+        if handles:
+            self.grid.remove(handles)
+            self.stacker.forget(handles)
+
+    def create_instances(self, src_idx: np.ndarray, scales: np.ndarray, locs: np.ndarray, normals: np.ndarray,
+                         angles: np.ndarray, tilts: np.ndarray, tilt_dirs: np.ndarray,
+                         heights: np.ndarray) -> list:
+        """批量创建一块已接受的实例，返回与输入顺序一致的实例键。
+
+        变换一次算成 NumPy 矩阵栈；点实例按散布源整块暂存，物体实例在一个循环里
+        复制、设置矩阵（链接前，不触发场景内更新）并链接，最后统一取消选择。
+        """
+        count = len(src_idx)
+        if not count:
+            return []
+        normals = _unit_rows(np.asarray(normals, dtype=np.float64))
+        rot = instance_rotations(normals, angles, tilts, tilt_dirs, self.props.align_normal)
+        final_scale = scales * self.source_scales[src_idx]
+        location = locs + normals * heights[:, None]
+        self.created_stroke += count
+        self.created_count += count
+
+        # 点实例：只记录变换，落刷结束后统一写回点云
+        if self.props.output == "POINTS":
+            keys = [None] * count
+            euler = rotations_to_euler(rot)
+            for k in np.unique(src_idx).tolist():
+                rows = np.flatnonzero(src_idx == k)
+                layer = self._point_layer(self.sources[k])
+                name = layer.obj.name
+                ids = layer.extend(location[rows], euler[rows], final_scale[rows])
+                for r, pid in zip(rows.tolist(), ids.tolist()):
+                    keys[r] = (name, pid)
+            return keys
+
+        mats = np.zeros((count, 4, 4))
+        mats[:, :3, :3] = rot * final_scale[:, None, :]
+        mats[:, :3, 3] = location
+        mats[:, 3, 3] = 1.0
+
+        # 防御性：若缓存的集合引用因撤销/重做而失效，重新获取一个有效集合
+        try:
+            link = self.collection.objects.link
+        except ReferenceError:
+            self.collection = self.get_scatter_collection(bpy.context)
+            link = self.collection.objects.link
+        copy_data = self.props.duplicate == "COPY"
+        sources = self.sources
+        objs = []
+        for k, mat in zip(src_idx.tolist(), mats.tolist()):
+            src = sources[k]
+            new_obj = src.copy()
+            if copy_data and src.data:
+                new_obj.data = src.data.copy()
+            new_obj.matrix_world = Matrix(mat)
+            link(new_obj)
+            objs.append(new_obj)
+        # 视图层在第一次 select_set 时同步一次，之后不再重复
+        for obj in objs:
+            obj.select_set(False)
+
+        self.created_session.extend(objs)
+        return [obj.name for obj in objs]
+
+    # POINT INSTANCES
+    # ------------------------------------------------------------------
+
+    def _point_layer(self, src) -> PointLayer:
+        """获取散布源对应的点实例层（不存在则创建点云物体）。"""
+        layer = self.point_layers.get(src.name)
+        if layer is not None:
+            return layer
+        try:
+            coll = self.collection
+            obj = find_point_object(coll, src)
+        except ReferenceError:
+            coll = self.get_scatter_collection(bpy.context)
+            self.collection = coll
+            obj = find_point_object(coll, src)
+        if obj is None:
+            obj = create_point_object(coll, src)
+        layer = self.point_layers[src.name] = PointLayer(obj)
+        return layer
+
+    def _load_point_layers(self, coll):
+        """载入散布集合里全部点实例层。"""
+        for obj in iter_point_objects(coll):
+            self._point_layer_of(obj)
+
+    def _point_layer_of(self, obj):
+        """点云物体对应的点实例层（按需载入）；物体无效时返回 None。"""
+        if obj is None or not is_point_object(obj):
+            return None
+        src = obj.get(POINTS_SOURCE)
+        key = src.name if src is not None else obj.name
+        layer = self.point_layers.get(key)
+        if layer is None:
+            layer = self.point_layers[key] = PointLayer(obj)
+        return layer
+
+    def _flush_point_layers(self):
+        for layer in self.point_layers.values():
+            try:
+                layer.flush()
+            except ReferenceError:
+                pass
+
+    # ERASE
+    # ------------------------------------------------------------------
+
+    def erase_at(self, center: Vector, radius: float):
+        """删除球形范围内的散布实例（物体与点实例）。"""
+        if self.stroke_log is not None:
+            self.stroke_log.add_erase(center, radius)
+        coll = find_scatter_collection()
+        if coll is None:
+            return
+        # 通过间距索引查询笔刷内的实例，不再遍历整个散布集合
+        keys = [self.index_keys[h] for h in self.grid.query_radius(center, radius).tolist()
+                if h in self.index_keys]
+        if not keys:
+            return
+
+        objs = []
+        point_ids = {}  # 点云物体名 -> 要删除的点编号
+        for key in keys:
+            if isinstance(key, tuple):
+                point_ids.setdefault(key[0], []).append(key[1])
+                continue
+            obj = bpy.data.objects.get(key)
+            if obj is not None and obj.name in coll.objects:
+                objs.append(obj)
+        kept = set()  # 删除失败、仍在场景中的物体名，保留其索引
+        if objs:
+            names = [obj.name for obj in objs]
+            try:
+                # 一次调用删除全部命中物体，只触发一次依赖图更新
+                bpy.data.batch_remove(objs)
+            except (ReferenceError, RuntimeError):
+                kept = {name for name in names if bpy.data.objects.get(name) is not None}
+            self.erased_stroke += len(names) - len(kept)
+
+        # 点实例：按编号在数组上删除
+        for name, ids in point_ids.items():
+            layer = self._point_layer_of(bpy.data.objects.get(name))
+            if layer is not None:
+                self.erased_stroke += len(layer.remove_ids(ids))
+        self._flush_point_layers()
+        self._index_discard([key for key in keys if key not in kept])
+
+    # MASK
+    # ------------------------------------------------------------------
+
+    def sample_mask(self, surfaces, tri_ids: np.ndarray, points: np.ndarray,
+                    footprint: float = 0.0) -> np.ndarray:
+        """批量采样遮罩亮度（0~1）。surfaces 为每个点命中的表面，tri_ids 为该表面上的三角形索引，
+        points 为 (N, 3) 世界坐标；footprint 为每个候选点代表的世界空间尺寸，决定采样的 mip 层级。
+        """
+        values = np.ones(len(tri_ids))
+        groups = {}
+        for i, surf in enumerate(surfaces):
+            groups.setdefault(id(surf), (surf, []))[1].append(i)
+        # 表面集合的各成员有各自的 UV，按命中的表面分组采样
+        for surf, rows in groups.values():
+            rows = np.array(rows, dtype=np.int64)
+            values[rows] = sample_mask(self.mask, surf, tri_ids[rows], points[rows], footprint)
+        if self.props.mask_invert:
+            values = 1.0 - values
+        return values
+
+    # COLLECTION
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def get_scatter_collection(context):
+        coll = find_scatter_collection()
+        if coll is None:
+            coll = bpy.data.collections.new(SCATTER_COLL_NAME)
+        # 确保标记存在（含旧版按名字创建的集合，首次使用时补标记）
+        if not coll.get(SCATTER_COLL_ID):
+            coll[SCATTER_COLL_ID] = True
+        if coll not in context.scene.collection.children_recursive:
+            try:
+                context.scene.collection.children.link(coll)
+            except RuntimeError:
+                pass
+        return coll
@@ -0,0 +1,288 @@
+"""散布的点实例输出。
+
+每个散布源对应散布集合里的一个点云网格物体：顶点即实例位置，
+旋转/缩放存为点属性，由几何节点 Instance on Points 把源物体实例化到点上。
+绘制时只向按容量预留的打包数组追加数据，写回网格时只给网格追加新点，
+不再为每个实例创建一个 Object；只有擦除后才整体重写网格。
+"""
+import bpy
+import numpy as np
+
+# 点云物体上的自定义属性：标记 + 指向散布源物体
+# （源物体被删除后指针会变为空，因此单独保留一个标记）
+POINTS_ID = "ph_scatter_points"
+POINTS_SOURCE = "ph_point_source"
+NODE_GROUP_NAME = "PH_ScatterInstances"
+MODIFIER_NAME = "PH Scatter Instances"
+
+ROT_ATTR = "ph_rotation"  # 欧拉角 (XYZ)
+SCALE_ATTR = "ph_scale"
+ID_ATTR = "ph_id"  # 稳定的点编号，擦除后不复用
+
+
+def is_point_object(obj) -> bool:
+    try:
+        return bool(obj.get(POINTS_ID))
+    except ReferenceError:
+        return False
+
+
+def iter_point_objects(coll):
+    for obj in coll.objects:
+        if is_point_object(obj):
+            yield obj
+
+
+def ensure_node_group():
+    """获取（必要时创建）点实例化节点组：Points + Object Info(源) -> Instance on Points"""
+    ng = bpy.data.node_groups.get(NODE_GROUP_NAME)
+    if ng is not None and ng.bl_idname == "GeometryNodeTree":
+        return ng
+    ng = bpy.data.node_groups.new(NODE_GROUP_NAME, "GeometryNodeTree")
+    iface = ng.interface
+    iface.new_socket("Geometry", in_out="INPUT", socket_type="NodeSocketGeometry")
+    iface.new_socket("Source", in_out="INPUT", socket_type="NodeSocketObject")
+    iface.new_socket("Geometry", in_out="OUTPUT", socket_type="NodeSocketGeometry")
+
+    nodes, links = ng.nodes, ng.links
+    n_in = nodes.new("NodeGroupInput")
+    n_in.location = (-600, 0)
+    n_out = nodes.new("NodeGroupOutput")
+    n_out.location = (300, 0)
+
+    info = nodes.new("GeometryNodeObjectInfo")
+    info.location = (-350, -120)
+    info.transform_space = "ORIGINAL"
+    info.inputs["As Instance"].default_value = True
+
+    rot = nodes.new("GeometryNodeInputNamedAttribute")
+    rot.location = (-350, -320)
+    rot.data_type = "FLOAT_VECTOR"
+    rot.inputs["Name"].default_value = ROT_ATTR
+
+    scale = nodes.new("GeometryNodeInputNamedAttribute")
+    scale.location = (-350, -460)
+    scale.data_type = "FLOAT_VECTOR"
+    scale.inputs["Name"].default_value = SCALE_ATTR
+
+    iop = nodes.new("GeometryNodeInstanceOnPoints")
+    iop.location = (0, 0)
+
+    links.new(n_in.outputs["Geometry"], iop.inputs["Points"])
+    links.new(n_in.outputs["Source"], info.inputs["Object"])
+    links.new(info.outputs["Geometry"], iop.inputs["Instance"])
+    links.new(rot.outputs["Attribute"], iop.inputs["Rotation"])
+    links.new(scale.outputs["Attribute"], iop.inputs["Scale"])
+    links.new(iop.outputs["Instances"], n_out.inputs["Geometry"])
+    return ng
+
+
+def create_point_object(coll, src):
+    """为散布源创建点云物体并挂上实例化修改器。"""
+    me = bpy.data.meshes.new(src.name + "_PH_Points")
+    obj = bpy.data.objects.new(me.name, me)
+    obj[POINTS_ID] = True
+    obj[POINTS_SOURCE] = src
+    coll.objects.link(obj)
+
+    ng = ensure_node_group()
+    mod = obj.modifiers.new(MODIFIER_NAME, "NODES")
+    mod.node_group = ng
+    mod[ng.interface.items_tree["Source"].identifier] = src
+    return obj
+
+
+def find_point_object(coll, src):
+    for obj in iter_point_objects(coll):
+        if obj.get(POINTS_SOURCE) == src:
+            return obj
+    return None
+
+
+class PointLayer:
+    """单个散布源的点实例层。
+
+    位置、旋转、缩放与编号保存在按容量倍增的连续 NumPy 数组中（co/rot/scale/ids 为有效部分的视图）；
+    绘制/擦除只改数组，flush() 时写回点云网格：只有追加时给网格添加新点并只写新点，
+    有删除时才清空网格整体重写。
+    """
+
+    # 新点数不超过网格点数的该分之一时逐点写入新点，否则整块 foreach_set（C 端拷贝）更快
+    _TAIL_RATIO = 64
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.source = obj.get(POINTS_SOURCE)
+        self._load()
+        self._pending = []  # 暂存的 (co, rot, scale) 数组块
+        self._pending_count = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def co(self) -> np.ndarray:
+        return self._co[:self._size]
+
+    @property
+    def rot(self) -> np.ndarray:
+        return self._rot[:self._size]
+
+    @property
+    def scale(self) -> np.ndarray:
+        return self._scale[:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def dirty(self) -> bool:
+        return self._rewrite or self._size != self._written
+
+    def _read_attr(self, me, name, width, dtype, key):
+        n = len(me.vertices)
+        attr = me.attributes.get(name)
+        if attr is None or attr.domain != "POINT" or len(attr.data) != n:
+            return None
+        buf = np.empty(n * width, dtype=dtype)
+        attr.data.foreach_get(key, buf)
+        return buf.reshape(n, width) if width > 1 else buf
+
+    def _load(self):
+        me = self.obj.data
+        n = len(me.vertices)
+        co = np.empty(n * 3, dtype=np.float32)
+        me.vertices.foreach_get("co", co)
+        rot = self._read_attr(me, ROT_ATTR, 3, np.float32, "vector")
+        scale = self._read_attr(me, SCALE_ATTR, 3, np.float32, "vector")
+        ids = self._read_attr(me, ID_ATTR, 1, np.int32, "value")
+
+        self._co = co.reshape(n, 3)
+        self._rot = rot if rot is not None else np.zeros((n, 3), dtype=np.float32)
+        self._scale = scale if scale is not None else np.ones((n, 3), dtype=np.float32)
+        self._ids = ids if ids is not None else np.arange(n, dtype=np.int32)
+        self._size = n
+        self._written = n  # 网格里已与数组前缀一致的点数
+        # 缺少属性的旧网格需要整体写回一次
+        self._rewrite = rot is None or scale is None or ids is None
+        self.next_id = int(self._ids.max()) + 1 if n else 0
+
+    def _reserve(self, extra: int):
+        need = self._size + extra
+        cap = len(self._ids)
+        if need <= cap:
+            return
+        cap = max(need, cap * 2, 256)
+        for name in ("_co", "_rot", "_scale", "_ids"):
+            old = getattr(self, name)
+            arr = np.empty((cap,) + old.shape[1:], dtype=old.dtype)
+            arr[:self._size] = old[:self._size]
+            setattr(self, name, arr)
+
+    def push(self, co, rot, scale) -> int:
+        """暂存单个实例，flush() 时与其它暂存实例一起追加；返回该点将获得的编号。"""
+        return int(self.extend((co,), (rot,), (scale,))[0])
+
+    def extend(self, co, rot, scale) -> np.ndarray:
+        """暂存一批实例（各为 (N, 3)），返回它们将获得的编号。"""
+        start = self.next_id + self._pending_count
+        co = np.asarray(co, dtype=np.float32).reshape(-1, 3)
+        self._pending.append((co, np.asarray(rot, dtype=np.float32).reshape(-1, 3),
+                              np.asarray(scale, dtype=np.float32).reshape(-1, 3)))
+        self._pending_count += len(co)
+        return np.arange(start, start + len(co), dtype=np.int32)
+
+    def append(self, co, rot, scale) -> np.ndarray:
+        """追加一批点（均摊 O(新点数)），返回它们的编号。"""
+        co = np.asarray(co, dtype=np.float32).reshape(-1, 3)
+        count = len(co)
+        ids = np.arange(self.next_id, self.next_id + count, dtype=np.int32)
+        self.next_id += count
+        self._reserve(count)
+        s, e = self._size, self._size + count
+        self._co[s:e] = co
+        self._rot[s:e] = np.asarray(rot, dtype=np.float32).reshape(-1, 3)
+        self._scale[s:e] = np.asarray(scale, dtype=np.float32).reshape(-1, 3)
+        self._ids[s:e] = ids
+        self._size = e
+        return ids
+
+    def remove(self, mask: np.ndarray) -> np.ndarray:
+        """删除 mask 为 True 的点，返回被删除点的编号。"""
+        removed = self.ids[mask]
+        if len(removed):
+            keep = np.flatnonzero(~mask)
+            n = len(keep)
+            for name in ("_co", "_rot", "_scale", "_ids"):
+                arr = getattr(self, name)
+                arr[:n] = arr[keep]
+            self._size = n
+            self._rewrite = True
+        return removed
+
+    def remove_ids(self, ids) -> np.ndarray:
+        """按编号删除，返回实际删除的编号。"""
+        return self.remove(np.isin(self.ids, np.asarray(ids, dtype=np.int32)))
+
+    def remove_within(self, center, radius: float) -> np.ndarray:
+        d = self.co - np.asarray(center, dtype=np.float32)
+        return self.remove(np.einsum("ij,ij->i", d, d) <= radius * radius)
+
+    def instance_radii(self) -> np.ndarray:
+        """各点实例的包围半径：源物体局部包围盒按点缩放后对角线的一半。"""
+        src = self.source
+        if src is None:
+            return np.zeros(len(self.co))
+        src_scale = np.abs(np.array(src.matrix_world.to_scale()))
+        size = np.array(src.dimensions) / np.where(src_scale > 0.0, src_scale, 1.0)
+        return np.linalg.norm(self.scale * size, axis=1) * 0.5
+
+    def flush(self):
+        """把改动写回点云网格：只有追加时只添加并写入新点，有删除时整体重写。"""
+        if self._pending:
+            co, rot, scale = (np.concatenate(parts) for parts in zip(*self._pending))
+            self._pending.clear()
+            self._pending_count = 0
+            self.append(co, rot, scale)
+        if not self.dirty:
+            return
+        me = self.obj.data
+        if self._rewrite or len(me.vertices) != self._written:
+            me.clear_geometry()
+            me.vertices.add(self._size)
+            self._write_all(me)
+        else:
+            start, n = self._written, self._size
+            me.vertices.add(n - start)
+            if (n - start) * self._TAIL_RATIO <= n:
+                self._write_tail(me, start)
+            else:
+                self._write_all(me)
+        me.update()
+        self._written = self._size
+        self._rewrite = False
+
+    def _attr_targets(self, me):
+        for name, data_type, key, arr in ((ROT_ATTR, "FLOAT_VECTOR", "vector", self.rot),
+                                          (SCALE_ATTR, "FLOAT_VECTOR", "vector", self.scale),
+                                          (ID_ATTR, "INT", "value", self.ids)):
+            attr = me.attributes.get(name)
+            if attr is None:
+                attr = me.attributes.new(name, data_type, "POINT")
+            yield attr, key, arr
+
+    def _write_all(self, me):
+        me.vertices.foreach_set("co", self.co.ravel())
+        for attr, key, arr in self._attr_targets(me):
+            attr.data.foreach_set(key, arr.ravel())
+
+    def _write_tail(self, me, start: int):
+        """只写入 start 之后的新点（网格已添加对应数量的点，属性随之扩展）。"""
+        verts = me.vertices
+        for i, co in enumerate(self.co[start:].tolist(), start):
+            verts[i].co = co
+        for attr, key, arr in self._attr_targets(me):
+            data = attr.data
+            for i, value in enumerate(arr[start:].tolist(), start):
+                setattr(data[i], key, value)
@@ -0,0 +1,240 @@
+"""散布密度遮罩。
+
+每个图像修订只构建一次单通道 float16 亮度金字塔（逐级 2x2 平均），
+放入按字节预算淘汰的 LRU 缓存，在笔触之间、模态会话之间共享。
+图像被绘制或重新载入时，depsgraph 更新处理器递增修订号使缓存失效；
+缓存非空时才挂载处理器，清空缓存时一并移除。
+
+采样时用目标表面的三角形 UV 做重心插值，并按每个候选点代表的世界空间尺寸
+（笔刷足迹）与三角形的纹素密度选择 mip 层级，一批候选点一次向量化完成。
+"""
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+
+from ..utils.geometry import timed
+from ..utils.lru import ByteLRU
+
+# Rec. 709 亮度系数
+_LUMA = np.array((0.2126, 0.7152, 0.0722), dtype=np.float32)
+
+# 金字塔第 0 层的最大边长：更大的图像缩小后作为第 0 层（内存代价见 _read_luma）
+MASK_MAX_SIZE = 4096
+# 所有金字塔合计的内存上限（字节）
+MASK_CACHE_BYTES = 256 * 1024 * 1024
+# 金字塔最小层的边长
+_MIN_LEVEL_SIZE = 8
+# 读入时每次转换亮度的行数
+_BLOCK_ROWS = 256
+
+_CACHE = ByteLRU(MASK_CACHE_BYTES, lambda entry: entry[1].nbytes)  # 图像名 -> (缓存键, MaskPyramid)
+_REVISION = {}  # 图像名 -> 修订号
+
+
+class MaskPyramid:
+    """单通道 float16 亮度金字塔，levels[0] 为最高分辨率。"""
+
+    def __init__(self, levels):
+        self.levels = levels
+        self.nbytes = sum(level.nbytes for level in levels)
+
+    @property
+    def size(self):
+        h, w = self.levels[0].shape
+        return w, h
+
+    def sample(self, uv: np.ndarray, level: np.ndarray) -> np.ndarray:
+        """按 (N, 2) 的 UV 在各自层级上最近邻采样，返回 (N,) float32。"""
+        out = np.empty(len(uv), dtype=np.float32)
+        for lv in np.unique(level).tolist():
+            sel = np.flatnonzero(level == lv)
+            img = self.levels[lv]
+            h, w = img.shape
+            x = (np.mod(uv[sel, 0], 1.0) * w).astype(np.int64) % w
+            y = (np.mod(uv[sel, 1], 1.0) * h).astype(np.int64) % h
+            out[sel] = img[y, x]
+        return out
+
+
+def _read_buffer(img) -> np.ndarray:
+    w, h = img.size[0], img.size[1]
+    buf = np.empty(w * h * 4, dtype=np.float32)
+    img.pixels.foreach_get(buf)
+    return buf.reshape(h, w, 4)
+
+
+def _box_luma(pixels: np.ndarray, k: int) -> np.ndarray:
+    """(H, W, 4) 像素按 k×k 方块平均并转为亮度，按行块处理，临时数组只有一个行块大小。"""
+    h, w = pixels.shape[:2]
+    col_starts = np.arange(0, w, k)
+    col_counts = np.diff(np.append(col_starts, w))
+    out = np.empty(((h + k - 1) // k, len(col_starts)), dtype=np.float32)
+    rows = max(1, _BLOCK_ROWS // k) * k
+    for r0 in range(0, h, rows):
+        lum = pixels[r0:r0 + rows, :, :3] @ _LUMA
+        row_starts = np.arange(0, len(lum), k)
+        row_counts = np.diff(np.append(row_starts, len(lum)))
+        sums = np.add.reduceat(np.add.reduceat(lum, row_starts, axis=0), col_starts, axis=1)
+        out[r0 // k:r0 // k + len(row_starts)] = sums / (row_counts[:, None] * col_counts[None, :])
+    return np.clip(out, 0.0, 1.0, out=out)
+
+
+def _read_luma(img) -> np.ndarray:
+    """读取亮度 (H, W) float32，长边不超过 MASK_MAX_SIZE。
+
+    foreach_get 只能一次读出整张图的 float32 RGBA（每像素 16 字节，16K 图约 4 GB），无法分块：
+    - 8 位图像：先在 Blender 内复制一份再缩小，复制品仍是 8 位缓冲区（每像素 4 字节，16K 约 1 GB），
+      之后只读入缩小后的小图，峰值远低于整图读入；
+    - 浮点图像：复制品同样是浮点缓冲区，与整图读入一样大，且还要再加缩小结果，
+      因此直接读入整图一次（峰值约 每像素 16 字节），再按整数倍在行块内做方块平均。
+    """
+    w, h = img.size[0], img.size[1]
+    k = max(1, -(-max(w, h) // MASK_MAX_SIZE))
+    if k == 1:
+        return _box_luma(_read_buffer(img), 1)
+    if not img.is_float:
+        src = img.copy()
+        try:
+            src.scale(max(1, w // k), max(1, h // k))
+            return _box_luma(_read_buffer(src), 1)
+        finally:
+            bpy.data.images.remove(src)
+    return _box_luma(_read_buffer(img), k)
+
+
+def _downsample(level: np.ndarray) -> np.ndarray:
+    """2x2 平均缩小一级（奇数边复制最后一行/列）。"""
+    h, w = level.shape
+    if h % 2:
+        level = np.concatenate((level, level[-1:]), axis=0)
+    if w % 2:
+        level = np.concatenate((level, level[:, -1:]), axis=1)
+    return level.reshape(level.shape[0] // 2, 2, level.shape[1] // 2, 2).mean(axis=(1, 3))
+
+
+def _build_pyramid(img) -> MaskPyramid:
+    with timed("scatter.mask_pyramid"):
+        lum = _read_luma(img)
+        levels = [lum.astype(np.float16)]
+        while min(lum.shape) > _MIN_LEVEL_SIZE:
+            lum = _downsample(lum)
+            levels.append(lum.astype(np.float16))
+    return MaskPyramid(levels)
+
+
+def _image_key(img):
+    return img.name, tuple(img.size), _REVISION.get(img.name, 0)
+
+
+def get_pyramid(img):
+    """获取图像的亮度金字塔（缓存未命中或图像已修改时重建）；图像无效时返回 None。"""
+    if img is None:
+        return None
+    key = _image_key(img)
+    cached = _CACHE.get(img.name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    w, h = img.size[0], img.size[1]
+    if w <= 0 or h <= 0:
+        return None
+    try:
+        pyramid = _build_pyramid(img)
+    except Exception:
+        return None
+    _CACHE.put(img.name, (key, pyramid))
+    _add_handlers()
+    return pyramid
+
+
+def barycentric(points: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """points 相对三角形 (a, b, c) 的重心坐标，均为 (N, 3)，返回 (N, 3)。"""
+    v0 = b - a
+    v1 = c - a
+    v2 = points - a
+    d00 = np.einsum("ij,ij->i", v0, v0)
+    d01 = np.einsum("ij,ij->i", v0, v1)
+    d11 = np.einsum("ij,ij->i", v1, v1)
+    d20 = np.einsum("ij,ij->i", v2, v0)
+    d21 = np.einsum("ij,ij->i", v2, v1)
+    denom = d00 * d11 - d01 * d01
+    # 退化三角形：全部权重给第一个角点
+    safe = np.where(np.abs(denom) > 1e-20, denom, 1.0)
+    v = np.where(denom != 0.0, (d11 * d20 - d01 * d21) / safe, 0.0)
+    w = np.where(denom != 0.0, (d00 * d21 - d01 * d20) / safe, 0.0)
+    return np.stack((1.0 - v - w, v, w), axis=1)
+
+
+def _texel_density(pyramid: MaskPyramid, tri_co: np.ndarray, tri_uv: np.ndarray) -> np.ndarray:
+    """每个三角形上，第 0 层每世界单位长度对应的纹素数。tri_co 为 (N, 3, 3)，tri_uv 为 (N, 3, 2)。"""
+    w, h = pyramid.size
+    e1 = tri_uv[:, 1] - tri_uv[:, 0]
+    e2 = tri_uv[:, 2] - tri_uv[:, 0]
+    uv_area = np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]) * (0.5 * w * h)
+    edges = np.cross(tri_co[:, 1] - tri_co[:, 0], tri_co[:, 2] - tri_co[:, 0])
+    world_area = 0.5 * np.linalg.norm(edges, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        density = np.sqrt(uv_area / world_area)
+    return np.where(np.isfinite(density), density, 0.0)
+
+
+def sample_mask(pyramid: MaskPyramid, surface, tri_ids: np.ndarray, points: np.ndarray,
+                footprint: float = 0.0) -> np.ndarray:
+    """按命中的三角形与世界坐标批量采样遮罩亮度，返回 (N,)。
+    :param footprint: 每个候选点代表的世界空间尺寸，用于选择 mip 层级（0 表示总用第 0 层）
+    表面没有 UV 时全部返回 1（不遮挡）。
+    """
+    if surface.tri_uv is None or not len(tri_ids):
+        return np.ones(len(tri_ids))
+    tri_co = surface.co[surface.tris[tri_ids]]
+    tri_uv = surface.tri_uv[tri_ids]
+    weights = barycentric(np.asarray(points, dtype=np.float64), tri_co[:, 0], tri_co[:, 1], tri_co[:, 2])
+    uv = np.einsum("ij,ijk->ik", weights, tri_uv)
+
+    level = np.zeros(len(uv), dtype=np.int64)
+    if footprint > 0.0 and len(pyramid.levels) > 1:
+        texels = footprint * _texel_density(pyramid, tri_co, tri_uv)
+        level = np.floor(np.log2(np.maximum(texels, 1.0))).astype(np.int64)
+        level = np.clip(level, 0, len(pyramid.levels) - 1)
+    return pyramid.sample(uv, level)
+
+
+# 缓存失效
+# ----------------------------------------------------------------------
+
+def clear_cache():
+    """清空缓存并移除处理器。"""
+    _CACHE.clear()
+    _REVISION.clear()
+    _remove_handlers()
+
+
+@persistent
+def _invalidate_on_update(_scene, depsgraph):
+    """图像被绘制/重新载入时递增修订号。"""
+    for update in depsgraph.updates:
+        idb = update.id
+        if isinstance(idb, bpy.types.Image):
+            _REVISION[idb.name] = _REVISION.get(idb.name, 0) + 1
+
+
+@persistent
+def _clear_on_load(_dummy):
+    """打开/新建文件后同名图像可能已是另一张图，缓存整体作废。"""
+    clear_cache()
+
+
+def _add_handlers():
+    if _invalidate_on_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(_invalidate_on_update)
+    if _clear_on_load not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(_clear_on_load)
+
+
+def _remove_handlers():
+    for handlers, func in ((bpy.app.handlers.depsgraph_update_post, _invalidate_on_update),
+                           (bpy.app.handlers.load_post, _clear_on_load)):
+        if func in handlers:
+            try:
+                handlers.remove(func)
+            except Exception:
+                pass
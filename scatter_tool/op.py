@@ -4,55 +4,28 @@ import random
 import bpy
 import gpu
 from bpy.app.handlers import persistent
+from bpy.props import EnumProperty, FloatProperty, IntProperty, StringProperty
 from bpy.app.translations import pgettext_iface as _iface
 from gpu_extras.batch import batch_for_shader
-from mathutils import Vector, Matrix, Quaternion
-from mathutils.bvhtree import BVHTree
-from mathutils.interpolate import poly_3d_calc
-
+from mathutils import Vector
+
+from .api import scatter_path
+from .engine import ScatterEngine, _SOURCE_TYPES, find_scatter_collection, scatter_tool_props, tangent_basis
+from .instancing import POINTS_ID, is_point_object
+from .mask import clear_cache as clear_mask_cache
+from .overlay import DensityHeatmap, format_bytes, instance_bytes
+from .strokelog import STROKE_LOG_KEY, clear_strokes, read_strokes
+from .surface import add_surface_handler, remove_surface_handler
 from ..utils import get_pref
 from ..utils.raycast import mouse_ray
 
-SCATTER_COLL_NAME = "PH_Scatter"
-# 用自定义属性标记散布集合，避免依赖集合名字（用户可能重命名）。
-SCATTER_COLL_ID = "ph_is_scatter"
-
 # 全局单例标记，避免工具 keymap 在 MOUSEMOVE 上重复启动多个模态
 _INSTANCE_RUNNING = False
 
 
-def find_scatter_collection():
-    """按自定义属性标记查找散布集合；找不到时回退到旧版命名（不写入数据）。"""
-    for coll in bpy.data.collections:
-        if coll.get(SCATTER_COLL_ID):
-            return coll
-    return bpy.data.collections.get(SCATTER_COLL_NAME)
-
-scatter_tool_props = lambda: bpy.context.scene.scatter_tool
-
-# 可作为散布源的物体类型。
-# 除网格类外，新增 EMPTY（集合实例/空物体）、LIGHT（灯光）等，
-# 这些类型 .copy() 同样有效，INSTANCE 模式会共享其数据（集合实例仍指向同一集合）。
-_SOURCE_TYPES = {
-    "MESH", "CURVE", "SURFACE", "FONT", "META",
-    "EMPTY", "LIGHT", "LIGHT_PROBE", "VOLUME",
-    "GPENCIL", "GREASEPENCIL", "CURVES",
-}
-
-
 # 几何辅助
 # ----------------------------------------------------------------------
 
-def tangent_basis(normal: Vector):
-    n = normal.normalized()
-    up = Vector((0.0, 0.0, 1.0))
-    if abs(n.dot(up)) > 0.999:
-        up = Vector((1.0, 0.0, 0.0))
-    t1 = n.cross(up).normalized()
-    t2 = n.cross(t1).normalized()
-    return t1, t2
-
-
 def circle_points(center: Vector, normal: Vector, radius: float, segments: int = 48):
     t1, t2 = tangent_basis(normal)
     pts = []
@@ -84,6 +57,38 @@ def active_tool_is_scatter(context) -> bool:
         return True
 
 
+# 超出时间预算未完成的落刷由定时器在事件之间继续。
+# 定时器只在笔刷模态运行且有排队落刷时存在，finish / 文件加载时清除引用。
+_DRAIN = {"op": None}
+
+
+def _drain_stamps_timer():
+    op = _DRAIN["op"]
+    if op is None or not _INSTANCE_RUNNING:
+        _DRAIN["op"] = None
+        return None
+    try:
+        done = op.drain_stamps(bpy.context, op.stamp_budget)
+        op._tag(bpy.context)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        done = True
+    if done:
+        _DRAIN["op"] = None
+        return None
+    return 0.0
+
+
+def _stop_drain_timer():
+    _DRAIN["op"] = None
+    if bpy.app.timers.is_registered(_drain_stamps_timer):
+        try:
+            bpy.app.timers.unregister(_drain_stamps_timer)
+        except Exception:
+            pass
+
+
 # 模块级笔刷绘制状态与句柄。
 # 绘制回调只读取该字典，绝不引用算子实例，避免算子被释放后产生
 # "StructRNA has been removed" 的孤儿绘制崩溃。
@@ -96,7 +101,10 @@ _DRAW = {
     "width": 2.0,
     "pressure": 1.0,
     "show_pressure": False,
+    "heatmap": None,  # 开启密度叠加层时为 _HEATMAP
+    "stats": None,  # (笔触数, 会话数, 总数, 峰值密度, {复制方式: 估算字节})
 }
+_HEATMAP = DensityHeatmap()
 _draw_handle = None
 _draw_handle_px = None
 
@@ -105,6 +113,14 @@ def _draw_brush_callback():
     try:
         if not _DRAW.get("active"):
             return
+        heat = _DRAW.get("heatmap")
+        if heat is not None:
+            shader = gpu.shader.from_builtin("SMOOTH_COLOR")
+            batch = heat.batch(shader)
+            if batch is not None:
+                gpu.state.blend_set("ALPHA")
+                batch.draw(shader)
+                gpu.state.blend_set("NONE")
         center = _DRAW.get("center")
         normal = _DRAW.get("normal")
         if center is None or normal is None:
@@ -126,9 +142,9 @@ def _draw_brush_callback():
 
 
 def _draw_pressure_callback():
-    """屏幕空间绘制：在笔刷处显示当前实时笔压百分比。"""
+    """屏幕空间绘制：在笔刷处显示当前实时笔压百分比与实例计数。"""
     try:
-        if not _DRAW.get("active") or not _DRAW.get("show_pressure"):
+        if not _DRAW.get("active") or not (_DRAW.get("show_pressure") or _DRAW.get("stats")):
             return
         center = _DRAW.get("center")
         if center is None:
@@ -144,15 +160,33 @@ def _draw_pressure_callback():
             return
         ui = max(bpy.context.preferences.system.ui_scale, 0.5)
         font_id = 0
-        p = _DRAW.get("pressure", 1.0)
-        text = "%s %d%%" % (_iface("Pressure"), int(round(p * 100)))
         blf.enable(font_id, blf.SHADOW)
         blf.shadow(font_id, 3, 0.0, 0.0, 0.0, 0.85)
         blf.shadow_offset(font_id, 1, -1)
         blf.size(font_id, round(13 * ui))
-        blf.color(font_id, 1.0, 0.85, 0.2, 0.95)
-        blf.position(font_id, co.x + round(14 * ui), co.y + round(14 * ui), 0.0)
-        blf.draw(font_id, text)
+        if _DRAW.get("show_pressure"):
+            p = _DRAW.get("pressure", 1.0)
+            text = "%s %d%%" % (_iface("Pressure"), int(round(p * 100)))
+            blf.color(font_id, 1.0, 0.85, 0.2, 0.95)
+            blf.position(font_id, co.x + round(14 * ui), co.y + round(14 * ui), 0.0)
+            blf.draw(font_id, text)
+        stats = _DRAW.get("stats")
+        if stats:
+            stroke, session, total, peak, memory = stats
+            lines = (
+                "%s %d  ·  %s %d  ·  %s %d" % (_iface("Stroke"), stroke, _iface("Session"), session,
+                                              _iface("Total"), total),
+                "%s %.1f /m²" % (_iface("Peak Density"), peak),
+                "%s  %s %s  ·  %s %s  ·  %s %s" % (
+                    _iface("Memory"), _iface("Instance"), format_bytes(memory["INSTANCE"]),
+                    _iface("Object"), format_bytes(memory["COPY"]),
+                    _iface("Point Instances"), format_bytes(memory["POINTS"])),
+            )
+            step = round(16 * ui)
+            blf.color(font_id, 0.9, 0.9, 0.9, 0.9)
+            for i, line in enumerate(lines):
+                blf.position(font_id, co.x + round(14 * ui), co.y - round(14 * ui) - (i + 1) * step, 0.0)
+                blf.draw(font_id, line)
         blf.disable(font_id, blf.SHADOW)
     except Exception:
         pass
@@ -169,6 +203,7 @@ def _add_brush_draw():
             _draw_pressure_callback, (), "WINDOW", "POST_PIXEL")
     if _reset_scatter_state not in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.append(_reset_scatter_state)
+    add_surface_handler()
 
 
 def _remove_brush_draw():
@@ -191,9 +226,10 @@ def _remove_brush_draw():
             bpy.app.handlers.load_post.remove(_reset_scatter_state)
         except Exception:
             pass
+    remove_surface_handler()
 
 
-class PH_OT_scatter_brush(bpy.types.Operator):
+class PH_OT_scatter_brush(bpy.types.Operator, ScatterEngine):
     """Scatter Brush\nDrag on a surface to scatter, Ctrl+Drag to erase\nDrag on empty space to box-select source objects\nAlt+Wheel (hover), Wheel (while painting) or [ ]: Adjust Radius"""
     bl_idname = "object.ph_scatter_brush"
     bl_label = "Scatter Brush"
@@ -203,40 +239,17 @@ class PH_OT_scatter_brush(bpy.types.Operator):
     def poll(cls, context):
         return context.mode == "OBJECT" and context.area and context.area.type == "VIEW_3D"
 
-    # 运行时状态
+    # 运行时状态（放置相关的状态见 ScatterEngine）
     painting = False
     erasing = False
     ctrl = False
     cur_pressure = 1.0
 
-    sources = None
-    weights = None
-    target = None
-    bvh = None
-    eval_target = None
-    eval_mesh = None
-    target_matrix = None
-    target_matrix_inv = None
-
-    created_session = None  # 整个模态会话创建的物体
-    created_stroke = 0  # 当前笔触创建数
-    erased_stroke = 0
-    collection = None
-
-    grid = None
-    grid_cell = 0.1
-    last_stamp = None
-
     cur_center = None
     cur_normal = None
 
     start_area = None
 
-    # 遮罩
-    mask_pixels = None
-    mask_w = 0
-    mask_h = 0
-
     # INVOKE / MODAL
     # ------------------------------------------------------------------
 
@@ -245,23 +258,24 @@ class PH_OT_scatter_brush(bpy.types.Operator):
         if _INSTANCE_RUNNING:
             return {"CANCELLED"}
 
-        self.props = scatter_tool_props()
+        self.init_engine(scatter_tool_props())
         self.painting = False
         self.erasing = False
         self.ctrl = event.ctrl
         self.cur_pressure = 1.0
-        self.created_session = []
-        self.grid = {}
-        self.last_stamp = None
         self.cur_center = None
         self.cur_normal = None
-        self._reset_target()
 
         self.collection = self.get_scatter_collection(context)
         self.start_area = context.area
 
         # 仅在工具实际激活、进入模态时才注册绘制/加载处理器
         _add_brush_draw()
+        self._bytes_key = None
+        self._bytes = None
+        if self._show_density():
+            # 叠加层在第一笔之前就显示已有实例
+            self._sync_index()
 
         _INSTANCE_RUNNING = True
         context.window_manager.modal_handler_add(self)
@@ -366,7 +380,7 @@ class PH_OT_scatter_brush(bpy.types.Operator):
             self.update_hover(context, event)
             if self.painting:
                 if self.erasing:
-                    self.erase_at(context)
+                    self.erase_here()
                 else:
                     self.paint_at(context, event)
             self._tag(context)
@@ -424,40 +438,40 @@ class PH_OT_scatter_brush(bpy.types.Operator):
     # ------------------------------------------------------------------
 
     def begin_stroke(self, context, event):
-        self.created_stroke = 0
-        self.erased_stroke = 0
-        self.last_stamp = None
+        self.begin_stroke_state()
+        record = self.props.record_strokes
+        try:
+            budget = get_pref().scatter_tool.stamp_budget
+        except Exception:
+            budget = 0
+        self.stamp_budget = budget / 1000.0 if budget > 0 else None
 
         if event.ctrl:
             self.erasing = True
             self.painting = True
-            self.erase_at(context)
+            self.begin_erase(record)
+            self.erase_here()
             return
 
         self.erasing = False
-        self.sources = [o for o in context.selected_objects if o.type in _SOURCE_TYPES]
-        if not self.sources:
+        sources = [o for o in context.selected_objects if o.type in _SOURCE_TYPES]
+        if not sources:
             self.report({"WARNING"}, _iface("Please select at least one object to scatter"))
             self.painting = False
             return
+        weights = [max(0.0, getattr(o, "ph_scatter_weight", 1.0)) for o in sources]
 
-        self.weights = [max(0.0, getattr(o, "ph_scatter_weight", 1.0)) for o in self.sources]
-        if sum(self.weights) <= 0:
-            self.weights = [1.0] * len(self.sources)
-        # 叠加模式场景投射时需要跳过散布源本身
-        self._stroke_skip = {o.name for o in self.sources}
-
-        target = self.pick_target(context, event)
+        # 指定表面集合时笔触不再锁定在光标下的单个物体上，可跨越集合内的多个网格
+        target = self.props.target_collection or self.pick_target(context, event)
         if target is None:
             self.report({"INFO"}, _iface("No surface under cursor"))
             self.painting = False
             return
 
-        self.target = target
-        self.setup_target(context, target)
-        self.compute_grid_cell()
-        # 撤销/重做后缓存的集合引用可能失效，每次落笔前重新获取，避免 ReferenceError
-        self.collection = self.get_scatter_collection(context)
+        if not self.begin_paint(context, sources, weights, target, record=record):
+            self.report({"WARNING"}, _iface("Surface collection has no visible mesh"))
+            self.painting = False
+            return
 
         self.painting = True
         self.paint_at(context, event)
@@ -466,7 +480,12 @@ class PH_OT_scatter_brush(bpy.types.Operator):
         was_painting = self.painting
         self.painting = False
         self.erasing = False
-        self._clear_target_data()
+        if was_painting:
+            # 松开时做完剩余的落刷，最终数量与不设预算时相同
+            _stop_drain_timer()
+            self.end_paint()
+        else:
+            self._clear_target_data()
         # 延迟到模态事件之外推送撤销点：在模态事件内直接调用 bpy.ops.ed.undo_push
         # 可能释放正在运行算子的内存，导致工具卡死，因此用定时器延后执行。
         if was_painting and (self.created_stroke > 0 or self.erased_stroke > 0):
@@ -475,88 +494,6 @@ class PH_OT_scatter_brush(bpy.types.Operator):
             except Exception:
                 pass
 
-    def setup_target(self, context, target):
-        depsgraph = context.evaluated_depsgraph_get()
-        self._reset_target()
-
-        use_mask = self.props.use_mask and self.props.mask_image is not None
-        if use_mask:
-            self.eval_target = target.evaluated_get(depsgraph)
-            self.eval_mesh = self.eval_target.to_mesh()
-            self.target_matrix = self.eval_target.matrix_world.copy()
-            try:
-                self.target_matrix_inv = self.target_matrix.inverted()
-            except ValueError:
-                self.target_matrix_inv = Matrix.Identity(4)
-            self._build_mask()
-        else:
-            eval_obj = target.evaluated_get(depsgraph)
-            mesh = eval_obj.to_mesh()
-            mat = eval_obj.matrix_world
-            verts = [mat @ v.co for v in mesh.vertices]
-            polys = [tuple(p.vertices) for p in mesh.polygons]
-            try:
-                self.bvh = BVHTree.FromPolygons(verts, polys)
-            except Exception:
-                self.bvh = None
-            eval_obj.to_mesh_clear()
-
-    def _reset_target(self):
-        self.target = None
-        self.bvh = None
-        self.eval_target = None
-        self.eval_mesh = None
-        self.target_matrix = None
-        self.target_matrix_inv = None
-        self.mask_pixels = None
-        self.mask_w = 0
-        self.mask_h = 0
-
-    def _clear_target_data(self):
-        if self.eval_target is not None and self.eval_mesh is not None:
-            try:
-                self.eval_target.to_mesh_clear()
-            except Exception:
-                pass
-        self._reset_target()
-
-    # RAYCAST
-    # ------------------------------------------------------------------
-
-    def _cast(self, origin_w: Vector, dir_w: Vector):
-        """返回 (世界坐标, 世界法线, 局部坐标 or None, 面索引 or None)"""
-        if self.eval_mesh is not None and self.eval_target is not None:
-            mi = self.target_matrix_inv
-            lo = mi @ origin_w
-            ld = (mi.to_3x3() @ dir_w).normalized()
-            ok, loc, nor, idx = self.eval_target.ray_cast(lo, ld)
-            if not ok:
-                return None
-            wl = self.target_matrix @ loc
-            wn = (self.target_matrix.to_3x3().inverted_safe().transposed() @ nor).normalized()
-            return wl, wn, loc, idx
-        if self.bvh is not None:
-            loc, nor, idx, _dist = self.bvh.ray_cast(origin_w, dir_w)
-            if loc is None:
-                return None
-            return loc, nor.normalized(), None, idx
-        return None
-
-    def _cast_scene(self, context, origin_w: Vector, dir_w: Vector):
-        """叠加模式用：对整个场景投射（含已散布物体），跳过散布源本身。"""
-        depsgraph = context.evaluated_depsgraph_get()
-        skip = getattr(self, "_stroke_skip", None) or set()
-        direction = dir_w.normalized()
-        start = origin_w.copy()
-        for _ in range(8):
-            result, location, normal, _i, obj, _m = context.scene.ray_cast(depsgraph, start, direction)
-            if not result:
-                return None
-            if obj is None or obj.name not in skip:
-                return location, normal.normalized(), None, None
-            start = location + direction * 0.0001
-        return None
-
     def pick_target(self, context, event):
         depsgraph = context.evaluated_depsgraph_get()
         origin, direction = mouse_ray(context, event)
@@ -607,339 +544,37 @@ class PH_OT_scatter_brush(bpy.types.Operator):
 
     def paint_at(self, context, event):
         origin, direction = mouse_ray(context, event)
-        # 叠加模式：用场景投射（含已散布物体）定位落点，可在其表面继续堆叠
-        if self.props.use_stacking:
-            res = self._cast_scene(context, origin, direction)
-        else:
-            res = self._cast(origin, direction)
-        if res is None:
-            return
-        center, normal = res[0], res[1]
-        self.cur_center, self.cur_normal = center, normal
-
         pressure = 1.0
         if (self.props.use_pressure_density or self.props.use_pressure_scale
                 or self.props.use_pressure_radius):
             pressure = self.cur_pressure if getattr(event, "is_tablet", False) else 1.0
 
-        step = max(self._effective_radius(pressure) * 0.4, 1e-4)
-        if self.last_stamp is not None and (center - self.last_stamp).length < step:
-            return
-        self.last_stamp = center
-
-        self.do_stamp(context, center, normal, pressure)
-
-    # 单次笔触放置上限与尝试系数，避免大半径/高密度时卡死
-    _MAX_PER_STAMP = 300
-    _ATTEMPT_FACTOR = 6
-    _MAX_ATTEMPTS = 2000
-
-    def _effective_radius(self, pressure: float = 1.0) -> float:
-        """笔刷有效半径（优先级：压感 > 随机 > 固定）。"""
-        p = self.props
-        if p.use_pressure_radius:
-            lo, hi = p.pressure_radius_min, p.pressure_radius_max
-            if hi < lo:
-                lo, hi = hi, lo
-            return max(0.001, lo + (hi - lo) * max(0.0, min(1.0, pressure)))
-        if p.use_random_radius:
-            lo, hi = p.radius, p.radius_max
-            if hi < lo:
-                lo, hi = hi, lo
-            return max(0.001, random.uniform(lo, hi))
-        return p.radius
-
-    def do_stamp(self, context, center: Vector, normal: Vector, pressure: float = 1.0):
-        radius = self._effective_radius(pressure)
-        t1, t2 = tangent_basis(normal)
-
-        # 密度来源（优先级）：压感映射 > 随机 > 固定
-        if self.props.use_pressure_density:
-            lo, hi = self.props.pressure_density_min, self.props.pressure_density_max
-            if hi < lo:
-                lo, hi = hi, lo
-            density = lo + (hi - lo) * max(0.0, min(1.0, pressure))
-        elif self.props.use_random_density:
-            lo, hi = self.props.density, self.props.density_max
-            if hi < lo:
-                lo, hi = hi, lo
-            density = random.uniform(lo, hi)
-        else:
-            density = self.props.density
-
-        # 目标数量 = 密度 × 笔刷面积；越界则做安全裁剪
-        area = math.pi * radius * radius
-        target = int(round(density * area))
-        if self.props.use_pressure_density:
-            # 启用压感时允许“轻触少放、几乎不放”，因此下限为 0
-            target = max(0, min(target, self._MAX_PER_STAMP))
-            if target == 0:
-                return
-        else:
-            target = max(1, min(target, self._MAX_PER_STAMP))
-
-        # 有间距/防穿插约束时，超采样尝试以填满可行点位，
-        # 这样大“最小距离”不会因尝试次数不足而导致散布过少。
-        md_active = self.props.min_dist > 0.0 or (
-            self.props.use_random_min_dist and self.props.min_dist_max > 0.0)
-        spacing_active = md_active or self.props.avoid_overlap
-        if spacing_active:
-            attempts = min(target * self._ATTEMPT_FACTOR, self._MAX_ATTEMPTS)
-        else:
-            attempts = target
-
-        placed = 0
-        for _ in range(attempts):
-            if placed >= target:
-                break
-
-            a = random.uniform(0.0, 2.0 * math.pi)
-            r = radius * math.sqrt(random.random())
-            candidate = center + (math.cos(a) * t1 + math.sin(a) * t2) * r
-
-            cast_origin = candidate + normal * (radius + 0.001)
-            if self.props.use_stacking:
-                res = self._cast_scene(context, cast_origin, -normal)
-            else:
-                res = self._cast(cast_origin, -normal)
-            if res is None:
-                # 采样点正下方没有表面：笔刷大于散布面时会出现这种情况。
-                # 默认跳过，避免把物体散布到表面之外。
-                if self.props.limit_to_surface:
-                    continue
-                loc, nor, local_loc, face_idx = candidate, normal, None, None
-            else:
-                loc, nor, local_loc, face_idx = res
-
-            if not self.passes_filters(loc, nor):
-                continue
-
-            if self.mask_pixels is not None and face_idx is not None and local_loc is not None:
-                if random.random() > self.sample_mask(face_idx, local_loc):
-                    continue
-
-            src = random.choices(self.sources, weights=self.weights, k=1)[0]
-            scale_vec = self._random_scale(pressure)
-            dims = src.dimensions
-            rep = max(scale_vec.x, scale_vec.y, scale_vec.z)
-            inst_radius = Vector((dims[0], dims[1], dims[2])).length * 0.5 * rep
-
-            if not self.accept_point(loc, inst_radius):
-                continue
-
-            self.create_instance(src, scale_vec, loc, nor)
-            placed += 1
-
-    def _random_scale(self, pressure: float = 1.0) -> Vector:
-        """返回本次实例的缩放系数。
-        优先级：压感映射 > 随机 > 固定。
-        - 压感：在 [min,max] 间按笔压取值。
-        - 随机：在 [min,max] 取随机，若再开“各轴随机”则三轴独立（非等比）。
-        - 固定：取 scale_min。
-        """
-        p = self.props
-        lo, hi = p.scale_min, p.scale_max
-        if hi < lo:
-            lo, hi = hi, lo
-        if p.use_pressure_scale:
-            f = lo + (hi - lo) * max(0.0, min(1.0, pressure))
-            return Vector((f, f, f))
-        if not p.use_random_scale:
-            s = p.scale_min
-            return Vector((s, s, s))
-        if p.random_scale_axis:
-            return Vector((random.uniform(lo, hi),
-                           random.uniform(lo, hi),
-                           random.uniform(lo, hi)))
-        f = random.uniform(lo, hi)
-        return Vector((f, f, f))
-
-    def passes_filters(self, loc: Vector, normal: Vector) -> bool:
-        p = self.props
-        if p.use_slope_limit:
-            slope = math.degrees(Vector((0.0, 0.0, 1.0)).angle(normal, 0.0))
-            if slope > p.slope_limit:
-                return False
-        if p.use_height_limit:
-            if loc.z < p.height_min or loc.z > p.height_max:
-                return False
-        return True
-
-    def accept_point(self, loc: Vector, radius: float) -> bool:
-        if self.props.use_random_min_dist:
-            lo, hi = self.props.min_dist, self.props.min_dist_max
-            if hi < lo:
-                lo, hi = hi, lo
-            md = random.uniform(lo, hi)
-        else:
-            md = self.props.min_dist
-        ao = self.props.avoid_overlap
-        if md <= 0 and not ao:
-            return True
-        cell = self.grid_cell
-        cx, cy, cz = int(loc.x // cell), int(loc.y // cell), int(loc.z // cell)
-        for dx in (-1, 0, 1):
-            for dy in (-1, 0, 1):
-                for dz in (-1, 0, 1):
-                    for (p, pr) in self.grid.get((cx + dx, cy + dy, cz + dz), ()):
-                        sep = md
-                        if ao:
-                            sep = max(sep, (radius + pr) * self.props.overlap_factor)
-                        if (p - loc).length < sep:
-                            return False
-        self.grid.setdefault((cx, cy, cz), []).append((loc, radius))
-        return True
-
-    def compute_grid_cell(self):
-        max_r = 0.0
-        for s in self.sources:
-            d = s.dimensions
-            max_r = max(max_r, Vector((d[0], d[1], d[2])).length * 0.5 * self.props.scale_max)
-        factor = max(self.props.overlap_factor, 1.0)
-        # 随机间距时，网格必须按最大可能间距取格，保证邻域搜索覆盖
-        eff_min_dist = self.props.min_dist
-        if self.props.use_random_min_dist:
-            eff_min_dist = max(self.props.min_dist, self.props.min_dist_max)
-        self.grid_cell = max(eff_min_dist, max_r * 2.0 * factor, 1e-4)
-
-    def create_instance(self, src, scale: Vector, loc: Vector, normal: Vector):
-        new_obj = src.copy()
-        if self.props.duplicate == "COPY" and src.data:
-            new_obj.data = src.data.copy()
-        # 防御性：若缓存的集合引用因撤销/重做而失效，重新获取一个有效集合
-        try:
-            coll = self.collection
-            coll.objects.link(new_obj)
-        except ReferenceError:
-            coll = self.get_scatter_collection(bpy.context)
-            self.collection = coll
-            coll.objects.link(new_obj)
-
-        if self.props.align_normal:
-            align_q = Vector((0.0, 0.0, 1.0)).rotation_difference(normal)
-        else:
-            align_q = Quaternion()
-
-        angle = random.uniform(0.0, 2.0 * math.pi) if self.props.random_rotation else 0.0
-        z_q = Quaternion((0.0, 0.0, 1.0), angle)
-
-        rot_q = align_q @ z_q
-
-        if self.props.tilt_max > 0.0:
-            tilt = math.radians(random.uniform(0.0, self.props.tilt_max))
-            ta = random.uniform(0.0, 2.0 * math.pi)
-            t1, t2 = tangent_basis(normal)
-            tilt_axis = math.cos(ta) * t1 + math.sin(ta) * t2
-            rot_q = Quaternion(tilt_axis, tilt) @ rot_q
-
-        rot_mat = rot_q.to_matrix().to_4x4()
-        src_scale = src.matrix_world.to_scale()
-        final_scale = Vector((src_scale.x * scale.x,
-                              src_scale.y * scale.y,
-                              src_scale.z * scale.z))
-        scale_mat = Matrix.Diagonal(final_scale.to_4d())
-
-        if self.props.use_random_height:
-            lo, hi = self.props.z_offset, self.props.z_offset_max
-            if hi < lo:
-                lo, hi = hi, lo
-            height = random.uniform(lo, hi)
-        else:
-            height = self.props.z_offset
-        offset = normal * height
-        new_obj.matrix_world = Matrix.Translation(loc + offset) @ rot_mat @ scale_mat
-        new_obj.select_set(False)
-
-        self.created_session.append(new_obj)
-        self.created_stroke += 1
-
-    # ERASE
-    # ------------------------------------------------------------------
-
-    def erase_at(self, context):
-        if self.cur_center is None:
-            return
-        coll = find_scatter_collection()
-        if coll is None:
-            return
-        radius = self.props.radius
-        center = self.cur_center
-        for obj in list(coll.objects):
-            if (obj.matrix_world.translation - center).length <= radius:
-                try:
-                    bpy.data.objects.remove(obj, do_unlink=True)
-                    self.erased_stroke += 1
-                except (ReferenceError, RuntimeError):
-                    pass
-
-    # MASK
-    # ------------------------------------------------------------------
-
-    def _build_mask(self):
-        self.mask_pixels = None
-        img = self.props.mask_image
-        if img is None:
-            return
-        try:
-            w, h = img.size[0], img.size[1]
-            if w <= 0 or h <= 0:
-                return
-            buf = [0.0] * (w * h * 4)
-            img.pixels.foreach_get(buf)
-            self.mask_pixels = buf
-            self.mask_w = w
-            self.mask_h = h
-        except Exception:
-            self.mask_pixels = None
-
-    def sample_mask(self, face_idx: int, local_loc: Vector) -> float:
-        try:
-            mesh = self.eval_mesh
-            uv_layer = mesh.uv_layers.active
-            if uv_layer is None:
-                return 1.0
-            poly = mesh.polygons[face_idx]
-            coords = [mesh.vertices[mesh.loops[li].vertex_index].co for li in poly.loop_indices]
-            uvs = [uv_layer.data[li].uv for li in poly.loop_indices]
-            weights = poly_3d_calc(coords, local_loc)
-            u = sum(w * uv.x for w, uv in zip(weights, uvs))
-            v = sum(w * uv.y for w, uv in zip(weights, uvs))
-
-            x = int((u % 1.0) * self.mask_w) % self.mask_w
-            y = int((v % 1.0) * self.mask_h) % self.mask_h
-            idx = (y * self.mask_w + x) * 4
-            r, g, b, _a = self.mask_pixels[idx:idx + 4]
-            val = 0.2126 * r + 0.7152 * g + 0.0722 * b
-            if self.props.mask_invert:
-                val = 1.0 - val
-            return max(0.0, min(1.0, val))
-        except Exception:
-            return 1.0
+        hit = self.paint_ray(context, origin, direction, pressure)
+        if hit is not None:
+            self.cur_center, self.cur_normal = hit
+        if self.stamp_queue and _DRAIN["op"] is None:
+            _DRAIN["op"] = self
+            bpy.app.timers.register(_drain_stamps_timer, first_interval=0.0)
 
-    # COLLECTION
-    # ------------------------------------------------------------------
-
-    @staticmethod
-    def get_scatter_collection(context):
-        coll = find_scatter_collection()
-        if coll is None:
-            coll = bpy.data.collections.new(SCATTER_COLL_NAME)
-        # 确保标记存在（含旧版按名字创建的集合，首次使用时补标记）
-        if not coll.get(SCATTER_COLL_ID):
-            coll[SCATTER_COLL_ID] = True
-        if coll not in context.scene.collection.children_recursive:
-            try:
-                context.scene.collection.children.link(coll)
-            except RuntimeError:
-                pass
-        return coll
+    def erase_here(self):
+        if self.cur_center is not None:
+            self.erase_at(self.cur_center, self.props.radius)
 
     # END
     # ------------------------------------------------------------------
 
     def finish(self, context):
         global _INSTANCE_RUNNING
+        _stop_drain_timer()
+        # 笔触进行中退出（如切换工具）时与松开一样做完排队的落刷、保存记录并推送撤销点
+        if self.painting:
+            try:
+                self.end_stroke(context)
+            except Exception:
+                import traceback
+                traceback.print_exc()
         try:
+            self.stamp_queue.clear()
             self._clear_target_data()
         except Exception:
             pass
@@ -948,6 +583,8 @@ class PH_OT_scatter_brush(bpy.types.Operator):
         _INSTANCE_RUNNING = False
         _DRAW["active"] = False
         _DRAW["center"] = None
+        _DRAW["heatmap"] = None
+        _DRAW["stats"] = None
         area = self.start_area or context.area
         try:
             if area:
@@ -987,6 +624,36 @@ class PH_OT_scatter_brush(bpy.types.Operator):
                  or self.props.use_pressure_radius) and self.painting)
         except Exception:
             _DRAW["show_pressure"] = False
+        if self._show_density():
+            _HEATMAP.update(self.grid)
+            _DRAW["heatmap"] = _HEATMAP
+            _DRAW["stats"] = self._overlay_stats()
+        else:
+            _DRAW["heatmap"] = None
+            _DRAW["stats"] = None
+
+    @staticmethod
+    def _show_density() -> bool:
+        try:
+            return get_pref().scatter_tool.show_density
+        except Exception:
+            return False
+
+    def _overlay_stats(self):
+        """叠加层的计数与内存估算。计数来自间距索引，不遍历散布集合；
+        每实例内存按当前散布源（未落笔时取选中物体）估算，源不变时复用。
+        """
+        sources = self.sources
+        if not sources:
+            sources = [o for o in bpy.context.selected_objects if o.type in _SOURCE_TYPES]
+        weights = [max(0.0, getattr(o, "ph_scatter_weight", 1.0)) for o in sources]
+        key = tuple((o.name, w) for o, w in zip(sources, weights))
+        if key != self._bytes_key:
+            self._bytes_key = key
+            self._bytes = instance_bytes(sources, weights)
+        total = len(self.grid)
+        memory = {mode: size * total for mode, size in self._bytes.items()}
+        return self.created_stroke, self.created_count, total, _HEATMAP.peak, memory
 
 
 class PH_OT_scatter_clear(bpy.types.Operator):
@@ -1006,6 +673,14 @@ class PH_OT_scatter_clear(bpy.types.Operator):
             return {"CANCELLED"}
         count = 0
         for obj in list(coll.objects):
+            if is_point_object(obj):
+                # 点实例：连同点云网格一起删除
+                me = obj.data
+                count += len(me.vertices)
+                bpy.data.objects.remove(obj, do_unlink=True)
+                if me.users == 0:
+                    bpy.data.meshes.remove(me)
+                continue
             bpy.data.objects.remove(obj, do_unlink=True)
             count += 1
         self.report({"INFO"}, _iface("Removed %d scattered objects") % count)
@@ -1032,6 +707,11 @@ class PH_OT_scatter_apply(bpy.types.Operator):
         target = context.scene.collection
         count = 0
         for obj in list(coll.objects):
+            n = 1
+            if is_point_object(obj):
+                # 点实例保持几何节点实例化，只去掉标记，之后的绘制会另建新的点云
+                n = len(obj.data.vertices)
+                del obj[POINTS_ID]
             try:
                 if obj.name not in target.objects:
                     target.objects.link(obj)
@@ -1041,7 +721,7 @@ class PH_OT_scatter_apply(bpy.types.Operator):
                 coll.objects.unlink(obj)
             except RuntimeError:
                 pass
-            count += 1
+            count += n
         self.report({"INFO"}, _iface("Applied %d scattered objects") % count)
         return {"FINISHED"}
 
@@ -1066,6 +746,121 @@ class PH_OT_scatter_random_weights(bpy.types.Operator):
         return {"FINISHED"}
 
 
+class PH_OT_scatter_replay(bpy.types.Operator, ScatterEngine):
+    """Re-run the strokes recorded on the Scatter collection without the viewport.
+    Recorded seeds reproduce the strokes exactly; overrides regenerate them at another density"""
+    bl_idname = "object.ph_scatter_replay"
+    bl_label = "Replay Strokes"
+    bl_options = {"REGISTER", "UNDO"}
+
+    stroke: IntProperty(name="Stroke", description="Index of the recorded stroke to replay (-1 replays all)",
+                        default=-1, min=-1)
+    density_factor: FloatProperty(name="Density Factor", description="Multiplier on the recorded density",
+                                  default=1.0, min=0.0, soft_max=10.0)
+    seed_offset: IntProperty(name="Seed Offset",
+                             description="Added to each recorded seed; 0 reproduces the strokes exactly",
+                             default=0)
+    output: EnumProperty(name="Output",
+                         items=[("RECORDED", "Recorded", "Use the output recorded with each stroke"),
+                                ("OBJECTS", "Objects", "Create one object per scattered instance"),
+                                ("POINTS", "Point Instances", "Store instance transforms in point clouds")],
+                         default="RECORDED")
+
+    # 回放不受交互帧率约束，放宽单次落刷的数量上限，提高密度时不被截断
+    _MAX_PER_STAMP = 20000
+    _MAX_ATTEMPTS = 120000
+
+    _DENSITY_PROPS = ("density", "density_max", "pressure_density_min", "pressure_density_max")
+
+    @classmethod
+    def poll(cls, context):
+        coll = find_scatter_collection()
+        return coll is not None and bool(coll.get(STROKE_LOG_KEY))
+
+    def execute(self, context):
+        logs = read_strokes(find_scatter_collection())
+        if self.stroke >= 0:
+            logs = logs[self.stroke:self.stroke + 1]
+        if not logs:
+            return {"CANCELLED"}
+
+        self.init_engine(scatter_tool_props())
+        replayed = created = erased = 0
+        for log in logs:
+            if self.replay_stroke(context, log, self._overrides(log), self.seed_offset):
+                replayed += 1
+                created += self.created_stroke
+                erased += self.erased_stroke
+        self.report({"INFO"}, _iface("Replayed %d strokes: %d created, %d removed") % (replayed, created, erased))
+        return {"FINISHED"}
+
+    def _overrides(self, log) -> dict:
+        out = {}
+        if self.density_factor != 1.0:
+            for key in self._DENSITY_PROPS:
+                if key in log.props:
+                    out[key] = log.props[key] * self.density_factor
+        if self.output != "RECORDED":
+            out["output"] = self.output
+        return out
+
+
+class PH_OT_scatter_path(bpy.types.Operator):
+    """Scatter the selected source objects along a curve onto the target surface using the current Scatter settings"""
+    bl_idname = "object.ph_scatter_path"
+    bl_label = "Scatter Along Path"
+    bl_options = {"REGISTER", "UNDO"}
+
+    target: StringProperty(name="Target",
+                           description="Target object (empty uses the active object, "
+                                       "or the Surface Collection when set)")
+    path: StringProperty(name="Path", description="Curve object to scatter along "
+                                                   "(empty uses the selected curve)")
+    seed: IntProperty(name="Seed", description="Random seed; the same seed gives the same result",
+                      default=0, min=0)
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "OBJECT"
+
+    def execute(self, context):
+        props = scatter_tool_props()
+        path = bpy.data.objects.get(self.path) if self.path else next(
+            (o for o in context.selected_objects if o.type == "CURVE"), None)
+        if self.target:
+            target = bpy.data.objects.get(self.target)
+        else:
+            target = props.target_collection or context.active_object
+        if path is None or target is None or target == path:
+            self.report({"WARNING"}, _iface("Need a target surface and a curve path"))
+            return {"CANCELLED"}
+
+        sources = [o for o in context.selected_objects
+                   if o.type in _SOURCE_TYPES and o not in (target, path)]
+        if not sources:
+            self.report({"WARNING"}, _iface("Please select at least one object to scatter"))
+            return {"CANCELLED"}
+        count = scatter_path(context, target, path, sources, seed=self.seed, record=props.record_strokes)
+        self.report({"INFO"}, _iface("Scattered %d instances") % count)
+        return {"FINISHED"}
+
+
+class PH_OT_scatter_clear_log(bpy.types.Operator):
+    """Remove the stroke log stored on the Scatter collection"""
+    bl_idname = "object.ph_scatter_clear_log"
+    bl_label = "Clear Stroke Log"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        coll = find_scatter_collection()
+        return coll is not None and STROKE_LOG_KEY in coll
+
+    def execute(self, context):
+        clear_strokes(find_scatter_collection())
+        return {"FINISHED"}
+
+
 @persistent
 def _reset_scatter_state(_dummy):
     """文件加载时复位运行状态并清理处理器。
@@ -1076,8 +871,11 @@ def _reset_scatter_state(_dummy):
     """
     global _INSTANCE_RUNNING, _draw_handle, _draw_handle_px
     _INSTANCE_RUNNING = False
+    _stop_drain_timer()
     _DRAW["active"] = False
     _DRAW["center"] = None
+    _DRAW["heatmap"] = None
+    _DRAW["stats"] = None
     if _draw_handle is not None:
         try:
             bpy.types.SpaceView3D.draw_handler_remove(_draw_handle, "WINDOW")
@@ -1095,6 +893,7 @@ def _reset_scatter_state(_dummy):
             bpy.app.handlers.load_post.remove(_reset_scatter_state)
         except Exception:
             pass
+    remove_surface_handler()
 
 
 classes = (
@@ -1102,6 +901,9 @@ classes = (
     PH_OT_scatter_clear,
     PH_OT_scatter_apply,
     PH_OT_scatter_random_weights,
+    PH_OT_scatter_replay,
+    PH_OT_scatter_path,
+    PH_OT_scatter_clear_log,
 )
 
 _register_cls, _unregister_cls = bpy.utils.register_classes_factory(classes)
@@ -1120,6 +922,9 @@ def unregister():
     # 卸载时兜底清理可能仍挂载的处理器（正常情况 finish 已移除）
     if _reset_scatter_state in bpy.app.handlers.load_post:
         bpy.app.handlers.load_post.remove(_reset_scatter_state)
+    _stop_drain_timer()
+    remove_surface_handler()
+    clear_mask_cache()
     _DRAW["active"] = False
     if _draw_handle is not None:
         try:
@@ -0,0 +1,106 @@
+"""散布密度热力图与实例计数叠加层。
+
+热力图直接统计间距索引（SpatialHash）里的点：按 XY 粗网格计数，每个有点的格子画一块
+半透明方块（高度取格内点的平均 Z）。索引版本不变时复用上次的顶点与 GPU 批次，
+绘制回调里不遍历散布集合的物体。
+"""
+import numpy as np
+from gpu_extras.batch import batch_for_shader
+
+# 热力图沿散布范围长边的格数
+HEAT_RES = 48
+# 方块抬离平均高度的距离，避免与地表深度冲突
+HEAT_LIFT = 0.02
+
+# 内存估算用的近似值（字节）
+OBJECT_BYTES = 1536  # 一个 Object 数据块及其视图层 Base
+POINT_BYTES = 40  # 一个点实例：位置、旋转、缩放各 3 个 float + 编号
+
+
+def _ramp(t: np.ndarray) -> np.ndarray:
+    """0~1 映射为 蓝 → 绿 → 黄 → 红，透明度随密度升高，返回 (N, 4)。"""
+    r = np.clip(2.0 * t, 0.0, 1.0)
+    g = np.clip(2.0 - 2.0 * t, 0.0, 1.0) * np.clip(2.0 * t + 0.3, 0.0, 1.0)
+    b = np.clip(1.0 - 2.0 * t, 0.0, 1.0)
+    a = 0.15 + 0.35 * t
+    return np.stack((r, g, b, a), axis=1)
+
+
+class DensityHeatmap:
+    """由间距索引生成的密度热力图。"""
+
+    def __init__(self):
+        self._key = None
+        self.pos = None  # (6K, 3) 三角形顶点
+        self.color = None  # (6K, 4)
+        self.peak = 0.0  # 最密格子的每平方米实例数
+        self._batch = None
+
+    def update(self, grid):
+        """索引有增删时重新统计（纯数组运算）。"""
+        key = (id(grid), grid.version)
+        if key == self._key:
+            return
+        self._key = key
+        self._batch = None
+        pts = grid.live_points()
+        if not len(pts):
+            self.pos = self.color = None
+            self.peak = 0.0
+            return
+        lo = pts[:, :2].min(axis=0)
+        span = max(float((pts[:, :2].max(axis=0) - lo).max()), 1e-6)
+        cell = span / HEAT_RES * (1.0 + 1e-6)
+        ij = np.floor((pts[:, :2] - lo) / cell).astype(np.int64)
+        flat = ij[:, 0] * HEAT_RES + ij[:, 1]
+        counts = np.bincount(flat, minlength=HEAT_RES * HEAT_RES)
+        z_sum = np.bincount(flat, weights=pts[:, 2], minlength=HEAT_RES * HEAT_RES)
+        occ = np.flatnonzero(counts)
+        n = counts[occ]
+        self.peak = float(n.max()) / (cell * cell)
+
+        i, j = np.divmod(occ, HEAT_RES)
+        x0 = lo[0] + i * cell
+        y0 = lo[1] + j * cell
+        z = z_sum[occ] / n + HEAT_LIFT
+        x1, y1 = x0 + cell, y0 + cell
+        corners = np.stack((
+            np.stack((x0, y0, z), axis=1), np.stack((x1, y0, z), axis=1), np.stack((x1, y1, z), axis=1),
+            np.stack((x0, y0, z), axis=1), np.stack((x1, y1, z), axis=1), np.stack((x0, y1, z), axis=1),
+        ), axis=1)
+        self.pos = corners.reshape(-1, 3).astype(np.float32)
+        self.color = np.repeat(_ramp(n / n.max()), 6, axis=0).astype(np.float32)
+
+    def batch(self, shader):
+        """GPU 批次（按需创建并缓存到下次索引变化）；没有实例时返回 None。"""
+        if self.pos is None:
+            return None
+        if self._batch is None:
+            self._batch = batch_for_shader(shader, "TRIS", {"pos": self.pos, "color": self.color})
+        return self._batch
+
+
+def mesh_bytes(obj) -> int:
+    """网格数据的近似内存：坐标、边、角点（含 UV 层）与面偏移。非网格物体为 0。"""
+    me = getattr(obj, "data", None)
+    if me is None or not hasattr(me, "loops"):
+        return 0
+    loops = len(me.loops)
+    return (12 * len(me.vertices) + 8 * len(me.edges) + 8 * loops * (1 + len(me.uv_layers))
+            + 4 * len(me.polygons))
+
+
+def instance_bytes(sources, weights) -> dict:
+    """按散布源权重估算每个实例的内存：关联复制、完整复制与点实例三种方式。"""
+    w = np.asarray(weights, dtype=np.float64)
+    mesh = np.array([mesh_bytes(o) for o in sources], dtype=np.float64)
+    avg = float((mesh * w).sum() / w.sum()) if len(w) and w.sum() > 0.0 else 0.0
+    return {"INSTANCE": OBJECT_BYTES, "COPY": OBJECT_BYTES + avg, "POINTS": POINT_BYTES}
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024.0:
+            return "%.0f %s" % (n, unit) if unit == "B" else "%.1f %s" % (n, unit)
+        n /= 1024.0
+    return "%.2f GB" % n
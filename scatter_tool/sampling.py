@@ -0,0 +1,282 @@
+"""散布笔刷的批量随机采样。
+
+一次笔触所需的全部随机量（圆盘采样、切平面偏移、缩放、旋转、倾斜、
+法向高度、间距与源索引）都在这里用 NumPy 一次性生成，
+避免在尝试循环里逐个调用 random 模块并构造 Vector。
+"""
+import math
+
+import numpy as np
+
+
+def _sorted_range(lo: float, hi: float):
+    return (hi, lo) if hi < lo else (lo, hi)
+
+
+def disk_offsets(rng, count: int, radius: float) -> np.ndarray:
+    """在半径为 radius 的圆盘内均匀采样，返回 (count, 2) 的切平面坐标。"""
+    a = rng.uniform(0.0, 2.0 * math.pi, count)
+    r = radius * np.sqrt(rng.random(count))
+    return np.stack((np.cos(a) * r, np.sin(a) * r), axis=1)
+
+
+def tangent_points(center, t1, t2, offsets: np.ndarray) -> np.ndarray:
+    """把切平面坐标转换为世界坐标，返回 (N, 3)。"""
+    c = np.asarray(center, dtype=np.float64)
+    u = np.asarray(t1, dtype=np.float64)
+    v = np.asarray(t2, dtype=np.float64)
+    return c + offsets[:, 0:1] * u + offsets[:, 1:2] * v
+
+
+class StampBatch:
+    """一次笔触的候选数据，所有数组按尝试顺序排列、长度一致。"""
+
+    def __init__(self, points, scales, angles, tilts, tilt_dirs, heights, min_dists, mask_rolls, src_idx):
+        self.points = points  # (N, 3) 圆盘内的候选点（世界坐标，尚未投射）
+        self.scales = scales  # (N, 3) 实例缩放系数
+        self.angles = angles  # (N,) 绕法线旋转角
+        self.tilts = tilts  # (N,) 倾斜角（弧度）
+        self.tilt_dirs = tilt_dirs  # (N,) 倾斜方向角
+        self.heights = heights  # (N,) 沿法线的高度偏移
+        self.min_dists = min_dists  # (N,) 每个候选点的最小间距
+        self.mask_rolls = mask_rolls  # (N,) 与遮罩值比较的随机数
+        self.src_idx = src_idx  # (N,) 散布源索引
+        self.blocked = None  # (N,) 投射前即可判定会被坡度/高度过滤掉的候选点，None 表示未预筛
+
+    def __len__(self):
+        return len(self.points)
+
+
+def draw_scales(rng, props, count: int, pressure: float = 1.0) -> np.ndarray:
+    """批量生成缩放系数。
+    优先级：压感映射 > 随机 > 固定（与单个实例的规则一致）。
+    """
+    lo, hi = _sorted_range(props.scale_min, props.scale_max)
+    if props.use_pressure_scale:
+        f = lo + (hi - lo) * max(0.0, min(1.0, pressure))
+        return np.full((count, 3), f)
+    if not props.use_random_scale:
+        return np.full((count, 3), props.scale_min)
+    if props.random_scale_axis:
+        return rng.uniform(lo, hi, (count, 3))
+    return np.repeat(rng.uniform(lo, hi, count)[:, None], 3, axis=1)
+
+
+def draw_min_dists(rng, props, count: int) -> np.ndarray:
+    if props.use_random_min_dist:
+        lo, hi = _sorted_range(props.min_dist, props.min_dist_max)
+        return rng.uniform(lo, hi, count)
+    return np.full(count, props.min_dist)
+
+
+def draw_heights(rng, props, count: int) -> np.ndarray:
+    if props.use_random_height:
+        lo, hi = _sorted_range(props.z_offset, props.z_offset_max)
+        return rng.uniform(lo, hi, count)
+    return np.full(count, props.z_offset)
+
+
+class AliasTable:
+    """按权重抽取散布源的 Vose 别名表，每次笔触建立一次，之后每个样本 O(1)。"""
+
+    def __init__(self, weights):
+        w = np.asarray(weights, dtype=np.float64).ravel()
+        count = len(w)
+        total = w.sum()
+        self.uniform = count <= 1 or total <= 0.0 or bool((w == w[0]).all())
+        self.prob = np.ones(count)
+        self.alias = np.arange(count)
+        if self.uniform:
+            return
+        scaled = w * (count / total)
+        small = [i for i in range(count) if scaled[i] < 1.0]
+        large = [i for i in range(count) if scaled[i] >= 1.0]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] -= 1.0 - scaled[s]
+            (small if scaled[g] < 1.0 else large).append(g)
+        # 剩余项（含浮点误差）概率为 1
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, rng, count: int) -> np.ndarray:
+        """抽取 count 个散布源索引。"""
+        idx = rng.integers(0, len(self.prob), count)
+        if self.uniform:
+            return idx
+        return np.where(rng.random(count) < self.prob[idx], idx, self.alias[idx])
+
+
+def draw_stamp_batch(rng, props, count: int, center, t1, t2, radius: float, sources: AliasTable,
+                     pressure: float = 1.0, offsets: np.ndarray = None) -> StampBatch:
+    """一次生成 count 个候选点及其全部随机变换参数。
+    :param sources: 散布源的别名表
+    :param offsets: 预先生成的切平面坐标（如泊松采样结果），为空时在圆盘内均匀采样
+    """
+    if offsets is None:
+        offsets = disk_offsets(rng, count, radius)
+    points = tangent_points(center, t1, t2, offsets)
+
+    if props.random_rotation:
+        angles = rng.uniform(0.0, 2.0 * math.pi, count)
+    else:
+        angles = np.zeros(count)
+
+    if props.tilt_max > 0.0:
+        tilts = np.radians(rng.uniform(0.0, props.tilt_max, count))
+        tilt_dirs = rng.uniform(0.0, 2.0 * math.pi, count)
+    else:
+        tilts = np.zeros(count)
+        tilt_dirs = np.zeros(count)
+
+    return StampBatch(
+        points=points,
+        scales=draw_scales(rng, props, count, pressure),
+        angles=angles,
+        tilts=tilts,
+        tilt_dirs=tilt_dirs,
+        heights=draw_heights(rng, props, count),
+        min_dists=draw_min_dists(rng, props, count),
+        mask_rolls=rng.random(count),
+        src_idx=sources.draw(rng, count),
+    )
+
+
+def slope_degrees(normals: np.ndarray) -> np.ndarray:
+    """法线与世界 Z 轴的夹角（度），normals 为 (N, 3)。"""
+    length = np.linalg.norm(normals, axis=1)
+    zero = length == 0.0
+    length[zero] = 1.0
+    cos = np.where(zero, 1.0, normals[:, 2] / length)
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
+
+# 泊松圆盘（蓝噪声）采样
+# ----------------------------------------------------------------------
+
+# (半径/间距)² 的上限：笔刷远大于间距时拒绝率本来就低，退回随机采样更省
+POISSON_MAX_RATIO = 1000
+# 并行投镖的轮数上限；通常十几轮后新点已极少
+POISSON_ROUNDS = 24
+
+_WIN = np.arange(-2, 3)
+
+
+def _window(grid: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """取 cells 周围 5x5 格子里的点索引，返回 (N, 25)。grid 四周需留两格边距。"""
+    ii = cells[:, 0, None, None] + _WIN[None, :, None]
+    jj = cells[:, 1, None, None] + _WIN[None, None, :]
+    return grid[ii, jj].reshape(len(cells), -1)
+
+
+def _too_close(a: np.ndarray, b: np.ndarray, sq: float, chunk: int = 512) -> np.ndarray:
+    """a 中每个点是否与 b 中任一点的距离小于间距，分块计算避免大矩阵。"""
+    out = np.zeros(len(a), dtype=bool)
+    if not len(b):
+        return out
+    for s in range(0, len(a), chunk):
+        d = a[s:s + chunk, None, :] - b[None, :, :]
+        out[s:s + chunk] = (np.einsum("ijk,ijk->ij", d, d) < sq).any(axis=1)
+    return out
+
+
+def poisson_disk(rng, radius: float, spacing: float, occupied: np.ndarray = None,
+                 max_points: int = None) -> np.ndarray:
+    """泊松圆盘（蓝噪声）采样，返回圆盘内 (M, 2) 的切平面坐标（已打乱顺序）。
+
+    采用按格并行投镖：网格边长 spacing/√2，每格至多一个点；
+    每轮给每个空格投一个候选点，先与已接受点比较，候选点之间再按随机优先级去冲突，
+    整轮只做几次向量化运算，而不是逐点尝试。
+
+    :param occupied: (K, 2) 已存在的点（投影到同一切平面），新点与其保持 spacing 以上的距离
+    :param max_points: 已够用时提前结束
+    返回 None 表示间距无效或点数会超出上限（调用方应退回随机采样）。
+    """
+    if spacing <= 0.0 or radius <= 0.0:
+        return None
+    if (radius / spacing) ** 2 > POISSON_MAX_RATIO:
+        return None
+
+    cell = spacing / math.sqrt(2.0)
+    n = int(math.ceil(2.0 * radius / cell)) + 1
+    grid = np.full((n + 4, n + 4), -1, dtype=np.int64)
+    pts = np.empty((n * n, 2))
+    count = 0
+    sq = spacing * spacing
+
+    if occupied is not None and len(occupied):
+        reach = radius + spacing
+        occupied = occupied[np.einsum("ij,ij->i", occupied, occupied) <= reach * reach]
+    else:
+        occupied = None
+
+    # 圆盘覆盖到的格子（格子中心到圆心距离 < 半径 + 半对角线）
+    ij = np.stack(np.meshgrid(np.arange(n), np.arange(n), indexing="ij"), axis=-1).reshape(-1, 2)
+    corner = ij * cell - radius
+    centers = corner + cell * 0.5
+    live = np.einsum("ij,ij->i", centers, centers) <= (radius + cell) ** 2
+    ij, corner = ij[live], corner[live]
+
+    misses = np.zeros(len(ij), dtype=np.int64)
+    for _ in range(POISSON_ROUNDS):
+        if not len(ij):
+            break
+        cands = corner + rng.random((len(ij), 2)) * cell
+        ok = np.einsum("ij,ij->i", cands, cands) <= radius * radius
+
+        # 与已接受点比较
+        near = _window(grid, ij + 2)
+        d = pts[np.maximum(near, 0)] - cands[:, None, :]
+        ok &= ((near < 0) | (np.einsum("ijk,ijk->ij", d, d) >= sq)).all(axis=1)
+        if occupied is not None:
+            ok[ok] = ~_too_close(cands[ok], occupied, sq)
+
+        won = np.zeros(len(ij), dtype=bool)
+        if ok.any():
+            # 候选点之间去冲突：只保留比所有冲突邻居优先级都高的点
+            sel = np.flatnonzero(ok)
+            cells, pick = ij[sel], cands[sel]
+            prio = rng.random(len(pick))
+            tmp = np.full_like(grid, -1)
+            tmp[cells[:, 0] + 2, cells[:, 1] + 2] = np.arange(len(pick))
+            near = _window(tmp, cells + 2)
+            d = pick[np.maximum(near, 0)] - pick[:, None, :]
+            clash = (near >= 0) & (np.einsum("ijk,ijk->ij", d, d) < sq)
+            clash &= near != np.arange(len(pick))[:, None]
+            beaten = clash & (prio[np.maximum(near, 0)] > prio[:, None])
+            win = ~beaten.any(axis=1)
+
+            sel, cells, pick = sel[win], cells[win], pick[win]
+            idx = np.arange(count, count + len(pick))
+            pts[idx] = pick
+            grid[cells[:, 0] + 2, cells[:, 1] + 2] = idx
+            count += len(pick)
+            won[sel] = True
+            if max_points is not None and count >= max_points:
+                break
+
+        # 已填格子与连续多次投不中的格子（基本已被邻点覆盖）不再参与
+        misses = np.where(won, 0, misses + 1)
+        alive = ~won & (misses < 6)
+        ij, corner, misses = ij[alive], corner[alive], misses[alive]
+
+    result = pts[:count].copy()
+    rng.shuffle(result)
+    return result
+
+
+def resample_polyline(points: np.ndarray, step: float) -> np.ndarray:
+    """按弧长等距重采样折线 (N, 3)，首尾点保留，返回 (M, 3)。"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) < 2:
+        return points
+    arc = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))))
+    if arc[-1] <= 0.0 or step <= 0.0:
+        return points[:1]
+    t = np.arange(0.0, arc[-1], step)
+    if arc[-1] - t[-1] > 1e-9:
+        t = np.append(t, arc[-1])
+    return np.stack([np.interp(t, arc, points[:, k]) for k in range(3)], axis=1)
@@ -0,0 +1,331 @@
+"""散布间距检测用的扁平数组空间哈希。
+
+位置与半径存放在连续的 float 数组中；格子按键排序后以偏移表（CSR）索引，
+邻域查询与批量接受都是向量化运算，不再为每个点构造 Vector 或遍历 Python 列表。
+新插入的点先进入一个小的“待合并”表，累积到一定数量再并入主表，
+因此长时间绘制（10 万以上的点）时插入依然便宜。
+
+索引跨笔触保留，而格子按当前散布源取大小：半径远大于格子的点（先画大树再画石子）
+放进单独的“宽点”短表直接比较，不撑大邻域；邻域格子数超过点数时改为直接计算距离，
+并按块生成配对，单次调用的内存有上限。
+"""
+import math
+
+import numpy as np
+
+# 格子坐标打包为 int64 键：每轴 21 位，足够覆盖 ±100 万个格子
+_BITS = 21
+_BIAS = 1 << (_BITS - 1)
+_MASK = (1 << _BITS) - 1
+
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    c = (cells + _BIAS) & _MASK
+    return (c[..., 0] << (2 * _BITS)) | (c[..., 1] << _BITS) | c[..., 2]
+
+
+# 半径超过该格数的点放入宽点表
+_WIDE_CELLS = 2.0
+# 单块生成的 (候选, 行) 配对数上限
+_PAIR_BUDGET = 1 << 20
+
+
+def _offsets(span: int) -> np.ndarray:
+    r = np.arange(-span, span + 1)
+    return np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape(-1, 3)
+
+
+class _Buckets:
+    """一组行号按格子键排序后的偏移表。"""
+
+    def __init__(self, rows: np.ndarray, keys: np.ndarray):
+        order = np.argsort(keys, kind="stable")
+        self.rows = rows[order]
+        sorted_keys = keys[order]
+        self.keys, self.starts = np.unique(sorted_keys, return_index=True)
+        self.ends = np.append(self.starts[1:], len(sorted_keys))
+
+    def gather(self, query_keys: np.ndarray):
+        """返回 (查询下标, 行号) 对：query_keys 中每个键所在格子里的全部行。"""
+        flat = query_keys.ravel()
+        if not len(self.keys):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, flat), len(self.keys) - 1)
+        found = self.keys[pos] == flat
+        starts = np.where(found, self.starts[pos], 0)
+        lengths = np.where(found, self.ends[pos] - self.starts[pos], 0)
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        which = np.repeat(np.arange(len(flat)), lengths)
+        first = np.cumsum(lengths) - lengths
+        idx = np.repeat(starts, lengths) + (np.arange(total) - np.repeat(first, lengths))
+        return which, self.rows[idx]
+
+
+class SpatialHash:
+    """扁平数组空间哈希，用于最小间距 / 防穿插检测及半径查询。
+
+    每个点带一个整数句柄（handle），由调用方映射到物体或点实例；
+    删除只打标记（O(删除数)），合并或删除的行累积到一定比例时再压缩数组。
+    """
+
+    # 待合并表超过该数量（或主表的 1/8）时并入主表
+    _MERGE_MIN = 2048
+    # 已删除的行超过总行数的该分之一时压缩重建
+    _COMPACT_RATIO = 4
+
+    def __init__(self, cell: float = 0.1):
+        self.cell = max(float(cell), 1e-6)
+        self.pts = np.empty((0, 3))
+        self.radii = np.empty(0)
+        self.handles = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._row_of = {}  # handle -> 行号
+        self._next_handle = 0
+        self._main = None
+        self._main_rows = 0  # 主表覆盖的行数，之后的行都在待合并表里
+        self._pending = None
+        self.max_radius = 0.0
+        self._near_radius = 0.0  # 宽点以外的最大半径
+        self._wide = np.empty(0, dtype=np.int64)  # 宽点行号
+        self.version = 0  # 每次增删后递增，供缓存（如热力图）判断是否过期
+
+    def __len__(self):
+        return len(self._row_of)
+
+    # 存储
+    # ------------------------------------------------------------------
+
+    def _reserve(self, extra: int):
+        need = self._size + extra
+        cap = len(self.radii)
+        if need <= cap:
+            return
+        cap = max(need, cap * 2, 256)
+        for name, shape, dtype in (("pts", (cap, 3), np.float64), ("radii", (cap,), np.float64),
+                                   ("handles", (cap,), np.int64), ("alive", (cap,), bool)):
+            arr = np.zeros(shape, dtype=dtype)
+            arr[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, arr)
+
+    def _keys_of(self, pts: np.ndarray) -> np.ndarray:
+        return _cell_keys(np.floor(pts / self.cell).astype(np.int64))
+
+    def _rebuild(self):
+        """压缩已删除的行并重建主表。"""
+        n = self._size
+        live = np.flatnonzero(self.alive[:n])
+        for name in ("pts", "radii", "handles", "alive"):
+            arr = getattr(self, name)
+            arr[:len(live)] = arr[live]
+        self._size = n = len(live)
+        self._row_of = dict(zip(self.handles[:n].tolist(), range(n)))
+        self._main = _Buckets(np.arange(n), self._keys_of(self.pts[:n]))
+        self._main_rows = n
+        self._pending = None
+        self.max_radius = float(self.radii[:n].max()) if n else 0.0
+        wide = self.radii[:n] > _WIDE_CELLS * self.cell
+        self._wide = np.flatnonzero(wide)
+        self._near_radius = float(self.radii[:n][~wide].max()) if (~wide).any() else 0.0
+
+    def set_cell(self, cell: float):
+        """修改格子大小并重新分桶（纯数组运算）。"""
+        cell = max(float(cell), 1e-6)
+        if math.isclose(cell, self.cell):
+            return
+        self.cell = cell
+        self._rebuild()
+
+    def insert(self, pts, radii) -> np.ndarray:
+        """插入一批点，返回它们的句柄。"""
+        pts = np.asarray(pts, dtype=np.float64).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(pts),))
+        count = len(pts)
+        handles = np.arange(self._next_handle, self._next_handle + count, dtype=np.int64)
+        if not count:
+            return handles
+        self._next_handle += count
+        self._reserve(count)
+        s, e = self._size, self._size + count
+        self.pts[s:e] = pts
+        self.radii[s:e] = radii
+        self.handles[s:e] = handles
+        self.alive[s:e] = True
+        self._size = e
+        self._row_of.update(zip(handles.tolist(), range(s, e)))
+        self.max_radius = max(self.max_radius, float(radii.max()))
+        self.version += 1
+
+        pending = e - self._main_rows
+        if self._main is None or pending > max(self._MERGE_MIN, self._main_rows // 8):
+            self._rebuild()
+        else:
+            wide = radii > _WIDE_CELLS * self.cell
+            if wide.any():
+                self._wide = np.concatenate((self._wide, np.arange(s, e)[wide]))
+            if not wide.all():
+                self._near_radius = max(self._near_radius, float(radii[~wide].max()))
+            rows = np.arange(self._main_rows, e)
+            self._pending = _Buckets(rows, self._keys_of(self.pts[self._main_rows:e]))
+        return handles
+
+    def remove(self, handles) -> int:
+        """按句柄删除，返回实际删除数量。"""
+        count = 0
+        for h in np.asarray(handles, dtype=np.int64).tolist():
+            row = self._row_of.pop(h, None)
+            if row is not None:
+                self.alive[row] = False
+                count += 1
+        if count:
+            self.version += 1
+            # 大量擦除后不再插入时，已删除的行也不会一直留在每次扫描里
+            if (self._size - len(self)) * self._COMPACT_RATIO > self._size:
+                self._rebuild()
+        return count
+
+    def clear(self):
+        self.__init__(self.cell)
+
+    def live_points(self) -> np.ndarray:
+        """全部存活点的坐标 (N, 3)。"""
+        return self.pts[:self._size][self.alive[:self._size]]
+
+    # 查询
+    # ------------------------------------------------------------------
+
+    def _iter_pairs(self, points: np.ndarray, reach: float, bucket_sets, rows_all: np.ndarray = None):
+        """按块产出 (点下标, 行号)：points 中每个点与 reach 范围内格子里的行配对。
+
+        邻域格子数不少于 rows_all 的行数时，直接与 rows_all 全部配对（暴力距离计算更省）；
+        rows_all 为 None 时表示全部存活行，只在走暴力分支时才求出。
+        每块的配对数不超过 _PAIR_BUDGET。行号未按存活过滤。
+        """
+        n = len(points)
+        count = len(self) if rows_all is None else len(rows_all)
+        if not n or not count:
+            return
+        brute = not math.isfinite(reach)
+        if not brute:
+            span = max(1, int(math.ceil(reach / self.cell)))
+            width = (2 * span + 1) ** 3
+            brute = width >= count
+        if brute and rows_all is None:
+            rows_all = np.flatnonzero(self.alive[:self._size])
+        step = max(1, _PAIR_BUDGET // (count if brute else width))
+        offsets = None if brute else _offsets(span)
+        for s in range(0, n, step):
+            chunk = points[s:s + step]
+            if brute:
+                yield (np.repeat(np.arange(s, s + len(chunk)), len(rows_all)),
+                       np.tile(rows_all, len(chunk)))
+                continue
+            cells = np.floor(chunk / self.cell).astype(np.int64)
+            keys = _cell_keys(cells[:, None, :] + offsets[None, :, :])
+            for buckets in bucket_sets:
+                if buckets is None:
+                    continue
+                w, r = buckets.gather(keys)
+                if len(w):
+                    yield w // keys.shape[1] + s, r
+
+    def _pairs(self, points: np.ndarray, reach: float):
+        """points 中每个点与其 reach 范围内的存活行配对，返回 (点下标, 行号)。"""
+        parts = list(self._iter_pairs(points, reach, (self._main, self._pending)))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        which = np.concatenate([w for w, _r in parts])
+        rows = np.concatenate([r for _w, r in parts])
+        live = self.alive[rows]
+        return which[live], rows[live]
+
+    def query_radius(self, center, radius: float) -> np.ndarray:
+        """返回距 center 不超过 radius 的点的句柄。"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        c = np.asarray(center, dtype=np.float64).reshape(1, 3)
+        if (2.0 * radius / self.cell) ** 3 > len(self):
+            # 查询范围覆盖的格子比点还多：直接对全部点做向量化距离计算
+            rows = np.flatnonzero(self.alive[:self._size])
+        else:
+            _w, rows = self._pairs(c, radius)
+        d = self.pts[rows] - c
+        return self.handles[rows[np.einsum("ij,ij->i", d, d) <= radius * radius]]
+
+    def points_near(self, center, radius: float) -> np.ndarray:
+        """返回距 center 不超过 radius 的点坐标 (N, 3)。"""
+        handles = self.query_radius(center, radius)
+        return self.pts[[self._row_of[h] for h in handles.tolist()]].reshape(-1, 3)
+
+    def accept_batch(self, points, radii, min_dists, avoid_overlap: bool, factor: float,
+                     limit: int = None):
+        """批量间距检测：按顺序贪心接受候选点，返回 (被接受的布尔掩码, 新句柄)。
+
+        与已有点及本批中更早被接受的点比较，分离距离 = max(最小间距, (r1 + r2) × 系数)；
+        被接受的点（至多 limit 个）随即插入索引。
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        n = len(points)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (n,))
+        min_dists = np.broadcast_to(np.asarray(min_dists, dtype=np.float64), (n,))
+        if not n:
+            return np.zeros(0, dtype=bool), np.empty(0, dtype=np.int64)
+        f = factor if avoid_overlap else 0.0
+
+        def separation(ci, other_r):
+            sep = min_dists[ci]
+            if avoid_overlap:
+                sep = np.maximum(sep, (radii[ci] + other_r) * f)
+            return sep
+
+        ok = np.ones(n, dtype=bool)
+        # 1) 与索引中已有的点比较：宽点直接比较，其余按邻域格子
+        if len(self):
+            wide = self._wide[self.alive[self._wide]] if len(self._wide) else self._wide
+            reach = max(float(min_dists.max()), (float(radii.max()) + self._near_radius) * f)
+            pair_sets = [self._iter_pairs(points, reach, (self._main, self._pending))]
+            if len(wide):
+                pair_sets.append(self._iter_pairs(points, math.inf, (), wide))
+            for pairs in pair_sets:
+                for ci, rows in pairs:
+                    keep = self.alive[rows]
+                    ci, rows = ci[keep], rows[keep]
+                    d = self.pts[rows] - points[ci]
+                    sep = separation(ci, self.radii[rows])
+                    ok[ci[np.einsum("ij,ij->i", d, d) < sep * sep]] = False
+
+        # 2) 本批候选之间按顺序贪心去冲突
+        idx = np.flatnonzero(ok)
+        if len(idx) > 1:
+            reach = max(float(min_dists[idx].max()), 2.0 * float(radii[idx].max()) * f)
+            local = _Buckets(np.arange(len(idx)), self._keys_of(points[idx]))
+            found_a, found_b = [], []
+            for a, other in self._iter_pairs(points[idx], reach, (local,), np.arange(len(idx))):
+                earlier = other < a
+                a, other = a[earlier], other[earlier]
+                ia, ib = idx[a], idx[other]
+                d = points[ia] - points[ib]
+                sep = separation(ia, radii[ib])
+                clash = np.einsum("ij,ij->i", d, d) < sep * sep
+                found_a.append(a[clash])
+                found_b.append(other[clash])
+            a = np.concatenate(found_a) if found_a else np.empty(0, dtype=np.int64)
+            other = np.concatenate(found_b) if found_b else np.empty(0, dtype=np.int64)
+            if len(a):
+                order = np.argsort(a, kind="stable")
+                a, other = a[order], other[order]
+                taken = np.ones(len(idx), dtype=bool)
+                bounds = np.flatnonzero(np.diff(a)) + 1
+                for group in np.split(np.arange(len(a)), bounds):
+                    i = a[group[0]]
+                    if taken[other[group]].any():
+                        taken[i] = False
+                ok[idx[~taken]] = False
+
+        if limit is not None:
+            keep = np.flatnonzero(ok)[:max(limit, 0)]
+            ok[:] = False
+            ok[keep] = True
+        return ok, self.insert(points[ok], radii[ok])
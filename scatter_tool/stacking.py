@@ -0,0 +1,101 @@
+"""叠加模式的投射。
+
+候选点先投射目标表面（单个物体或表面集合），再与附近已散布实例比较：实例以“局部 BVH + 世界矩阵”表示，
+射线变换到实例局部空间后投射，无需把实例烘焙进一棵世界空间的大 BVH；
+新创建的实例只是在间距索引里多了一个句柄，下次查询即可参与，不触发任何重建。
+实例先用包围球做向量化粗筛，只有射线穿过包围球、且比当前命中更近的实例才逐个精确投射。
+"""
+import numpy as np
+from mathutils import Vector
+
+
+class StackInstance:
+    """一个可叠加实例：局部 BVH、世界矩阵及世界空间包围球。"""
+
+    __slots__ = ("bvh", "matrix", "matrix_inv", "matrix_inv3", "normal_matrix", "center", "radius")
+
+    def __init__(self, bvh, matrix, reach: float):
+        self.bvh = bvh
+        self.matrix = matrix
+        self.matrix_inv = matrix.inverted_safe()
+        self.matrix_inv3 = self.matrix_inv.to_3x3()
+        self.normal_matrix = matrix.to_3x3().inverted_safe().transposed()
+        self.center = np.array(matrix.translation, dtype=np.float64)
+        self.radius = reach * max(matrix.to_scale())
+
+
+class StackCaster:
+    """目标表面 + 已散布实例的组合投射器，实例按间距索引句柄缓存。"""
+
+    # 射线 × 实例包围球粗筛的分块大小
+    _CHUNK = 256
+
+    def __init__(self):
+        self._instances = {}  # 句柄 -> StackInstance
+
+    def forget(self, handles):
+        for h in handles:
+            self._instances.pop(h, None)
+
+    def clear(self):
+        self._instances.clear()
+
+    def instances(self, handles, resolve):
+        """取出句柄对应的实例（首次用 resolve(句柄) 解析并缓存），跳过无法解析的。
+        resolve 返回 None 的句柄不缓存，下次重新解析（例如尚未写回的点实例）。
+        """
+        out = []
+        for h in handles:
+            inst = self._instances.get(h)
+            if inst is None:
+                inst = resolve(h)
+                if inst is None:
+                    continue
+                self._instances[h] = inst
+            out.append(inst)
+        return out
+
+    def cast_many(self, target, origins: np.ndarray, direction: Vector, instances):
+        """沿同一方向批量投射，返回每条射线的 (世界坐标, 世界法线, 三角形索引, 命中表面, 距离) 或 None。
+        target 为 TargetSurface / SurfaceSet；命中实例时三角形索引与表面为 None（不属于目标表面）。
+        """
+        d = np.asarray(direction.normalized(), dtype=np.float64)
+        count = len(origins)
+        best_dist = np.full(count, np.inf)
+        results = [None] * count
+        if target is not None:
+            results = target.cast_many(origins, direction)
+            for i, res in enumerate(results):
+                if res is not None:
+                    best_dist[i] = res[4]
+        if not instances:
+            return results
+
+        centers = np.array([inst.center for inst in instances])
+        radii = np.array([inst.radius for inst in instances])
+        direction = Vector(d)
+        for s in range(0, count, self._CHUNK):
+            rel = centers[None, :, :] - origins[s:s + self._CHUNK, None, :]
+            t = rel @ d
+            perp = np.einsum("ijk,ijk->ij", rel, rel) - t * t
+            inside = radii[None, :] ** 2 - perp
+            entry = t - np.sqrt(np.maximum(inside, 0.0))
+            hit = (inside >= 0.0) & (t + radii[None, :] >= 0.0)
+            for row in np.flatnonzero(hit.any(axis=1)):
+                i = s + row
+                cand = np.flatnonzero(hit[row])
+                origin = Vector(origins[i])
+                for j in cand[np.argsort(entry[row, cand])].tolist():
+                    if entry[row, j] >= best_dist[i]:
+                        break
+                    inst = instances[j]
+                    local_dir = (inst.matrix_inv3 @ direction).normalized()
+                    loc, nor, _idx, _dist = inst.bvh.ray_cast(inst.matrix_inv @ origin, local_dir)
+                    if loc is None:
+                        continue
+                    world = inst.matrix @ loc
+                    dist = (world - origin).dot(direction)
+                    if 0.0 <= dist < best_dist[i]:
+                        best_dist[i] = dist
+                        results[i] = (world, (inst.normal_matrix @ nor).normalized(), None, None, dist)
+        return results
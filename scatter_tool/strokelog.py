@@ -0,0 +1,154 @@
+"""散布笔触记录。
+
+每次笔触记录随机种子、散布源与权重、目标、工具属性快照，以及沿途的世界空间射线、笔压与当时的笔刷半径
+（绘制中可用滚轮或 [ ] 调整半径，仅靠快照无法还原；擦除笔触记录擦除中心与半径），以紧凑 JSON 字符串列表存放在散布集合的自定义属性上，
+随 .blend 文件保存。回放时按记录重新执行，可覆盖部分属性（例如提高密度）离线重新生成。
+"""
+import json
+
+import bpy
+
+# 散布集合上存放笔触记录的自定义属性
+STROKE_LOG_KEY = "ph_stroke_log"
+# 坐标保留的小数位数（0.01 mm），兼顾体积与回放精度
+_DIGITS = 5
+
+# 指针属性按类型到 bpy.data 集合的映射，快照中只存名字
+_ID_COLLECTIONS = {
+    "Image": "images",
+    "Collection": "collections",
+    "Object": "objects",
+}
+
+
+def snapshot_props(props) -> dict:
+    """把属性组的当前值转换为可 JSON 序列化的字典，指针属性记录数据块名字。"""
+    out = {}
+    for prop in props.bl_rna.properties:
+        key = prop.identifier
+        if key == "rna_type":
+            continue
+        value = getattr(props, key)
+        if prop.type == "POINTER":
+            value = value.name if value is not None else None
+        elif getattr(prop, "is_array", False):
+            value = list(value)
+        out[key] = value
+    return out
+
+
+class ReplayProps:
+    """回放用的只读属性：属性快照 + 覆盖值，指针属性按名字解析回数据块。"""
+
+    def __init__(self, props, snapshot: dict, overrides: dict = None):
+        self._values = dict(snapshot)
+        if overrides:
+            self._values.update(overrides)
+        self._pointers = {}
+        for prop in props.bl_rna.properties:
+            if prop.identifier == "rna_type":
+                continue
+            if prop.type == "POINTER":
+                self._pointers[prop.identifier] = _ID_COLLECTIONS.get(prop.fixed_type.identifier)
+            elif prop.identifier not in self._values:
+                # 旧记录里没有的新属性取当前值
+                self._values[prop.identifier] = getattr(props, prop.identifier)
+
+    def set_value(self, key: str, value):
+        """回放过程中更新某个属性（例如逐条射线记录的笔刷半径）。"""
+        self._values[key] = value
+
+    def __getattr__(self, key):
+        values = self.__dict__.get("_values")
+        if values is None or key not in values:
+            raise AttributeError(key)
+        value = values[key]
+        data_name = self._pointers.get(key)
+        if data_name is not None:
+            return getattr(bpy.data, data_name).get(value) if value else None
+        return value
+
+
+class StrokeLog:
+    """一次笔触的记录。mode 为 "PAINT"（samples 每项 8 个数：射线起点、方向、笔压、笔刷半径）
+    或 "ERASE"（每项 4 个数：擦除中心、半径）。旧记录的绘制射线没有半径，每项 7 个数。
+    """
+
+    PAINT_STRIDE = 8
+    ERASE_STRIDE = 4
+    # 不含半径的旧记录
+    _LEGACY_PAINT_STRIDE = 7
+
+    def __init__(self, mode: str, seed: int = 0, props: dict = None, sources=(), weights=(),
+                 target=None, samples=None, stride: int = None):
+        self.mode = mode
+        self.stride = stride or (self.PAINT_STRIDE if mode == "PAINT" else self.ERASE_STRIDE)
+        self.seed = int(seed)
+        self.props = props or {}
+        self.sources = list(sources)
+        self.weights = [float(w) for w in weights]
+        self.target = target  # ("OBJECT" | "COLLECTION", 名字) 或 None
+        self.samples = samples if samples is not None else []
+
+    def __len__(self):
+        return len(self.samples) // self.stride
+
+    def add_ray(self, origin, direction, pressure: float, radius: float):
+        self.samples.extend(round(float(v), _DIGITS) for v in (*origin, *direction, pressure, radius))
+
+    def add_erase(self, center, radius: float):
+        self.samples.extend(round(float(v), _DIGITS) for v in (*center, radius))
+
+    def rays(self):
+        """逐项产出 (起点, 方向, 笔压, 笔刷半径)；旧记录的半径为 None。"""
+        s = self.samples
+        n = self.stride
+        for i in range(0, len(s) - n + 1, n):
+            yield s[i:i + 3], s[i + 3:i + 6], s[i + 6], (s[i + 7] if n > self._LEGACY_PAINT_STRIDE else None)
+
+    def erases(self):
+        """逐项产出 (中心, 半径)。"""
+        s = self.samples
+        for i in range(0, len(s) - self.ERASE_STRIDE + 1, self.ERASE_STRIDE):
+            yield s[i:i + 3], s[i + 3]
+
+    def to_json(self) -> str:
+        data = {"mode": self.mode, "seed": self.seed, "samples": self.samples}
+        if self.mode == "PAINT":
+            data.update(stride=self.stride, props=self.props, sources=self.sources, weights=self.weights, target=self.target)
+        return json.dumps(data, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str) -> "StrokeLog":
+        data = json.loads(text)
+        target = data.get("target")
+        mode = data.get("mode", "PAINT")
+        # 没有 stride 字段的绘制记录来自记录半径之前的版本
+        stride = data.get("stride", cls._LEGACY_PAINT_STRIDE) if mode == "PAINT" else None
+        return cls(mode, data.get("seed", 0), data.get("props"),
+                   data.get("sources", ()), data.get("weights", ()),
+                   tuple(target) if target else None, data.get("samples", []), stride)
+
+
+def read_strokes(coll) -> list:
+    """读取散布集合上的全部笔触记录；损坏的条目跳过。"""
+    if coll is None:
+        return []
+    out = []
+    for text in coll.get(STROKE_LOG_KEY, ()):
+        try:
+            out.append(StrokeLog.from_json(text))
+        except (ValueError, TypeError):
+            continue
+    return out
+
+
+def append_stroke(coll, log: StrokeLog):
+    texts = list(coll.get(STROKE_LOG_KEY, ()))
+    texts.append(log.to_json())
+    coll[STROKE_LOG_KEY] = texts
+
+
+def clear_strokes(coll):
+    if coll is not None and STROKE_LOG_KEY in coll:
+        del coll[STROKE_LOG_KEY]
@@ -0,0 +1,354 @@
+"""散布目标表面的 BVH 缓存。
+
+目标物体的求值网格经 utils.geometry 提取为世界空间的三角化缓冲区并建立 BVHTree。
+结果按（物体名、求值网格、世界矩阵）缓存，同一目标上的后续笔触直接复用；
+depsgraph 更新处理器在几何/变换变化时使缓存失效。
+
+指定表面集合时，SurfaceSet 把集合内的多个网格（例如切块地形）合并成一个表面：
+先用各物体的世界包围盒做射线粗筛，某块第一次被射线穿过时才建立它的 BVH，
+建好后同样进入上面的缓存，笔触跨块移动时不会整体重建。
+
+散布实例的局部 BVH 按求值后的网格数据另行缓存（叠加投射用）：没有修改器的关联实例共享同一份，
+带修改器的物体各有自己的求值网格。每次创建实例都会触发新物体的依赖图更新，按物体失效会让缓存形同虚设，
+因此只在网格数据本身的几何变化（编辑、形态键等）时递增其修订号，以修订号与顶点/面数校验是否过期。
+单个复制（COPY）实例各有一份网格数据，这部分缓存按字节预算淘汰最久未用的条目。
+"""
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+from mathutils import Vector
+
+from .sampling import slope_degrees
+from ..utils.geometry import bvh_from_triangles, mesh_triangles, timed, transform_points, triangle_uvs
+from ..utils.lru import ByteLRU
+
+# 实例局部 BVH 合计的内存上限（字节，按坐标与索引缓冲区估算）
+LOCAL_CACHE_BYTES = 64 * 1024 * 1024
+
+_CACHE = {}  # 物体名 -> TargetSurface
+_LOCAL = ByteLRU(LOCAL_CACHE_BYTES)  # 求值网格指针 -> LocalMesh
+_LOCAL_REV = {}  # 网格数据名 -> 几何修订号
+
+
+class TargetSurface:
+    """单个目标物体的世界空间三角网格及其 BVH。"""
+
+    def __init__(self, key, data_name, bvh, co, tris):
+        self.key = key
+        self.data_name = data_name  # 原始网格数据名，网格被其它物体共享时用于失效判断
+        self.bvh = bvh
+        self.co = co  # (V, 3) 世界坐标
+        self.tris = tris  # (T, 3) 顶点索引；BVH 返回的面索引即三角形索引
+        self.tri_uv = None  # (T, 3, 2) 三角形角点 UV，遮罩需要时才读取
+        self.uv_loaded = False
+        self.face_slope = None  # (T,) 三角形坡度（度），坡度/高度过滤需要时才计算
+        self.face_z = None  # (T, 2) 三角形的 Z 范围
+        self.face_center = None  # (T, 3) 三角形重心
+        self.face_reach = None  # (T,) 重心到最远角点的距离
+        self._face_ok = None  # (过滤条件, (T,) 可通过过滤的三角形)
+
+    def bounds(self):
+        """世界空间包围盒 (最小角, 最大角)。"""
+        if not len(self.co):
+            return np.zeros(3), np.zeros(3)
+        return self.co.min(axis=0), self.co.max(axis=0)
+
+    def cast(self, origin, direction):
+        """投射单条射线，返回 (坐标, 法线, 三角形索引, 命中表面, 距离) 或 None。"""
+        if self.bvh is None:
+            return None
+        loc, nor, idx, dist = self.bvh.ray_cast(origin, direction)
+        if loc is None:
+            return None
+        return loc, nor.normalized(), idx, self, dist
+
+    def cast_many(self, origins: np.ndarray, direction):
+        """沿同一方向批量投射 (N, 3) 起点，返回与 cast 相同结构的列表。"""
+        return [self.cast(Vector(o), direction) for o in origins]
+
+    def faces_under(self, center, normal, radius: float, top: float) -> list:
+        """射线柱内可能被命中的三角形，返回 [(表面, 三角形索引数组)]（与 SurfaceSet 一致）。
+
+        射线柱以 center 为轴心、半径 radius，从 center 上方 top 处沿 -normal 向下不限深度；
+        用缓存的三角形重心与外接半径做纯数组筛选，不逐个构造 Python 对象。
+        """
+        if self.bvh is None or not len(self.tris):
+            return []
+        self._face_stats()
+        rel = self.face_center - np.asarray(center, dtype=np.float64)
+        axial = rel @ np.asarray(normal, dtype=np.float64)
+        lateral_sq = np.einsum("ij,ij->i", rel, rel) - axial * axial
+        reach = radius + self.face_reach
+        ids = np.flatnonzero((axial <= top + self.face_reach) & (lateral_sq <= reach * reach))
+        return [(self, ids)]
+
+    def _face_stats(self):
+        if self.face_slope is not None:
+            return
+        with timed("scatter.face_stats"):
+            tri_co = self.co[self.tris]
+            self.face_slope = slope_degrees(np.cross(tri_co[:, 1] - tri_co[:, 0], tri_co[:, 2] - tri_co[:, 0]))
+            z = tri_co[:, :, 2]
+            self.face_z = np.stack((z.min(axis=1), z.max(axis=1)), axis=1)
+            self.face_center = tri_co.mean(axis=1)
+            self.face_reach = np.sqrt(((tri_co - self.face_center[:, None, :]) ** 2).sum(axis=2)).max(axis=1)
+
+    def face_filter(self, slope_limit: float = None, z_range=None) -> np.ndarray:
+        """可能通过坡度/高度过滤的三角形掩码 (T,)，按过滤条件缓存。
+
+        命中点的法线即三角形法线、Z 坐标落在三角形的 Z 范围内，
+        因此未通过的三角形上不可能有点通过过滤。
+        """
+        key = (slope_limit, z_range)
+        if self._face_ok is not None and self._face_ok[0] == key:
+            return self._face_ok[1]
+        self._face_stats()
+        ok = np.ones(len(self.tris), dtype=bool)
+        if slope_limit is not None:
+            ok &= self.face_slope <= slope_limit
+        if z_range is not None:
+            ok &= (self.face_z[:, 1] >= z_range[0]) & (self.face_z[:, 0] <= z_range[1])
+        self._face_ok = (key, ok)
+        return ok
+
+
+def _surface_key(obj, eval_obj):
+    data = eval_obj.data
+    matrix = tuple(v for row in eval_obj.matrix_world for v in row)
+    return obj.name, data.as_pointer() if data is not None else 0, matrix
+
+
+def _build_surface(obj, eval_obj, key) -> TargetSurface:
+    with timed("scatter.target_bvh"):
+        mesh = eval_obj.to_mesh()
+        try:
+            co, tris = mesh_triangles(mesh, eval_obj.matrix_world)
+        finally:
+            eval_obj.to_mesh_clear()
+        bvh = bvh_from_triangles(co, tris)
+    data = getattr(obj, "data", None)
+    return TargetSurface(key, data.name if data is not None else "", bvh, co, tris)
+
+
+def _load_uvs(surf, eval_obj):
+    with timed("scatter.target_uv"):
+        mesh = eval_obj.to_mesh()
+        try:
+            mesh.calc_loop_triangles()
+            surf.tri_uv = triangle_uvs(mesh)
+        finally:
+            eval_obj.to_mesh_clear()
+    surf.uv_loaded = True
+
+
+def get_surface(depsgraph, obj, with_uv: bool = False) -> TargetSurface:
+    """获取目标物体的表面（缓存未命中或已过期时重建）。
+    :param with_uv: 同时读取三角形 UV（用于遮罩采样）
+    """
+    eval_obj = obj.evaluated_get(depsgraph)
+    key = _surface_key(obj, eval_obj)
+    surf = _CACHE.get(obj.name)
+    if surf is None or surf.key != key:
+        surf = _CACHE[obj.name] = _build_surface(obj, eval_obj, key)
+    if with_uv and not surf.uv_loaded:
+        _load_uvs(surf, eval_obj)
+    return surf
+
+
+class SurfaceSet:
+    """多个网格物体合并成的目标表面，成员的 BVH 在射线第一次进入其包围盒时才建立。
+
+    与 TargetSurface 提供相同的 cast / cast_many 接口，命中结果中的表面为实际命中的成员。
+    """
+
+    def __init__(self, depsgraph, objs, with_uv: bool = False):
+        self.depsgraph = depsgraph
+        self.with_uv = with_uv
+        self.names = []
+        lo, hi = [], []
+        for obj in objs:
+            eval_obj = obj.evaluated_get(depsgraph)
+            corners = transform_points(np.array(eval_obj.bound_box, dtype=np.float64), eval_obj.matrix_world)
+            self.names.append(obj.name)
+            lo.append(corners.min(axis=0))
+            hi.append(corners.max(axis=0))
+        # 包围盒稍微外扩，避免射线擦过平坦地块时因浮点误差被粗筛掉
+        pad = 1e-4
+        self.lo = np.array(lo, dtype=np.float64).reshape(-1, 3) - pad
+        self.hi = np.array(hi, dtype=np.float64).reshape(-1, 3) + pad
+        self._tiles = {}  # 成员下标 -> TargetSurface（无法加载时为 None）
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, obj):
+        return obj is not None and obj.name in self.names
+
+    def bounds(self):
+        """全部成员的世界空间包围盒 (最小角, 最大角)。"""
+        if not len(self.names):
+            return np.zeros(3), np.zeros(3)
+        return self.lo.min(axis=0), self.hi.max(axis=0)
+
+    @property
+    def loaded(self) -> int:
+        """已建立 BVH 的成员数。"""
+        return sum(1 for tile in self._tiles.values() if tile is not None)
+
+    def _tile(self, i):
+        if i not in self._tiles:
+            obj = bpy.data.objects.get(self.names[i])
+            self._tiles[i] = get_surface(self.depsgraph, obj, self.with_uv) if obj is not None else None
+        return self._tiles[i]
+
+    def _entries(self, origins: np.ndarray, d: np.ndarray):
+        """射线 × 包围盒的 slab 测试，返回 (N, M) 的进入距离，未相交为 inf。"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inv = np.where(d != 0.0, 1.0 / d, np.inf)
+            t0 = (self.lo[None, :, :] - origins[:, None, :]) * inv
+            t1 = (self.hi[None, :, :] - origins[:, None, :]) * inv
+        t_min = np.minimum(t0, t1)
+        t_max = np.maximum(t0, t1)
+        # 方向分量为 0 的轴：起点在 slab 内则不限制，否则不相交
+        flat = d == 0.0
+        if flat.any():
+            inside = (origins[:, None, :] >= self.lo[None, :, :]) & (origins[:, None, :] <= self.hi[None, :, :])
+            t_min = np.where(flat, np.where(inside, -np.inf, np.inf), t_min)
+            t_max = np.where(flat, np.where(inside, np.inf, -np.inf), t_max)
+        near = t_min.max(axis=2)
+        far = t_max.min(axis=2)
+        hit = (near <= far) & (far >= 0.0)
+        return np.where(hit, np.maximum(near, 0.0), np.inf)
+
+    def faces_under(self, center, normal, radius: float, top: float) -> list:
+        """包围盒可能进入射线柱的成员上的三角形，返回 [(成员表面, 三角形索引数组)]。"""
+        c = np.asarray(center, dtype=np.float64)
+        n = np.asarray(normal, dtype=np.float64)
+        rel = (self.lo + self.hi) * 0.5 - c
+        half = np.linalg.norm(self.hi - self.lo, axis=1) * 0.5
+        axial = rel @ n
+        lateral_sq = np.einsum("ij,ij->i", rel, rel) - axial * axial
+        near = (axial <= top + half) & (lateral_sq <= (radius + half) ** 2)
+        out = []
+        for i in np.flatnonzero(near).tolist():
+            tile = self._tile(i)
+            if tile is not None:
+                out.extend(tile.faces_under(center, normal, radius, top))
+        return out
+
+    def cast(self, origin, direction):
+        return self.cast_many(np.array([origin], dtype=np.float64), direction)[0]
+
+    def cast_many(self, origins: np.ndarray, direction):
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        results = [None] * len(origins)
+        if not len(self.names) or not len(origins):
+            return results
+        direction = Vector(direction).normalized()
+        entries = self._entries(origins, np.asarray(direction, dtype=np.float64))
+        for i in np.flatnonzero(np.isfinite(entries).any(axis=1)).tolist():
+            row = entries[i]
+            cand = np.flatnonzero(np.isfinite(row))
+            origin = Vector(origins[i])
+            best = None
+            # 按进入距离由近到远，进入距离已超过当前命中时后面的块不可能更近
+            for j in cand[np.argsort(row[cand])].tolist():
+                if best is not None and row[j] >= best[4]:
+                    break
+                tile = self._tile(j)
+                if tile is None:
+                    continue
+                res = tile.cast(origin, direction)
+                if res is not None and (best is None or res[4] < best[4]):
+                    best = res
+            results[i] = best
+        return results
+
+
+class LocalMesh:
+    """散布实例的局部空间 BVH（按求值网格共享），供叠加投射使用。"""
+
+    def __init__(self, key, bvh, reach, nbytes):
+        self.key = key
+        self.bvh = bvh
+        self.reach = reach  # 顶点到局部原点的最大距离（包围球半径）
+        self.nbytes = nbytes
+
+
+def _local_key(data, eval_data):
+    return data.name, _LOCAL_REV.get(data.name, 0), len(eval_data.vertices), len(eval_data.polygons)
+
+
+def get_local_mesh(depsgraph, obj):
+    """获取物体求值网格的局部 BVH；非网格物体返回 None。
+
+    按求值网格指针缓存：共享网格且没有修改器的实例共享同一份；刚创建、尚未求值的物体退回原始网格。
+    """
+    data = getattr(obj, "data", None)
+    if not isinstance(data, bpy.types.Mesh):
+        return None
+    try:
+        eval_obj = obj.evaluated_get(depsgraph)
+        eval_data = eval_obj.data
+    except Exception:
+        eval_obj, eval_data = None, data
+    pointer = eval_data.as_pointer()
+    key = _local_key(data, eval_data)
+    local = _LOCAL.get(pointer)
+    if local is not None and local.key == key:
+        return local
+    with timed("scatter.local_bvh"):
+        try:
+            mesh = eval_obj.to_mesh()
+        except Exception:
+            eval_obj, mesh = None, data
+        try:
+            co, tris = mesh_triangles(mesh)
+        finally:
+            if eval_obj is not None:
+                eval_obj.to_mesh_clear()
+        bvh = bvh_from_triangles(co, tris)
+    reach = float(np.sqrt((co.astype(np.float64) ** 2).sum(axis=1).max())) if len(co) else 0.0
+    # BVH 节点按与三角形缓冲区同量级估算
+    local = LocalMesh(key, bvh, reach, co.nbytes + 2 * tris.nbytes)
+    _LOCAL.put(pointer, local)
+    return local
+
+
+def clear_cache():
+    _CACHE.clear()
+    _LOCAL.clear()
+    _LOCAL_REV.clear()
+
+
+@persistent
+def _invalidate_on_update(_scene, depsgraph):
+    """几何或变换变化时丢弃对应物体的缓存；网格数据几何变化时使其实例局部 BVH 过期。"""
+    if not _CACHE and not len(_LOCAL):
+        return
+    for update in depsgraph.updates:
+        idb = update.id
+        if isinstance(idb, bpy.types.Object):
+            if update.is_updated_geometry or update.is_updated_transform:
+                _CACHE.pop(idb.name, None)
+        elif update.is_updated_geometry:
+            if isinstance(idb, bpy.types.Mesh):
+                _LOCAL_REV[idb.name] = _LOCAL_REV.get(idb.name, 0) + 1
+            stale = [name for name, surf in _CACHE.items() if surf.data_name == idb.name]
+            for name in stale:
+                del _CACHE[name]
+
+
+def add_surface_handler():
+    if _invalidate_on_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(_invalidate_on_update)
+
+
+def remove_surface_handler():
+    """移除处理器并清空缓存：处理器不在时无法得知几何变化，缓存不能继续使用。"""
+    if _invalidate_on_update in bpy.app.handlers.depsgraph_update_post:
+        try:
+            bpy.app.handlers.depsgraph_update_post.remove(_invalidate_on_update)
+        except Exception:
+            pass
+    clear_cache()
@@ -4,7 +4,7 @@ import bpy
 from bpy.props import BoolProperty, FloatProperty, EnumProperty, PointerProperty
 from bpy.types import PropertyGroup
 
-from ..utils import EXIT_TO_SELECT_BOX_KEYMAP
+from ..utils import EXIT_TO_SELECT_BOX_KEYMAP, get_pref
 from ..icons import draw_random_toggle, draw_random_operator
 
 
@@ -60,10 +60,22 @@ class ScatterToolProps(PropertyGroup):
     min_dist_max: FloatProperty(name="Max Distance",
                                 description="Upper bound of the random spacing",
                                 default=0.5, min=0.0, soft_max=10.0, subtype="DISTANCE")
+    distribution: EnumProperty(name="Distribution",
+                               description="How candidate points are drawn inside the brush",
+                               items=[("RANDOM", "Random",
+                                       "Uniform random samples; spacing is enforced by rejecting candidates"),
+                                      ("POISSON", "Blue Noise",
+                                       "Poisson-disk samples that already respect the spacing, "
+                                       "so far fewer candidates are cast and rejected")],
+                               default="RANDOM")
     use_stacking: BoolProperty(name="Stacking",
                                description="Allow scattering on top of already scattered objects, "
                                            "stacking them up like a tower",
                                default=False)
+    target_collection: PointerProperty(name="Surface Collection", type=bpy.types.Collection,
+                                       description="Scatter across every visible mesh in this collection "
+                                                   "instead of only the object under the cursor, "
+                                                   "e.g. a terrain split into tiles")
 
     # 防穿插
     avoid_overlap: BoolProperty(name="Avoid Overlap",
@@ -132,12 +144,27 @@ class ScatterToolProps(PropertyGroup):
     mask_image: PointerProperty(name="Mask", type=bpy.types.Image)
     mask_invert: BoolProperty(name="Invert Mask", default=False)
 
+    # 输出方式
+    output: EnumProperty(name="Output",
+                         items=[("OBJECTS", "Objects", "Create one object per scattered instance"),
+                                ("POINTS", "Point Instances",
+                                 "Store instance transforms in one point cloud per source and instance the "
+                                 "source on its points with Geometry Nodes. Scales to far more instances")],
+                         default="OBJECTS")
+
     # 复制方式
     duplicate: EnumProperty(name="Duplicate",
                             items=[("INSTANCE", "Instance", "Create linked instances (share mesh data)"),
                                    ("COPY", "Object", "Create full copies (independent mesh data)")],
                             default="INSTANCE")
 
+    # 笔触记录
+    record_strokes: BoolProperty(name="Record Strokes",
+                                 description="Store each stroke's path, pressure, settings and random seed on the "
+                                             "Scatter collection so it can be replayed or regenerated later. "
+                                             "Each stroke rewrites the stored log, so it gets slower as the log grows",
+                                 default=False)
+
 
 class PH_TL_ScatterTool(bpy.types.WorkSpaceTool):
     bl_idname = "ph.scatter_tool"
@@ -197,6 +224,7 @@ class PH_TL_ScatterTool(bpy.types.WorkSpaceTool):
             row.popover(panel="PH_PT_ScatterScale", text="")
 
         layout.prop(prop, "use_stacking", text="", icon="MOD_ARRAY", toggle=True)
+        layout.prop(get_pref().scatter_tool, "show_density", text="", icon="OVERLAY", toggle=True)
         layout.popover(panel="PH_PT_ScatterSource", text="", icon="OBJECT_DATA")
         layout.popover(panel="PH_PT_ScatterTool", text="", icon="PREFERENCES")
         layout.operator("object.ph_scatter_apply", text="", icon="CHECKMARK")
@@ -361,6 +389,7 @@ class PH_PT_ScatterTool(bpy.types.Panel):
         layout.prop(prop, "avoid_overlap")
         if prop.avoid_overlap:
             layout.prop(prop, "overlap_factor")
+        layout.prop(prop, "distribution")
         layout.prop(prop, "use_stacking")
 
         layout.separator()
@@ -385,6 +414,7 @@ class PH_PT_ScatterTool(bpy.types.Panel):
 
         layout.separator()
         layout.label(text="Filter", icon="FILTER")
+        layout.prop(prop, "target_collection")
         layout.prop(prop, "limit_to_surface")
         layout.prop(prop, "use_slope_limit")
         if prop.use_slope_limit:
@@ -418,7 +448,17 @@ class PH_PT_ScatterTool(bpy.types.Panel):
             layout.label(text="Select source objects to set probability", icon="INFO")
 
         layout.separator()
-        layout.prop(prop, "duplicate")
+        layout.prop(prop, "output")
+        row = layout.row()
+        row.active = prop.output == "OBJECTS"
+        row.prop(prop, "duplicate")
+
+        layout.separator()
+        layout.prop(prop, "record_strokes")
+        row = layout.row(align=True)
+        row.operator("object.ph_scatter_replay", icon="FILE_REFRESH")
+        row.operator("object.ph_scatter_clear_log", text="", icon="TRASH")
+        layout.operator("object.ph_scatter_path", icon="CURVE_PATH")
 
 
 _POPOVERS = (
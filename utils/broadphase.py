@@ -0,0 +1,104 @@
+"""碰撞检测的粗筛阶段：世界空间轴对齐包围盒的扫掠裁剪（sweep and prune）。
+
+包围盒按最小 X 排序，查询时用二分查找截出 X 区间可能相交的一段，再对这一段做向量化的三轴比较；
+明显比大多数盒子宽的盒子（地面、墙体等）单独存放，每次查询直接比较，不拖累排序区间的裁剪。
+更新与新增的盒子原地写入自己的行并记为“未排序”，查询时与宽盒子一样直接比较；删除只留下空行。
+未排序行或空行累积到一定比例时才整体压缩重排（纯数组运算），拖动中逐个补全物体不会每次都重排。
+"""
+import numpy as np
+
+# 宽度超过中位数该倍数的盒子不参与排序区间
+_WIDE_FACTOR = 8.0
+# 未排序行超过 max(该值, 总行数/8)、或空行超过总行数/4 时整体重排
+_LOOSE_MIN = 32
+
+
+class SweepAndPrune:
+    """按名字索引的 AABB 集合，query() 返回与给定盒子相交的名字（按首次插入的顺序）。"""
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def names(self) -> list:
+        return list(self._rows)
+
+    def set(self, name: str, lo, hi):
+        """新增或更新盒子；已有的名字原地更新，保持首次插入的顺序。"""
+        row = self._rows.get(name)
+        if row is None:
+            row = self._size
+            if row == len(self._lo):
+                cap = max(16, row * 2)
+                self._lo = np.resize(self._lo, (cap, 3))
+                self._hi = np.resize(self._hi, (cap, 3))
+            self._size += 1
+            self._rows[name] = row
+            self._names.append(name)
+        self._lo[row] = lo
+        self._hi[row] = hi
+        self._loose.add(row)
+
+    def remove(self, name: str):
+        row = self._rows.pop(name, None)
+        if row is not None:
+            self._names[row] = None
+            self._loose.discard(row)
+            self._dead += 1
+
+    def clear(self):
+        self._rows = {}  # 名字 -> 行号
+        self._names = []  # 行号 -> 名字，已删除的为 None
+        self._lo = self._hi = np.empty((0, 3))
+        self._size = 0
+        self._dead = 0
+        self._loose = set()  # 上次重排后新增或更新的行
+        self._order = self._wide = np.empty(0, dtype=np.int64)  # 排序区间的行号（按最小 X）/ 单独比较的宽盒子
+        self._sorted_x = np.empty(0)
+        self._reach = 0.0  # 排序区间内盒子的最大 X 宽度
+
+    def _build(self):
+        """压缩掉空行（保持行的先后顺序）并重新排序。"""
+        keep = np.array([r for r, name in enumerate(self._names) if name is not None], dtype=np.int64)
+        self._names = [self._names[r] for r in keep.tolist()]
+        self._rows = {name: r for r, name in enumerate(self._names)}
+        self._lo = self._lo[keep].reshape(-1, 3)
+        self._hi = self._hi[keep].reshape(-1, 3)
+        self._size = len(keep)
+        self._dead = 0
+        self._loose.clear()
+        if not self._size:
+            self._order = self._wide = np.empty(0, dtype=np.int64)
+            self._sorted_x = np.empty(0)
+            self._reach = 0.0
+            return
+        width = self._hi[:, 0] - self._lo[:, 0]
+        wide = width > max(float(np.median(width)), 1e-6) * _WIDE_FACTOR
+        self._wide = np.flatnonzero(wide)
+        rows = np.flatnonzero(~wide)
+        self._order = rows[np.argsort(self._lo[rows, 0], kind="stable")]
+        self._sorted_x = self._lo[self._order, 0]
+        self._reach = float(width[rows].max()) if len(rows) else 0.0
+
+    def query(self, lo, hi) -> list:
+        """与 [lo, hi] 相交（含接触）的盒子名字。"""
+        if self._dead * 4 > self._size or len(self._loose) > max(_LOOSE_MIN, self._size >> 3):
+            self._build()
+        if not self._rows:
+            return []
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+        # 最小 X 落在 [lo.x - 最大宽度, hi.x] 的盒子才可能在 X 上相交；
+        # 未排序的行（其排序位置可能已过期）直接比较
+        start = np.searchsorted(self._sorted_x, lo[0] - self._reach, side="left")
+        end = np.searchsorted(self._sorted_x, hi[0], side="right")
+        rows = np.unique(np.concatenate((self._order[start:end], self._wide,
+                                         np.fromiter(self._loose, dtype=np.int64, count=len(self._loose)))))
+        hit = ((self._lo[rows] <= hi) & (self._hi[rows] >= lo)).all(axis=1)
+        names = self._names
+        return [names[r] for r in rows[hit].tolist() if names[r] is not None]
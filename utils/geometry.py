@@ -0,0 +1,141 @@
+"""网格几何提取。
+
+顶点坐标、循环三角形、多边形索引与选择状态统一通过 foreach_get 读入 NumPy 缓冲区，
+世界矩阵变换用一次矩阵乘法完成，三角化后的缓冲区直接交给 BVHTree，
+替代各处 `[mat @ v.co for v in mesh.vertices]` 之类的逐元素 Python 循环。
+
+timed() 按调用点累计耗时，开启插件偏好设置中的 Debug 时打印每次调用，
+便于找出哪个调用点占用了主要时间。
+"""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from mathutils import Matrix
+from mathutils.bvhtree import BVHTree
+
+# 调用点 -> [次数, 总耗时(秒), 最大耗时(秒)]
+_STATS = {}
+
+
+def _debug_enabled() -> bool:
+    try:
+        from . import get_pref
+        return bool(get_pref().debug)
+    except Exception:
+        return False
+
+
+@contextmanager
+def timed(site: str):
+    """统计 with 块的耗时，记入 site 对应的条目。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        cost = time.perf_counter() - start
+        entry = _STATS.setdefault(site, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += cost
+        entry[2] = max(entry[2], cost)
+        if _debug_enabled():
+            print(f"[PlaceHelper] {site}: {cost * 1000.0:.2f} ms "
+                  f"(calls {entry[0]}, total {entry[1] * 1000.0:.1f} ms)")
+
+
+def timing_report() -> list:
+    """按总耗时降序返回 [(调用点, 次数, 总耗时, 最大耗时), ...]，单位秒。"""
+    rows = [(site, n, total, peak) for site, (n, total, peak) in _STATS.items()]
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows
+
+
+def reset_timing():
+    _STATS.clear()
+
+
+# 提取
+# ----------------------------------------------------------------------
+
+def vertex_coords(me) -> np.ndarray:
+    """顶点局部坐标 (N, 3) float32。"""
+    co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3)
+
+
+def loop_triangles(me) -> np.ndarray:
+    """循环三角形的顶点索引 (T, 3) int32。"""
+    me.calc_loop_triangles()
+    tris = np.empty(len(me.loop_triangles) * 3, dtype=np.int32)
+    me.loop_triangles.foreach_get("vertices", tris)
+    return tris.reshape(-1, 3)
+
+
+def triangle_uvs(me):
+    """活动 UV 层在每个循环三角形三个角上的坐标 (T, 3, 2) float32；没有 UV 时返回 None。
+    需先调用 loop_triangles()（或 me.calc_loop_triangles()）。
+    """
+    uv_layer = me.uv_layers.active
+    if uv_layer is None:
+        return None
+    uv = np.empty(len(me.loops) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get("uv", uv)
+    loops = np.empty(len(me.loop_triangles) * 3, dtype=np.int32)
+    me.loop_triangles.foreach_get("loops", loops)
+    return uv.reshape(-1, 2)[loops].reshape(-1, 3, 2)
+
+
+def edge_vertices(me) -> np.ndarray:
+    """边的两个顶点索引 (E, 2) int32。"""
+    edges = np.empty(len(me.edges) * 2, dtype=np.int32)
+    me.edges.foreach_get("vertices", edges)
+    return edges.reshape(-1, 2)
+
+
+def transform_points(co: np.ndarray, matrix: Matrix) -> np.ndarray:
+    """把 (N, 3) 坐标按 4x4 矩阵变换，返回 float64。"""
+    mat = np.array(matrix, dtype=np.float64)
+    return np.asarray(co, dtype=np.float64).reshape(-1, 3) @ mat[:3, :3].T + mat[:3, 3]
+
+
+def bvh_from_triangles(co: np.ndarray, tris: np.ndarray):
+    """由三角化缓冲区建立 BVHTree；为空或构建失败时返回 None。"""
+    if not len(tris):
+        return None
+    try:
+        return BVHTree.FromPolygons(co.tolist(), tris.tolist(), all_triangles=True)
+    except Exception:
+        return None
+
+
+def polylines(co: np.ndarray, edges: np.ndarray) -> list:
+    """把按顺序排列、相邻顶点以边相连的点（例如曲线求值后的网格）拆成若干折线。
+    首尾也以边相连的（闭合样条）在末尾补上首点。
+    """
+    if not len(co):
+        return []
+    linked = np.zeros(len(co) - 1, dtype=bool)
+    edges = np.sort(np.asarray(edges).reshape(-1, 2), axis=1)
+    step = edges[:, 1] - edges[:, 0]
+    linked[edges[step == 1, 0]] = True
+    starts = np.concatenate(([0], np.flatnonzero(~linked) + 1))
+    ends = np.append(starts[1:], len(co)) - 1
+    # 闭合边连接某段折线的首尾两点
+    wraps = {tuple(e) for e in edges[step > 1].tolist()}
+    lines = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        line = co[start:end + 1]
+        if (start, end) in wraps:
+            line = np.concatenate((line, line[:1]))
+        lines.append(line)
+    return lines
+
+
+def mesh_triangles(me, matrix: Matrix = None):
+    """提取网格的三角化缓冲区，返回 (坐标 (V, 3), 三角形 (T, 3))；给出 matrix 时为世界坐标。"""
+    co = vertex_coords(me)
+    tris = loop_triangles(me)
+    if matrix is not None:
+        co = transform_points(co, matrix)
+    return co, tris
@@ -1,7 +1,9 @@
 import bmesh
 import bpy
+import numpy as np
 from mathutils import Vector
 
+from .geometry import timed, transform_points
 from .get_position import get_objs_bbox_center
 
 
@@ -44,15 +46,35 @@ def get_active_face_position(obj):
     return loc
 
 
+def _selected_local(ob) -> np.ndarray:
+    """物体编辑网格中选中顶点的局部坐标 (N, 3)。
+
+    直接读编辑 BMesh（只读，不像 update_from_editmode 那样复制整个网格并触发依赖图更新）；
+    BMesh 没有 foreach_get，选中顶点的坐标在一次生成器遍历中展平进 NumPy 数组。
+    """
+    if ob.data.total_vert_sel == 0:
+        return np.empty((0, 3), dtype=np.float32)
+    bm = bmesh.from_edit_mesh(ob.data)
+    co = np.fromiter((c for v in bm.verts if v.select for c in v.co), dtype=np.float32)
+    return co.reshape(-1, 3)
+
+
+def get_selected_verts_world():
+    """编辑模式下所有物体选中顶点的世界坐标 (N, 3)。"""
+    with timed("gizmo.selected_verts"):
+        verts = []
+        for ob in bpy.context.objects_in_mode_unique_data:
+            co = _selected_local(ob)
+            if len(co):
+                verts.append(transform_points(co, ob.matrix_world))
+        return np.concatenate(verts) if verts else np.empty((0, 3))
+
+
 def get_median_point_position():
-    sOb = bpy.context.objects_in_mode_unique_data
-    verts = []
-    for ob in sOb:
-        bm = bmesh.from_edit_mesh(ob.data)
-        verts.extend([ob.matrix_world @ v.co for v in bm.verts if v.select])
+    verts = get_selected_verts_world()
 
     if len(verts) > 0:
-        loc = sum(verts, Vector()) / len(verts)
+        loc = Vector(verts.mean(axis=0))
     else:
         loc = get_active_face_position(bpy.context.object)
 
@@ -60,17 +82,10 @@ def get_median_point_position():
 
 
 def get_bbox_mesh_position():
-    sOb = bpy.context.objects_in_mode_unique_data
-    verts = []
-    for ob in sOb:
-        bm = bmesh.from_edit_mesh(ob.data)
-        verts.extend([ob.matrix_world @ v.co for v in bm.verts if v.select])
+    verts = get_selected_verts_world()
 
     if len(verts) > 0:
-        x = (min([v.x for v in verts]) + max([v.x for v in verts])) / 2
-        y = (min([v.y for v in verts]) + max([v.y for v in verts])) / 2
-        z = (min([v.z for v in verts]) + max([v.z for v in verts])) / 2
-        loc = Vector((x, y, z))
+        loc = Vector((verts.min(axis=0) + verts.max(axis=0)) / 2)
     else:
         loc = get_active_face_position(bpy.context.object)
 
@@ -130,3 +145,4 @@ def get_position():
         return get_object_position()
     elif bpy.context.mode == 'EDIT_MESH':
         return get_edit_mesh_position()
+
@@ -0,0 +1,54 @@
+"""按字节预算淘汰最久未用条目的 LRU 缓存（遮罩金字塔、实例局部 BVH、网格碰撞共用）。"""
+from collections import OrderedDict
+
+
+class ByteLRU:
+    """键 -> 值的缓存，合计字节数超过预算时淘汰最久未用的条目（至少保留最近使用的一个）。
+
+    每个值的字节数在插入时由 size(value) 求出并计入运行总计，淘汰时不必重新求和。
+    """
+
+    def __init__(self, budget: int, size=lambda value: value.nbytes):
+        self.budget = budget
+        self.nbytes = 0
+        self._size = size
+        self._items = OrderedDict()  # 最近使用的在末尾
+        self._bytes = {}  # 键 -> 插入时的字节数
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def items(self):
+        """遍历全部条目，不改变使用顺序。"""
+        return self._items.items()
+
+    def get(self, key, default=None):
+        """取值并标记为最近使用。"""
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self.pop(key)
+        size = self._size(value)
+        self._items[key] = value
+        self._bytes[key] = size
+        self.nbytes += size
+        while self.nbytes > self.budget and len(self._items) > 1:
+            old, _value = self._items.popitem(last=False)
+            self.nbytes -= self._bytes.pop(old)
+
+    def pop(self, key, default=None):
+        if key not in self._items:
+            return default
+        self.nbytes -= self._bytes.pop(key)
+        return self._items.pop(key)
+
+    def clear(self):
+        self._items.clear()
+        self._bytes.clear()
+        self.nbytes = 0
@@ -0,0 +1,61 @@
+"""有向包围盒（OBB）的分离轴重叠检测。
+
+盒子用 中心 (3,) 与 三个半边向量 (3, 3)（每行一个）表示，由局部包围盒与 matrix_world 直接得到，
+不构建 BVHTree。矩阵带缩放或切变时盒子是平行六面体，候选分离轴取两盒各自的三个面法线
+与两两边向量的叉积（共 15 条），投影半径为各半边向量在轴上投影的绝对值之和。
+与三角形 BVH 的重叠测试不同，一个盒子完全包含另一个时同样算作重叠。
+"""
+import numpy as np
+
+# 两轴几乎平行时叉积接近零，不作为分离轴
+_AXIS_EPS = 1e-12
+# 投影比较的相对容差，接触算作重叠
+_SEP_EPS = 1e-9
+
+
+def obb_from_bounds(lo, hi, matrix=None):
+    """局部包围盒 [lo, hi] 经 4x4 矩阵变换后的 (中心, 半边向量)。"""
+    lo = np.asarray(lo, dtype=np.float64)
+    hi = np.asarray(hi, dtype=np.float64)
+    center = (lo + hi) * 0.5
+    half = np.diag((hi - lo) * 0.5)
+    if matrix is None:
+        return center, half
+    mx = np.asarray(matrix, dtype=np.float64)
+    return mx[:3, :3] @ center + mx[:3, 3], half @ mx[:3, :3].T
+
+
+def _face_normals(axes: np.ndarray) -> np.ndarray:
+    """(..., 3, 3) 半边向量 -> (..., 3, 3) 三个面的法线（未归一化）。"""
+    return np.cross(axes[..., [1, 2, 0], :], axes[..., [2, 0, 1], :])
+
+
+def obb_overlap_many(center, axes, centers, axes_many) -> np.ndarray:
+    """一个盒子与 N 个盒子的重叠测试，返回 (N,) 布尔数组。"""
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    axes_many = np.asarray(axes_many, dtype=np.float64).reshape(-1, 3, 3)
+    count = len(centers)
+    if not count:
+        return np.zeros(0, dtype=bool)
+    axes = np.asarray(axes, dtype=np.float64)
+
+    edge = np.cross(axes[None, :, None, :], axes_many[:, None, :, :]).reshape(count, 9, 3)
+    normals = np.concatenate((
+        np.broadcast_to(_face_normals(axes), (count, 3, 3)),
+        _face_normals(axes_many),
+        edge,
+    ), axis=1)  # (N, 15, 3)
+    length = np.linalg.norm(normals, axis=2)
+    valid = length > _AXIS_EPS * max(float(np.abs(axes).max()), 1.0)
+    normals = normals / np.where(valid, length, 1.0)[..., None]
+
+    dist = np.abs(np.einsum("nkj,nj->nk", normals, centers - np.asarray(center, dtype=np.float64)))
+    r_a = np.abs(np.einsum("nkj,ij->nki", normals, axes)).sum(axis=2)
+    r_b = np.abs(np.einsum("nkj,nij->nki", normals, axes_many)).sum(axis=2)
+    reach = r_a + r_b
+    separated = valid & (dist > reach + _SEP_EPS * np.maximum(reach, 1.0))
+    return ~separated.any(axis=1)
+
+
+def obb_overlap(center_a, axes_a, center_b, axes_b) -> bool:
+    return bool(obb_overlap_many(center_a, axes_a, center_b, axes_b)[0])
@@ -1,12 +1,96 @@
+from contextlib import contextmanager
+
 import bpy
 import numpy as np
 from mathutils import Vector, Matrix
 from mathutils.bvhtree import BVHTree
 
+from .geometry import timed, transform_points, vertex_coords
+from .obb import obb_from_bounds
+
 # 以下物体检测bbox
 C_OBJECT_TYPE_HAS_BBOX = {"MESH", "CURVE", "FONT", "LATTICE", "LIGHT"}
 # 创建bbox的面顶点顺序
 faces = [(0, 1, 2, 3), (4, 7, 6, 5), (0, 4, 5, 1), (1, 5, 6, 2), (2, 6, 7, 3), (4, 0, 3, 7)]
+# 包围盒 8 个角点分别取最小/最大角的哪一个，顺序同 _calc_bbox_pts
+_CORNER_SEL = np.array([(i, j, k) for i in range(2) for j in range(2) for k in range(2)], dtype=bool)
+
+# instance_scan() 作用域：depsgraph 为 None 表示不在作用域内；分组在第一次需要时才遍历
+_SCAN = {"deps": None, "groups": None}
+
+
+class _InstanceGroups:
+    """depsgraph 实例按父物体分组：一次遍历 object_instances，
+    每个网格数据块只 to_mesh() 一次求局部包围盒，实例只记录数据块与世界矩阵。
+    """
+
+    def __init__(self, deps, parent_name: str = None):
+        self.bounds = {}  # 数据块指针 -> (最小角, 最大角)，无顶点时为 None
+        self._items = {}  # 父物体名 -> ([数据块指针], [4x4 世界矩阵])
+        for ob_inst in deps.object_instances:
+            if not ob_inst.is_instance:
+                continue
+            parent = ob_inst.parent
+            if parent is None or (parent_name is not None and parent.name != parent_name):
+                continue
+            obj = ob_inst.object
+            if obj.data is None:
+                continue
+            key = obj.data.as_pointer()
+            if key not in self.bounds:
+                self.bounds[key] = self._mesh_bounds(obj)
+            if self.bounds[key] is None:
+                continue
+            keys, mats = self._items.setdefault(parent.name, ([], []))
+            keys.append(key)
+            mats.append(np.array(ob_inst.matrix_world, dtype=np.float64))
+
+    @staticmethod
+    def _mesh_bounds(obj):
+        try:  # 只评估可转为网格的实例
+            me = obj.to_mesh()
+        except Exception:
+            return None
+        try:
+            if me is None or len(me.vertices) == 0:
+                return None
+            vertices = vertex_coords(me)
+            return vertices.min(axis=0), vertices.max(axis=0)
+        finally:
+            obj.to_mesh_clear()
+
+    def corners(self, parent_name: str, mx: Matrix):
+        """父物体所有实例的包围盒角点变换到父物体空间 (8K, 3)；
+        没有实例、或父物体矩阵不可逆（缩放为 0）时为 None。
+        """
+        item = self._items.get(parent_name)
+        if item is None:
+            return None
+        try:
+            mx_inv = np.linalg.inv(np.array(mx, dtype=np.float64))
+        except np.linalg.LinAlgError:
+            return None
+        keys, mats = item
+        lo = np.array([self.bounds[k][0] for k in keys])
+        hi = np.array([self.bounds[k][1] for k in keys])
+        # (K, 8, 3) 局部角点 -> 父物体空间
+        local = np.where(_CORNER_SEL[None], hi[:, None, :], lo[:, None, :])
+        rel = mx_inv @ np.stack(mats)
+        pts = np.einsum("kij,kpj->kpi", rel[:, :3, :3], local) + rel[:, None, :3, 3]
+        return pts.reshape(-1, 3)
+
+
+@contextmanager
+def instance_scan(deps=None):
+    """作用域内构建的 AlignObject 共用一次实例分组遍历（批量构建场景物体时使用）。"""
+    if _SCAN["deps"] is not None:  # 嵌套时沿用外层
+        yield
+        return
+    _SCAN["deps"] = deps or bpy.context.view_layer.depsgraph
+    try:
+        yield
+    finally:
+        _SCAN["deps"] = _SCAN["groups"] = None
 
 
 class AlignObject:
@@ -40,10 +124,18 @@ class AlignObject:
     # BVH tree
     @property
     def bvh_tree(self) -> BVHTree:
+        """碰撞盒的 BVH，只在第一次访问时按当前矩阵构建；碰撞检测改用 obb()"""
+        if self._bvh_tree is None:
+            self._bvh_tree = BVHTree.FromPolygons(self.get_bbox_pts(is_local=False), faces)
         return self._bvh_tree
 
     def bvh_tree_update(self):
-        self._bvh_tree = BVHTree.FromPolygons(self.get_bbox_pts(is_local=False), faces)
+        self._bvh_tree = None
+
+    def obb(self):
+        """碰撞盒在世界空间的有向包围盒 (中心, 半边向量)，由缓存的局部范围与当前矩阵得到"""
+        return obb_from_bounds((self.min_x, self.min_y, self.min_z),
+                               (self.max_x, self.max_y, self.max_z), self.mx)
 
     # Matrix
     # -------------------------------------------------------------------------
@@ -60,6 +152,10 @@ class AlignObject:
     # -------------------------------------------------------------------------
 
     def _calc_bbox(self):
+        with timed("align.bbox"):
+            self._calc_bbox_extents()
+
+    def _calc_bbox_extents(self):
         # print("calc_bbox")
 
         def default_bbox():
@@ -75,9 +171,7 @@ class AlignObject:
             self.min_z = min(bbox_points, key=lambda v: v.z).z
 
         def mesh_bbox(me):
-            vertices = np.empty(len(me.vertices) * 3, dtype="f")
-            me.vertices.foreach_get("co", vertices)
-            vertices = vertices.reshape(len(me.vertices), 3)
+            vertices = vertex_coords(me)
 
             max_xyz_id = np.argmax(vertices, axis=0)
             min_xyz_id = np.argmin(vertices, axis=0)
@@ -106,56 +200,18 @@ class AlignObject:
         # ----------------
         if not self.build_instance: return default_bbox()
 
-        find = False
-        deps = bpy.context.view_layer.depsgraph
-
-        pts = []
-        for ob_inst in deps.object_instances:
-            if not ob_inst.is_instance: continue
-            if ob_inst.parent is not self.eval_obj: continue
-            matrix_world = ob_inst.matrix_world
-            try:  # 只评估网格物体实例
-                me = ob_inst.object.to_mesh()
-            except:
-                continue
-            if len(me.vertices) == 0: continue
-            find = True
-
-            vertices, max_xyz_id, min_xyz_id = mesh_bbox(me)
-            max_x = float(vertices[max_xyz_id[0], 0])
-            max_y = float(vertices[max_xyz_id[1], 1])
-            max_z = float(vertices[max_xyz_id[2], 2])
-            min_x = float(vertices[min_xyz_id[0], 0])
-            min_y = float(vertices[min_xyz_id[1], 1])
-            min_z = float(vertices[min_xyz_id[2], 2])
-
-            v_max_x = Vector((max_x, 0, 0))
-            v_max_y = Vector((0, max_y, 0))
-            v_max_z = Vector((0, 0, max_z))
-            v_min_x = Vector((min_x, 0, 0))
-            v_min_y = Vector((0, min_y, 0))
-            v_min_z = Vector((0, 0, min_z))
-
-            pts.append(matrix_world @ v_max_x)
-            pts.append(matrix_world @ v_max_y)
-            pts.append(matrix_world @ v_max_z)
-            pts.append(matrix_world @ v_min_x)
-            pts.append(matrix_world @ v_min_y)
-            pts.append(matrix_world @ v_min_z)
-            ob_inst.object.to_mesh_clear()
-
-        if not find:
+        if _SCAN["deps"] is not None:
+            if _SCAN["groups"] is None:
+                _SCAN["groups"] = _InstanceGroups(_SCAN["deps"])
+            groups = _SCAN["groups"]
+        else:
+            # 单独构建时只收集本物体的实例，仍只遍历一次
+            groups = _InstanceGroups(bpy.context.view_layer.depsgraph, self.eval_obj.name)
+        pts = groups.corners(self.eval_obj.name, self.mx)
+        if pts is None:
             return default_bbox()
 
-        # calc max and min
-        if len(pts) == 0: return default_bbox()
-        # print(pts)
-
-        # invert matrix_world back to object parent"s matrix_world
-        pts = [self.mx.inverted() @ pt for pt in pts]
-
         # use numpy to calc max and min
-        pts = np.array(pts)
         max_xyz_id = np.argmax(pts, axis=0)
         min_xyz_id = np.argmin(pts, axis=0)
         self.max_x = float(pts[max_xyz_id[0], 0])
@@ -236,6 +292,11 @@ class AlignObject:
 
         return bbox_pts
 
+    def world_bounds(self):
+        """碰撞盒在世界空间的轴对齐包围盒 (最小角, 最大角)，供粗筛使用"""
+        pts = transform_points(np.array(self._bbox_pts, dtype=np.float64), self.mx)
+        return pts.min(axis=0), pts.max(axis=0)
+
     def get_bbox_center(self, is_local: bool) -> Vector:
         """获取物体碰撞盒中心点"""
         total = Vector((0, 0, 0))
@@ -294,7 +355,6 @@ class AlignObject:
 class AlignObjects:
     def __init__(self, obj_list: list[AlignObject]):
         self.obj_list = obj_list
-        self._bbox_pts = self.get_bbox_pts()
         self.bvh_tree_update()
 
     def _calc_bbox_pts(self):
@@ -366,10 +426,23 @@ class AlignObjects:
     def size(self):
         return Vector((self.max_x - self.min_x, self.max_y - self.min_y, self.max_z - self.min_z))
 
+    def world_bounds(self):
+        """所有物体合并后的世界包围盒 (最小角, 最大角)，需先调用 get_bbox_pts 更新"""
+        return (np.array((self.min_x, self.min_y, self.min_z)),
+                np.array((self.max_x, self.max_y, self.max_z)))
+
     # BVH tree
     @property
     def bvh_tree(self) -> BVHTree:
+        if self._bvh_tree is None:
+            self._bvh_tree = BVHTree.FromPolygons(self._bbox_pts, faces)
         return self._bvh_tree
 
     def bvh_tree_update(self):
-        self._bvh_tree = BVHTree.FromPolygons(self.get_bbox_pts(), faces)
+        """按物体当前位置刷新合并包围盒；BVH 延迟到访问 bvh_tree 时构建"""
+        self._bbox_pts = self.get_bbox_pts()
+        self._bvh_tree = None
+
+    def obb(self):
+        """合并包围盒（世界轴对齐）的 (中心, 半边向量)，需先调用 get_bbox_pts 更新"""
+        return obb_from_bounds(*self.world_bounds())